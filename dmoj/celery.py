@@ -30,6 +30,27 @@ app.conf.beat_schedule = {
             'expires': 60 * 60 * 24,
         },
     },
+    'homepage-bundle-refresh': {
+        'task': 'judge.tasks.homepage.refresh_homepage',
+        'schedule': crontab(minute='*/5'),
+        'options': {
+            'expires': 60 * 5,
+        },
+    },
+    'rank-index-rebuild': {
+        'task': 'judge.tasks.user.rebuild_rank_indexes',
+        'schedule': crontab(minute='*/10'),
+        'options': {
+            'expires': 60 * 10,
+        },
+    },
+    'organization-credit-roll-up': {
+        'task': 'judge.tasks.organization.organization_credit_roll_up',
+        'schedule': crontab(),
+        'options': {
+            'expires': 60,
+        },
+    },
     'organization-monthly-reset': {
         'task': 'judge.tasks.organization.organization_monthly_reset',
         'schedule': crontab(minute=0, hour=0, day_of_month=1),
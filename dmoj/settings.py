@@ -67,8 +67,20 @@ VNOJ_CP_COMMENT = 1   # Each comment vote equals 1 CP
 VNOJ_CP_TICKET = 10   # Each good ticket equals CP
 VNOJ_CP_PROBLEM = 20  # Each suggested problem equal 20 CP
 
+# Contribution points are recalculated this many seconds after a vote,
+# once for all the votes cast on the same user in the meantime.
+VNOJ_CONTRIBUTION_UPDATE_DELAY = 60
+
+# Changes to the points of users are applied to the cached leaderboards
+# this many seconds after the first one, all at once.
+VNOJ_RANK_INDEX_PATCH_DELAY = 30
+
 VNOJ_HOMEPAGE_TOP_USERS_COUNT = 5
 
+# How long, in seconds, the public parts of the homepage sidebar are cached.
+# They are rebuilt every few minutes by celery beat, and on changes to problems, contests and comments.
+VNOJ_HOMEPAGE_BUNDLE_TTL = 600
+
 VNOJ_DISPLAY_RANKS = (
     ('user', _('Normal User')),
     ('setter', _('Problem Setter')),
@@ -236,6 +248,31 @@ DMOJ_CONTEST_DATA_CACHE = ''
 DMOJ_CONTEST_DATA_INTERNAL = ''
 DMOJ_CONTEST_DATA_DOWNLOAD_RATELIMIT = datetime.timedelta(days=1)
 
+# Where submission sources are stored, compressed and deduplicated by their hash:
+# 'judge.utils.source_storage.DatabaseSourceStorage' keeps them in a separate table,
+# 'judge.utils.source_storage.FileSystemSourceStorage' in files under VNOJ_SOURCE_STORAGE_ROOT.
+# Set to None to keep sources uncompressed in the submission source table.
+# Sources moved to a storage are read from it, so it must not be changed without moving them again.
+VNOJ_SOURCE_STORAGE = 'judge.utils.source_storage.DatabaseSourceStorage'
+VNOJ_SOURCE_STORAGE_ROOT = ''
+# 'zstd' if the zstandard package is installed, otherwise sources are compressed with 'zlib'
+VNOJ_SOURCE_COMPRESSION = 'zstd'
+
+# The archive_test_cases command packs the test cases of submissions older than this many days
+# into one row per submission, which the submission status page still reads
+VNOJ_TEST_CASE_ARCHIVE_AGE = 180
+
+# Number of rows on each page of the official ranking of a contest
+VNOJ_CSV_RANKING_PAGE_SIZE = 100
+
+# Contest and user data archives are built in chunks of this many submissions,
+# so that memory usage does not depend on the size of the export
+VNOJ_DATA_EXPORT_CHUNK_SIZE = 500
+# Compress archive entries in a background thread while the next chunk is fetched
+VNOJ_DATA_EXPORT_BACKGROUND_COMPRESSION = True
+# Minimum number of seconds between two progress updates of data export tasks
+VNOJ_DATA_EXPORT_PROGRESS_INTERVAL = 1
+
 DMOJ_COMMENT_VOTE_HIDE_THRESHOLD = -5
 DMOJ_COMMENT_REPLY_TIMEFRAME = datetime.timedelta(days=365)
 
@@ -446,6 +483,7 @@ MIDDLEWARE = (
     'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware',
     'judge.social_auth.SocialAuthExceptionMiddleware',
     'django.contrib.redirects.middleware.RedirectFallbackMiddleware',
+    'judge.replica.ReplicaMiddleware',
 )
 
 IMPERSONATE_REQUIRE_SUPERUSER = True
@@ -673,6 +711,29 @@ DATABASES = {
     },
 }
 
+DATABASE_ROUTERS = ['judge.replica.ReplicaRouter']
+
+# Alias in DATABASES of a read replica of the default database, or None to read everything from the default one.
+# GET requests to the views matching VNOJ_DATABASE_REPLICA_VIEWS read from the replica.
+# To try it out with two local database instances, add a 'replica' entry to DATABASES and set
+# VNOJ_DATABASE_REPLICA_MAX_LAG = None, since a database that is not replicating reports no lag.
+# In tests, the replica should be configured with 'TEST': {'MIRROR': 'default'}.
+VNOJ_DATABASE_REPLICA = None
+# URL names, or dotted paths of unnamed views, as fnmatch patterns
+VNOJ_DATABASE_REPLICA_VIEWS = (
+    'all_submissions', 'all_user_submissions', 'chronological_submissions', 'ranked_submissions',
+    'user_submissions', 'contest_*submissions', 'contest_ranking', 'contest_public_ranking',
+    'contest_official_ranking', 'contest_stats', 'user_list', 'contributors_list', 'stats_*',
+    'judge.views.api.api_v2.*',
+)
+# Clients are pinned to the default database for this many seconds after a POST, so that they read their own writes
+VNOJ_DATABASE_REPLICA_PIN_SECONDS = 10
+# The replica is not used while it is more than this many seconds behind, or not replicating.
+# None skips the check.
+VNOJ_DATABASE_REPLICA_MAX_LAG = 5
+# Seconds between two checks of the replica lag, in each process
+VNOJ_DATABASE_REPLICA_CHECK_INTERVAL = 5
+
 ENABLE_FTS = False
 
 # Balancer configuration
@@ -683,6 +744,39 @@ BRIDGED_JUDGE_ADDRESS = [('localhost', 9999)]
 BRIDGED_JUDGE_PROXIES = None
 BRIDGED_DJANGO_ADDRESS = [('localhost', 9998)]
 BRIDGED_DJANGO_CONNECT = None
+# Number of seconds between two writes of judge latency and load to the database
+BRIDGED_HEARTBEAT_INTERVAL = 10
+# Number of seconds between two full scans of the problem storage by the problem monitor,
+# which is otherwise updated from individual filesystem events
+BRIDGED_MONITOR_RECONCILE_INTERVAL = 3600
+# 'threading' serves each connection with a thread of its own, while 'asyncio' serves all connections on one event
+# loop, running handlers in a pool of BRIDGED_ASYNC_WORKERS threads
+BRIDGED_SERVER_MODE = 'threading'
+BRIDGED_ASYNC_WORKERS = 32
+# Address to serve bridge metrics on in the Prometheus text format, at /metrics, e.g. ('localhost', 9990)
+BRIDGED_METRICS_ADDRESS = None
+# Fraction of the records kept for each action in the judge.json.bridge log, e.g. {'test-case': 0.1}
+# Warnings and errors are always kept
+BRIDGED_JSON_LOG_SAMPLING = {}
+# Maximum length of free-text fields, such as test case output and feedback, in the judge.json.bridge log
+BRIDGED_JSON_LOG_MAX_FIELD_LENGTH = 4096
+# Number of judge.json.bridge records waiting to be written above which new records are dropped
+BRIDGED_JSON_LOG_QUEUE_SIZE = 10000
+# Share judges fairly between users within each priority, instead of first come, first served
+# Submissions charged to an organization share judges as one user
+BRIDGED_FAIR_QUEUE = False
+# Maximum share of an organization relative to a user, growing with its credit, or 0 to give all the same share
+BRIDGED_FAIR_QUEUE_CREDIT_WEIGHT = 0
+# Number of seconds after which a queued rejudge moves up one priority, up to the priority of normal submissions,
+# so that rejudges are never starved, or None to never move them
+# Rejudges that moved up compete with new submissions, and no longer leave a judge free for them.
+BRIDGED_QUEUE_AGING_INTERVAL = None
+# Number of IDE runs a user may have waiting or being graded at once
+BRIDGED_IDE_RUN_CONCURRENCY = 2
+# Number of seconds IDE run results are kept in the bridge, and after which unfinished runs are abandoned
+BRIDGED_IDE_RUN_TTL = 300
+# Maximum number of seconds a request for the result of an IDE run waits for it to finish
+BRIDGED_IDE_RUN_MAX_WAIT = 10
 
 # Event Server configuration
 EVENT_DAEMON_USE = False
@@ -760,6 +854,20 @@ IP_BASED_AUTHENTICATION_HEADER = 'REMOTE_ADDR'
 
 MOSS_API_KEY = None
 
+# Local source similarity checker, used as an offline alternative to MOSS.
+# Sources are compared on winnowed fingerprints of k-grams of normalized tokens.
+VNOJ_SIMILARITY_KGRAM_SIZE = 12
+VNOJ_SIMILARITY_WINDOW_SIZE = 8
+# Minimum similarity (from 0 to 1) for a pair of submissions to be reported
+VNOJ_SIMILARITY_THRESHOLD = 0.5
+# Fingerprints present in more than this fraction of submissions are treated as boilerplate
+VNOJ_SIMILARITY_COMMON_RATIO = 0.3
+# Maximum number of pairs reported per problem and language
+VNOJ_SIMILARITY_PAIR_LIMIT = 100
+# Number of worker processes used for fingerprinting and scoring pairs, None to use all CPUs
+# Daemonic celery prefork workers may not start processes, and do the work themselves.
+VNOJ_SIMILARITY_WORKERS = None
+
 CELERY_WORKER_HIJACK_ROOT_LOGGER = False
 
 WEBAUTHN_RP_ID = None
@@ -109,6 +109,7 @@ urlpatterns = [
     path('accounts/', include(register_patterns)),
     path('', include('social_django.urls')),
     path('problem/run_code', problem.RunCodeView.as_view(), name='problem_run_code'),
+    path('problem/run_code/<str:run_key>', problem.RunCodeResultView.as_view(), name='problem_run_code_result'),
     path('download/account-docx/', contests.download_account_docx, name='download_account_docx'),
 
     path('problems', include([
@@ -242,6 +243,9 @@ urlpatterns = [
         path('/edit', contests.EditContest.as_view(), name='contest_edit'),
         path('/moss', contests.ContestMossView.as_view(), name='contest_moss'),
         path('/moss/delete', contests.ContestMossDelete.as_view(), name='contest_moss_delete'),
+        path('/similarity', contests.ContestSimilarityView.as_view(), name='contest_similarity'),
+        path('/similarity/delete', contests.ContestSimilarityDelete.as_view(), name='contest_similarity_delete'),
+        path('/event_feed.xml', contests.ContestEventFeed.as_view(), name='contest_event_feed'),
         path('/announce', contests.ContestAnnounce.as_view(), name='contest_announce'),
         path('/clone', contests.ContestClone.as_view(), name='contest_clone'),
         path('/ranking/', contests.ContestRanking.as_view(), name='contest_ranking'),
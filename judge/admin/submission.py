@@ -6,6 +6,7 @@ from django.contrib import admin, messages
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.db.models import Q
+from django.forms import CharField, ModelForm
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import path, reverse
@@ -104,17 +105,39 @@ class ContestSubmissionInline(admin.StackedInline):
         return field
 
 
+class SubmissionSourceForm(ModelForm):
+    # The source may live in the source storage rather than in a column, so it is edited through the model property.
+    source = CharField(label=_('source code'), max_length=65536)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial['source'] = self.instance.source
+
+    def save(self, commit=True):
+        if 'source' in self.changed_data:
+            self.instance.source = self.cleaned_data['source']
+        return super().save(commit)
+
+    class Meta:
+        model = SubmissionSource
+        fields = ()
+
+
 class SubmissionSourceInline(admin.StackedInline):
     fields = ('source',)
+    form = SubmissionSourceForm
     model = SubmissionSource
     can_delete = False
     extra = 0
 
     def get_formset(self, request, obj=None, **kwargs):
-        kwargs.setdefault('widgets', {})['source'] = AceWidget(
-            mode=obj and obj.language.ace, theme=request.profile.resolved_ace_theme,
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.form.base_fields['source'] = CharField(
+            label=_('source code'), max_length=65536,
+            widget=AceWidget(mode=obj and obj.language.ace, theme=request.profile.resolved_ace_theme),
         )
-        return super().get_formset(request, obj, **kwargs)
+        return formset
 
 
 class SubmissionAdmin(VersionAdmin):
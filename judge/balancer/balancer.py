@@ -1,7 +1,6 @@
 import hmac
 import logging
 import threading
-from collections import deque
 from functools import partial
 from threading import RLock
 
@@ -9,6 +8,8 @@ from django.conf import settings
 
 from judge.balancer.bridge_handler import BridgeHandler
 from judge.balancer.judge_handler import JudgeHandler
+from judge.balancer.scheduler import BridgeScheduler
+from judge.bridge.metrics import registry
 from judge.bridge.server import Server
 
 
@@ -20,7 +21,6 @@ class JudgeBalancer:
         self.executors = {}
         self.config = config
         self.judges = set()
-        self.queue = deque()
         self.lock = RLock()
         self.judge_to_bridge = {}
         self.bridge_to_judge = {}
@@ -34,6 +34,15 @@ class JudgeBalancer:
         for bridge in config['bridges']:
             bridge_id = len(self.bridges)
             self.bridges.append(BridgeHandler(balancer=self, bridge_id=bridge_id, **bridge))
+        self.scheduler = BridgeScheduler(len(self.bridges))
+
+        registry.gauge('balancer_queue_length', 'Submissions from a bridge waiting for a judge', ('bridge',),
+                       function=self._queue_lengths)
+
+    def _queue_lengths(self):
+        with self.lock:
+            lengths = self.scheduler.queue_lengths()
+        return {('%d:%s' % (bridge.bridge_id, bridge.name),): length for bridge, length in zip(self.bridges, lengths)}
 
     def run(self):
         threading.Thread(target=self.judge_server.serve_forever).start()
@@ -57,10 +66,11 @@ class JudgeBalancer:
 
     def _try_judge(self):
         with self.lock:
-            available = [judge for judge in self.judges if not judge.working]
-            while available and self.queue:
-                judge = available.pop()
-                bridge_id, packet = self.queue.popleft()
+            while True:
+                assignment = self.scheduler.next_assignment()
+                if assignment is None:
+                    break
+                judge, bridge_id, packet = assignment
                 self.judge_to_bridge[judge.name] = bridge_id
                 self.bridge_to_judge[bridge_id] = judge
 
@@ -69,9 +79,10 @@ class JudgeBalancer:
 
     def free_judge(self, judge):
         with self.lock:
-            bridge_id = self.judge_to_bridge[judge.name]
-            del self.judge_to_bridge[judge.name]
-            del self.bridge_to_judge[bridge_id]
+            # The pairing is gone already if the bridge was reset while the judge was grading.
+            bridge_id = self.judge_to_bridge.pop(judge.name, None)
+            self.bridge_to_judge.pop(bridge_id, None)
+            self.scheduler.free_judge(judge)
 
         self._try_judge()
 
@@ -91,8 +102,14 @@ class JudgeBalancer:
             # Disconnect all judges with the same name, see <https://github.com/DMOJ/online-judge/issues/828>
             self.disconnect(judge, force=True)
             self.judges.add(judge)
+            self.scheduler.add_judge(judge)
             self._try_judge()
 
+    def update_problems(self, judge, problems):
+        with self.lock:
+            judge.problems = problems
+        self._try_judge()
+
     def disconnect(self, judge_id, force=False):
         with self.lock:
             for judge in self.judges:
@@ -106,18 +123,23 @@ class JudgeBalancer:
                 del self.judge_to_bridge[judge.name]
                 del self.bridge_to_judge[bridge_id]
             self.judges.discard(judge)
+            self.scheduler.remove_judge(judge)
 
     def set_runtime_versions(self, executors):
-        self.executors = executors
+        # Bridges see the balancer as a single judge, supporting what any of the judges behind it supports.
+        self.executors = dict(self.executors, **executors)
         for bridge in self.bridges:
-            bridge.executors_packet(executors)
+            bridge.executors_packet(self.executors)
 
     def get_runtime_versions(self):
         return self.executors
 
     def queue_submission(self, bridge_id: int, packet: dict):
         with self.lock:
-            self.queue.append((bridge_id, packet))
+            self.scheduler.queue(bridge_id, packet)
+            if not any(judge.can_judge(packet['problem-id'], packet['language']) for judge in self.judges):
+                logger.warning('No connected judge can grade submission %s (%s, %s) from bridge %d',
+                               packet['submission-id'], packet['problem-id'], packet['language'], bridge_id)
         self._try_judge()
 
     def abort_submission(self, bridge_id):
@@ -3,6 +3,7 @@ import signal
 import threading
 
 from judge.balancer.balancer import JudgeBalancer
+from judge.bridge.metrics import start_metrics_server
 
 logger = logging.getLogger('judge.balancer')
 
@@ -11,6 +12,11 @@ def balancer_daemon(config):
     balancer = JudgeBalancer(config)
     balancer.run()
 
+    # Per-bridge queue lengths, among other metrics, are served in the Prometheus format if configured.
+    metrics_server = None
+    if config.get('metrics_address'):
+        metrics_server = start_metrics_server(config['metrics_address'])
+
     stop = threading.Event()
 
     def signal_handler(signum, _):
@@ -25,3 +31,5 @@ def balancer_daemon(config):
         stop.wait()
     finally:
         balancer.shutdown()
+        if metrics_server is not None:
+            metrics_server.shutdown()
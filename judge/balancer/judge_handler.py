@@ -29,12 +29,14 @@ class JudgeHandler(ZlibPacketHandler):
             'submission-terminated': self.forward_packet_and_free_self,
             'submission-acknowledged': self.on_submission_acknowledged,
             'ping-response': self.ignore_packet,
-            'supported-problems': self.ignore_packet,
+            'supported-problems': self.on_supported_problems,
             'handshake': self.on_handshake,
         }
         self.current_submission_id = None
         self._no_response_job = None
         self.name = None
+        self.executors = frozenset()
+        self.problems = frozenset()
         self._stop_ping = threading.Event()
 
     def on_connect(self):
@@ -67,6 +69,8 @@ class JudgeHandler(ZlibPacketHandler):
 
         self.timeout = 60
         self.name = packet['id']
+        self.executors = frozenset(packet['executors'])
+        self.problems = frozenset(problem[0] for problem in packet['problems'])
 
         self.send({'name': 'handshake-success'})
         logger.info('Judge authenticated: %s (%s)', self.client_address, packet['id'])
@@ -78,6 +82,9 @@ class JudgeHandler(ZlibPacketHandler):
     def working(self):
         return bool(self.current_submission_id)
 
+    def can_judge(self, problem, executor):
+        return problem in self.problems and executor in self.executors
+
     def disconnect(self, force=False):
         if force:
             # Yank the power out.
@@ -140,6 +147,10 @@ class JudgeHandler(ZlibPacketHandler):
         self.current_submission_id = None
         self.balancer.free_judge(self)
 
+    def on_supported_problems(self, packet):
+        logger.info('%s: Updated problem list', self.name)
+        self.balancer.update_problems(self, frozenset(problem[0] for problem in packet['problems']))
+
     def ignore_packet(self, packet):
         pass
 
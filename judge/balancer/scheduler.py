@@ -0,0 +1,62 @@
+from collections import deque
+
+
+class BridgeScheduler:
+    """
+    Matches submissions queued by upstream bridges to free judges able to grade them.
+
+    Each bridge sees the balancer as a single judge, so it has at most one submission waiting or being graded here.
+    Bridges with a waiting submission take turns in round robin, so that a bridge is served again only after the
+    others were, and a submission that no free judge can grade does not hold up those of other bridges. Not
+    thread-safe: the balancer calls it under its lock.
+    """
+
+    def __init__(self, bridge_count):
+        self.queues = [deque() for _ in range(bridge_count)]
+        self.rotation = deque(range(bridge_count))
+        self.free_judges = set()
+        self.queued = 0
+
+    def add_judge(self, judge):
+        if not judge.working:
+            self.free_judges.add(judge)
+
+    def free_judge(self, judge):
+        self.free_judges.add(judge)
+
+    def remove_judge(self, judge):
+        self.free_judges.discard(judge)
+
+    def queue(self, bridge_id, packet):
+        self.queues[bridge_id].append(packet)
+        self.queued += 1
+
+    def queue_lengths(self):
+        return [len(queue) for queue in self.queues]
+
+    def _find_judge(self, packet):
+        problem, language = packet['problem-id'], packet['language']
+        return next((judge for judge in self.free_judges if judge.can_judge(problem, language)), None)
+
+    def _take(self, bridge_id):
+        queue = self.queues[bridge_id]
+        for index, packet in enumerate(queue):
+            judge = self._find_judge(packet)
+            if judge is not None:
+                del queue[index]
+                self.queued -= 1
+                self.free_judges.discard(judge)
+                return judge, bridge_id, packet
+
+    def next_assignment(self):
+        """Returns the next (judge, bridge_id, packet) to dispatch, marking the judge busy, or None."""
+        if not self.free_judges or not self.queued:
+            return None
+
+        for _ in range(len(self.rotation)):
+            bridge_id = self.rotation[0]
+            self.rotation.rotate(-1)
+            assignment = self._take(bridge_id)
+            if assignment is not None:
+                return assignment
+        return None
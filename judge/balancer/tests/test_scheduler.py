@@ -0,0 +1,159 @@
+import unittest
+from collections import Counter
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from judge.balancer.balancer import JudgeBalancer
+from judge.balancer.scheduler import BridgeScheduler
+
+
+class FakeJudge:
+    def __init__(self, name, problems, executors):
+        self.name = name
+        self.problems = set(problems)
+        self.executors = set(executors)
+        self.working = False
+        self.submitted = []
+
+    def submit(self, packet):
+        self.working = True
+        self.submitted.append(packet)
+
+    def can_judge(self, problem, executor):
+        return problem in self.problems and executor in self.executors
+
+
+def make_packet(bridge_id, number, problem='aplusb', language='PY3'):
+    return {'submission-id': '%d-%d' % (bridge_id, number), 'problem-id': problem, 'language': language}
+
+
+class Simulation:
+    """
+    Runs judges in lock step: every tick, each busy judge finishes and free judges take new submissions.
+
+    Like a real bridge, which sees the balancer as one judge, each bridge sends its next submission from its backlog
+    only once the previous one is graded.
+    """
+
+    def __init__(self, bridge_count, judges):
+        self.scheduler = BridgeScheduler(bridge_count)
+        self.judges = judges
+        self.backlogs = [0] * bridge_count
+        self.sent = [0] * bridge_count
+        self.in_flight = [False] * bridge_count
+        self.dispatched = []
+        for judge in judges:
+            self.scheduler.add_judge(judge)
+
+    def tick(self):
+        for judge in self.judges:
+            if judge.working:
+                judge.working = False
+                self.in_flight[judge.bridge_id] = False
+                self.scheduler.free_judge(judge)
+
+        for bridge_id, backlog in enumerate(self.backlogs):
+            if backlog and not self.in_flight[bridge_id]:
+                self.scheduler.queue(bridge_id, make_packet(bridge_id, self.sent[bridge_id]))
+                self.backlogs[bridge_id] -= 1
+                self.sent[bridge_id] += 1
+                self.in_flight[bridge_id] = True
+
+        while True:
+            assignment = self.scheduler.next_assignment()
+            if assignment is None:
+                break
+            judge, bridge_id, packet = assignment
+            judge.working = True
+            judge.bridge_id = bridge_id
+            self.dispatched.append((judge, bridge_id, packet))
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.tick()
+
+
+class BridgeSchedulerTestCase(unittest.TestCase):
+    def test_capable_judges_only(self):
+        simulation = Simulation(2, [
+            FakeJudge('python', ['aplusb', 'hello'], ['PY3']),
+            FakeJudge('cpp', ['aplusb'], ['CPP17']),
+        ])
+        simulation.scheduler.queue(0, make_packet(0, 0, language='CPP17'))
+        simulation.scheduler.queue(0, make_packet(0, 1, problem='hello'))
+        simulation.scheduler.queue(1, make_packet(1, 0))
+        simulation.run(3)
+
+        self.assertEqual(len(simulation.dispatched), 3)
+        for judge, bridge_id, packet in simulation.dispatched:
+            self.assertTrue(judge.can_judge(packet['problem-id'], packet['language']))
+        self.assertEqual(simulation.scheduler.queue_lengths(), [0, 0])
+
+    def test_unjudgeable_does_not_block(self):
+        simulation = Simulation(1, [FakeJudge('python', ['aplusb'], ['PY3'])])
+        simulation.scheduler.queue(0, make_packet(0, 0, problem='missing'))
+        simulation.scheduler.queue(0, make_packet(0, 1))
+        simulation.run(2)
+
+        self.assertEqual([packet['submission-id'] for _, _, packet in simulation.dispatched], ['0-1'])
+        self.assertEqual(simulation.scheduler.queue_lengths(), [1])
+
+    def test_bridges_take_turns(self):
+        simulation = Simulation(3, [FakeJudge('judge', ['aplusb'], ['PY3'])])
+        simulation.backlogs = [10, 10, 10]
+        simulation.run(9)
+
+        self.assertEqual([bridge_id for _, bridge_id, _ in simulation.dispatched], [0, 1, 2] * 3)
+
+    def test_quiet_bridge_is_served_next(self):
+        simulation = Simulation(3, [FakeJudge('judge%d' % i, ['aplusb'], ['PY3']) for i in range(2)])
+        simulation.backlogs = [100, 100, 0]
+        simulation.run(5)
+        simulation.backlogs[2] = 1
+        simulation.run(1)
+
+        # The quiet bridge is served in the first tick after it queues, despite the backlogs of the busy ones.
+        self.assertIn(2, [bridge_id for _, bridge_id, _ in simulation.dispatched[-2:]])
+        simulation.run(2)
+        counts = Counter(bridge_id for _, bridge_id, _ in simulation.dispatched)
+        self.assertLessEqual(abs(counts[0] - counts[1]), 1)
+
+    def test_idle_judges_stay_free(self):
+        simulation = Simulation(2, [FakeJudge('judge', ['aplusb'], ['PY3'])])
+        simulation.run(1)
+        self.assertEqual(simulation.dispatched, [])
+        self.assertEqual(simulation.scheduler.free_judges, set(simulation.judges))
+
+
+@override_settings(BALANCER_JUDGE_ADDRESS=[('localhost', 0)])
+class JudgeBalancerTestCase(SimpleTestCase):
+    def setUp(self):
+        # No sockets: the bridges and the judge server are never started.
+        for name in ('BridgeHandler', 'Server'):
+            patcher = mock.patch('judge.balancer.balancer.' + name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.balancer = JudgeBalancer({'bridges': [{}, {}], 'judges': []})
+        self.judge = FakeJudge('judge', ['aplusb'], ['PY3'])
+        self.balancer.register_judge(self.judge)
+
+    def test_free_judge(self):
+        self.balancer.queue_submission(0, make_packet(0, 0))
+        self.assertEqual(self.balancer.get_paired_bridge('judge'), 0)
+
+        self.judge.working = False
+        self.balancer.free_judge(self.judge)
+        self.assertIsNone(self.balancer.get_paired_bridge('judge'))
+        self.assertEqual(self.balancer.scheduler.free_judges, {self.judge})
+
+    def test_free_judge_after_bridge_reset(self):
+        self.balancer.queue_submission(0, make_packet(0, 0))
+        self.balancer.reset_bridge(0)
+
+        # The judge finishes the submission of the reset bridge, and is free to grade the next one.
+        self.judge.working = False
+        self.balancer.free_judge(self.judge)
+        self.balancer.queue_submission(1, make_packet(1, 0))
+        self.assertEqual([packet['submission-id'] for packet in self.judge.submitted], ['0-0', '1-0'])
+        self.assertEqual(self.balancer.get_paired_bridge('judge'), 1)
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import threading
+import zlib
+
+from judge.bridge.base_handler import Disconnect, MAX_ALLOWED_PACKET_SIZE, size_pack
+
+logger = logging.getLogger('judge.bridge')
+
+
+class AsyncRequest:
+    """
+    Stands in for the socket of a connection served by an `AsyncServer`.
+
+    Handlers only use the socket to send data, close the connection and set the read timeout, so this implements
+    those on top of an asyncio stream. Sends may come from any thread. Like `socket.sendall`, they block while the
+    client is not reading fast enough, but they only wait for the loop once the write buffer is full.
+    """
+
+    # Number of buffered bytes above which senders wait for the buffer to be flushed
+    WRITE_BUFFER_LIMIT = 64 * 1024
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self._timeout = None
+
+    def gettimeout(self):
+        return self._timeout
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    async def _write(self, buffers):
+        self.writer.writelines(buffers)
+        await self.writer.drain()
+
+    def sendmsg(self, buffers):
+        # The caller may reuse the list once this returns.
+        buffers = list(buffers)
+        if self.writer.is_closing():
+            raise ConnectionResetError('connection closed')
+        if self.writer.transport.get_write_buffer_size() < self.WRITE_BUFFER_LIMIT:
+            self.loop.call_soon_threadsafe(self.writer.writelines, buffers)
+        else:
+            asyncio.run_coroutine_threadsafe(self._write(buffers), self.loop).result()
+        return sum(map(len, buffers))
+
+    def sendall(self, data):
+        self.sendmsg([data])
+
+    def shutdown(self, how):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+
+class AsyncListener:
+    """
+    Passed to handlers as their `server`, mirroring `ThreadingTCPListener`.
+
+    Handlers of this server may return a coroutine from `on_packet`, which is then awaited on the loop instead of
+    holding a worker thread. Such a coroutine must send through `run_in_executor`, as sending may block.
+    """
+
+    runs_coroutines = True
+
+    def __init__(self, server, server_address):
+        self.server = server
+        self.server_address = server_address
+
+    def run_in_executor(self, function, *args):
+        return self.server.loop.run_in_executor(self.server.executor, function, *args)
+
+    def call_periodically(self, interval, function, stop):
+        loop = self.server.loop
+        executor = self.server.executor
+
+        def schedule(future=None):
+            if not stop.is_set():
+                loop.call_later(interval, run)
+
+        def run():
+            if not stop.is_set():
+                loop.run_in_executor(executor, function).add_done_callback(schedule)
+
+        loop.call_soon_threadsafe(run)
+
+
+class AsyncServer:
+    """
+    Serves the zlib packet protocol of `ZlibPacketHandler` for all connections on a single asyncio event loop.
+
+    The loop does all the socket work: accepting connections, framing packets, reading PROXY protocol headers and
+    enforcing timeouts. Handler callbacks, which may block on the database, run in `executor`, one at a time for
+    each connection, so handlers behave exactly as they do with the threaded `Server`, while the number of threads
+    is bounded by the executor instead of the number of connections.
+    """
+
+    # Number of seconds to wait for handlers to finish on shutdown
+    SHUTDOWN_TIMEOUT = 10
+
+    def __init__(self, addresses, executor, handler_class, **handler_kwargs):
+        self.addresses = addresses
+        self.executor = executor
+        self.handler_class = handler_class
+        self.handler_kwargs = handler_kwargs
+        self.loop = None
+        self._stop = None
+        self._started = threading.Event()
+        self._connections = set()
+
+    def _call(self, function, *args):
+        return self.loop.run_in_executor(self.executor, function, *args)
+
+    async def _read(self, reader, handler, size):
+        return await asyncio.wait_for(reader.readexactly(size), handler.request.gettimeout())
+
+    async def _read_packet(self, reader, handler, size):
+        if size > MAX_ALLOWED_PACKET_SIZE:
+            logger.log(logging.WARNING if handler._got_packet else logging.INFO,
+                       'Disconnecting client due to too-large message size (%d bytes): %s',
+                       size, handler.client_address)
+            raise Disconnect()
+        result = await self._call(handler._on_packet, await self._read(reader, handler, size))
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _serve(self, reader, handler):
+        tag = await self._read(reader, handler, size_pack.size)
+        handler._initial_tag = tag
+        if handler.client_address[0] in handler.proxies and tag == b'PROX':
+            # Max line length for PROXY protocol is 107, and we received 4 already.
+            try:
+                line = await asyncio.wait_for(reader.readuntil(b'\r\n'), handler.request.gettimeout())
+            except (asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+                raise Disconnect()
+            if len(line) > 107:
+                raise Disconnect()
+            handler.parse_proxy_protocol(tag + line[:-2])
+        else:
+            await self._read_packet(reader, handler, size_pack.unpack(tag)[0])
+
+        while True:
+            size = size_pack.unpack(await self._read(reader, handler, size_pack.size))[0]
+            await self._read_packet(reader, handler, size)
+
+    async def _handle_connection(self, listener, reader, writer):
+        request = AsyncRequest(self.loop, writer)
+        client_address = writer.get_extra_info('peername')
+        try:
+            handler = self.handler_class.create(request, client_address, listener, **self.handler_kwargs)
+        except Exception:
+            logger.exception('Failed to create handler for %s', client_address)
+            writer.close()
+            return
+
+        self._connections.add(writer)
+        try:
+            await self._call(handler.on_connect)
+            await self._serve(reader, handler)
+        except (Disconnect, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except zlib.error:
+            if handler._got_packet:
+                logger.warning('Encountered zlib error during packet handling, disconnecting client: %s',
+                               handler.client_address, exc_info=True)
+            else:
+                logger.info('Potentially wrong protocol (zlib error): %s: %r', handler.client_address,
+                            handler._initial_tag, exc_info=True)
+        except asyncio.TimeoutError:
+            if handler._got_packet:
+                logger.info('Socket timed out: %s', handler.client_address)
+                await self._call(handler.on_timeout)
+            else:
+                logger.info('Potentially wrong protocol: %s: %r', handler.client_address, handler._initial_tag)
+        except Exception:
+            logger.exception('Error in base packet handling')
+        finally:
+            try:
+                await self._call(handler.on_cleanup)
+                await self._call(handler.on_disconnect)
+            except Exception:
+                logger.exception('Error in base packet handling')
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _main(self):
+        self._stop = asyncio.Event()
+        servers = []
+        tasks = set()
+
+        def accept(listener, reader, writer):
+            task = self.loop.create_task(self._handle_connection(listener, reader, writer))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        try:
+            for host, port in self.addresses:
+                listener = AsyncListener(self, (host, port))
+                servers.append(await asyncio.start_server(
+                    lambda reader, writer, listener=listener: accept(listener, reader, writer),
+                    host, port, reuse_address=True,
+                ))
+        finally:
+            self._started.set()
+
+        try:
+            await self._stop.wait()
+        finally:
+            for server in servers:
+                server.close()
+            # Closing the connections lets their handlers clean up as if the clients disconnected.
+            for writer in list(self._connections):
+                writer.close()
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.SHUTDOWN_TIMEOUT)
+
+    def serve_forever(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self._started.set()
+            self.loop.close()
+
+    def shutdown(self):
+        self._started.wait()
+        if self._stop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop.set)
@@ -1,6 +1,7 @@
 import logging
 import socket
 import struct
+import threading
 import zlib
 from itertools import chain
 
@@ -14,6 +15,8 @@ size_pack = struct.Struct('!I')
 assert size_pack.size == 4
 
 MAX_ALLOWED_PACKET_SIZE = 8 * 1024 * 1024
+# Packets are received and decompressed in chunks of at most this size.
+READ_BUFFER_SIZE = 64 * 1024
 
 
 def proxy_list(human_readable):
@@ -48,6 +51,10 @@ class RequestHandlerMeta(type):
         finally:
             handler.on_disconnect()
 
+    def create(cls, *args, **kwargs):
+        """Creates a handler without handling the request, for servers that drive handlers themselves."""
+        return super().__call__(*args, **kwargs)
+
 
 class ZlibPacketHandler(metaclass=RequestHandlerMeta):
     proxies = []
@@ -59,6 +66,9 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
         self.server_address = server.server_address
         self._initial_tag = None
         self._got_packet = False
+        self._read_buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+        self._size_buffer = memoryview(bytearray(size_pack.size))
+        self._send_lock = threading.Lock()
 
     @property
     def timeout(self):
@@ -74,19 +84,40 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
                        'Disconnecting client due to too-large message size (%d bytes): %s', size, self.client_address)
             raise Disconnect()
 
-        buffer = []
+        buffer = self._read_buffer
+        if not initial and size <= READ_BUFFER_SIZE:
+            # Small packets are read whole into the reusable buffer and decompressed in one go.
+            received = 0
+            while received < size:
+                count = self.request.recv_into(buffer[received:size])
+                if not count:
+                    raise Disconnect()
+                received += count
+            self._on_packet(buffer[:size])
+            return
+
+        # Large packets are decompressed as they arrive, so that the compressed packet is never held in memory as a
+        # whole.
+        decompressor = zlib.decompressobj()
+        chunks = []
         remainder = size
 
         if initial:
-            buffer.append(initial)
+            chunks.append(decompressor.decompress(initial))
             remainder -= len(initial)
             assert remainder >= 0
 
         while remainder:
-            data = self.request.recv(remainder)
-            remainder -= len(data)
-            buffer.append(data)
-        self._on_packet(b''.join(buffer))
+            received = self.request.recv_into(buffer[:min(remainder, READ_BUFFER_SIZE)])
+            if not received:
+                raise Disconnect()
+            remainder -= received
+            chunks.append(decompressor.decompress(buffer[:received]))
+        chunks.append(decompressor.flush())
+
+        if not decompressor.eof:
+            raise zlib.error('Error -5 while decompressing data: incomplete or truncated stream')
+        self._on_decompressed_packet(b''.join(chunks))
 
     def parse_proxy_protocol(self, line):
         words = line.split()
@@ -106,12 +137,15 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
             raise Disconnect()
 
     def read_size(self, buffer=b''):
-        while len(buffer) < size_pack.size:
-            recv = self.request.recv(size_pack.size - len(buffer))
-            if not recv:
+        header = self._size_buffer
+        length = len(buffer)
+        header[:length] = buffer
+        while length < size_pack.size:
+            received = self.request.recv_into(header[length:])
+            if not received:
                 raise Disconnect()
-            buffer += recv
-        return size_pack.unpack(buffer)[0]
+            length += received
+        return size_pack.unpack(header)[0]
 
     def read_proxy_header(self, buffer=b''):
         # Max line length for PROXY protocol is 107, and we received 4 already.
@@ -125,9 +159,12 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
         return buffer
 
     def _on_packet(self, data):
-        decompressed = zlib.decompress(data).decode('utf-8')
+        return self._on_decompressed_packet(zlib.decompress(data))
+
+    def _on_decompressed_packet(self, data):
+        decompressed = data.decode('utf-8')
         self._got_packet = True
-        self.on_packet(decompressed)
+        return self.on_packet(decompressed)
 
     def on_packet(self, data):
         raise NotImplementedError()
@@ -195,7 +232,25 @@ class ZlibPacketHandler(metaclass=RequestHandlerMeta):
 
     def send(self, data):
         compressed = zlib.compress(data.encode('utf-8'))
-        self.request.sendall(size_pack.pack(len(compressed)) + compressed)
+        self._send_buffers([size_pack.pack(len(compressed)), compressed])
+
+    def _send_buffers(self, buffers):
+        # Packets may be sent from several threads, e.g. pings, and must not be interleaved.
+        with self._send_lock:
+            if not hasattr(self.request, 'sendmsg'):
+                for buffer in buffers:
+                    self.request.sendall(buffer)
+                return
+
+            # Send the header and the body without concatenating them, resuming after partial sends.
+            buffers = [memoryview(buffer) for buffer in buffers]
+            while buffers:
+                sent = self.request.sendmsg(buffers)
+                while buffers and sent >= len(buffers[0]):
+                    sent -= len(buffers[0])
+                    buffers.pop(0)
+                if buffers:
+                    buffers[0] = buffers[0][sent:]
 
     def close(self):
         self.request.shutdown(socket.SHUT_RDWR)
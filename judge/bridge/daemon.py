@@ -1,14 +1,20 @@
 import logging
 import signal
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 from django.conf import settings
 
+from judge.bridge.async_server import AsyncServer
 from judge.bridge.django_handler import DjangoHandler
+from judge.bridge.heartbeat import HeartbeatAggregator
+from judge.bridge.ide_runs import IdeRunStore
 from judge.bridge.judge_handler import JudgeHandler
 from judge.bridge.judge_list import JudgeList
+from judge.bridge.metrics import start_metrics_server
 from judge.bridge.server import Server
+from judge.bridge.structured_log import JsonLog
 from judge.models import Judge, Submission
 
 logger = logging.getLogger('judge.bridge')
@@ -18,25 +24,43 @@ def reset_judges():
     Judge.objects.update(online=False, ping=None, load=None)
 
 
-def judge_daemon(run_monitor=False, problem_storage_globs=None):
+def judge_daemon(run_monitor=False, problem_storage_globs=None, server_mode=None):
+    json_log = JsonLog('judge.json.bridge', settings.BRIDGED_JSON_LOG_SAMPLING,
+                       settings.BRIDGED_JSON_LOG_MAX_FIELD_LENGTH, settings.BRIDGED_JSON_LOG_QUEUE_SIZE)
+    json_log.start()
+
     reset_judges()
     Submission.objects.filter(status__in=Submission.IN_PROGRESS_GRADING_STATUS) \
         .update(status='IE', result='IE', error=None)
-    judges = JudgeList()
+    judges = JudgeList(settings.BRIDGED_FAIR_QUEUE, settings.BRIDGED_QUEUE_AGING_INTERVAL)
+    heartbeats = HeartbeatAggregator(settings.BRIDGED_HEARTBEAT_INTERVAL)
+    ide_runs = IdeRunStore(settings.BRIDGED_IDE_RUN_CONCURRENCY, settings.BRIDGED_IDE_RUN_TTL)
 
     monitor = None
     if run_monitor:
         from judge.bridge.monitor import Monitor
-        monitor = Monitor(judges, problem_storage_globs or [])
+        monitor = Monitor(judges, problem_storage_globs or [], settings.BRIDGED_MONITOR_RECONCILE_INTERVAL)
+
+    judge_kwargs = {'judges': judges, 'ignore_problems_packet': run_monitor, 'heartbeats': heartbeats,
+                    'ide_runs': ide_runs}
+    django_kwargs = {'judges': judges, 'ide_runs': ide_runs}
+    executor = None
+    if (server_mode or settings.BRIDGED_SERVER_MODE) == 'asyncio':
+        # Handlers of both servers share the same bounded pool, so database work is bounded as well.
+        executor = ThreadPoolExecutor(settings.BRIDGED_ASYNC_WORKERS, thread_name_prefix='bridge')
+        judge_server = AsyncServer(settings.BRIDGED_JUDGE_ADDRESS, executor, JudgeHandler, **judge_kwargs)
+        django_server = AsyncServer(settings.BRIDGED_DJANGO_ADDRESS, executor, DjangoHandler, **django_kwargs)
+    else:
+        judge_server = Server(settings.BRIDGED_JUDGE_ADDRESS, partial(JudgeHandler, **judge_kwargs))
+        django_server = Server(settings.BRIDGED_DJANGO_ADDRESS, partial(DjangoHandler, **django_kwargs))
 
-    judge_server = Server(
-        settings.BRIDGED_JUDGE_ADDRESS,
-        partial(JudgeHandler, judges=judges, ignore_problems_packet=run_monitor),
-    )
-    django_server = Server(settings.BRIDGED_DJANGO_ADDRESS, partial(DjangoHandler, judges=judges))
+    metrics_server = None
+    if settings.BRIDGED_METRICS_ADDRESS:
+        metrics_server = start_metrics_server(settings.BRIDGED_METRICS_ADDRESS)
 
     if monitor is not None:
         monitor.start()
+    heartbeats.start()
     threading.Thread(target=django_server.serve_forever).start()
     threading.Thread(target=judge_server.serve_forever).start()
 
@@ -57,3 +81,12 @@ def judge_daemon(run_monitor=False, problem_storage_globs=None):
             monitor.stop()
         django_server.shutdown()
         judge_server.shutdown()
+        if executor is not None:
+            executor.shutdown()
+        heartbeats.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        json_log.stop()
+        logger.info('JudgeList lock held %d times, p50: %.6fs, p99: %.6fs, max: %.6fs',
+                    judges.lock_hold_time.count, judges.lock_hold_time.quantile(0.5),
+                    judges.lock_hold_time.quantile(0.99), judges.lock_hold_time.max)
@@ -1,17 +1,53 @@
+import asyncio
 import json
 import logging
 import struct
+import time
+from concurrent.futures import TimeoutError
 
 from django import db
+from django.conf import settings
 
 from judge.bridge.base_handler import Disconnect, ZlibPacketHandler
+from judge.bridge.judge_handler import get_ide_run_packet, get_submission_flow, get_submission_packet
+from judge.bridge.metrics import registry
+from judge.judge_priority import DEFAULT_PRIORITY
 
 logger = logging.getLogger('judge.bridge')
 size_pack = struct.Struct('!I')
 
+request_time = registry.histogram('bridge_django_request_seconds', 'Time spent handling requests from the site',
+                                  ('request',))
+
+
+class DeferredReply:
+    """
+    Returned by request handlers that wait for something other than the database: the reply is made by `reply`
+    once `future` is set, or after `timeout` seconds.
+    """
+
+    def __init__(self, future, timeout, reply):
+        self.future = future
+        self.timeout = timeout
+        self.reply = reply
+
+    def wait(self):
+        try:
+            self.future.result(self.timeout)
+        except TimeoutError:
+            pass
+        return self.reply()
+
+    async def wait_async(self):
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.reply()
+
 
 class DjangoHandler(ZlibPacketHandler):
-    def __init__(self, request, client_address, server, judges):
+    def __init__(self, request, client_address, server, judges, ide_runs=None):
         super().__init__(request, client_address, server)
 
         self.handlers = {
@@ -19,19 +55,42 @@ class DjangoHandler(ZlibPacketHandler):
             'terminate-submission': self.on_termination,
             'disconnect-judge': self.on_disconnect_request,
             'disable-judge': self.on_disable_judge,
+            'bridge-stats': self.on_bridge_stats,
+            'ide-run-request': self.on_ide_run,
+            'ide-run-result': self.on_ide_run_result,
         }
         self.judges = judges
+        self.ide_runs = ide_runs
 
     def send(self, data):
         super().send(json.dumps(data, separators=(',', ':')))
 
     def on_packet(self, packet):
         packet = json.loads(packet)
+        name = packet.get('name', None)
+        handler = self.handlers.get(name)
+        if handler is None:
+            name, handler = 'unknown', self.on_malformed
+        start = time.perf_counter()
         try:
-            result = self.handlers.get(packet.get('name', None), self.on_malformed)(packet)
+            result = handler(packet)
         except Exception:
             logger.exception('Error in packet handling (Django-facing)')
             result = {'name': 'bad-request'}
+
+        if isinstance(result, DeferredReply):
+            if getattr(self.server, 'runs_coroutines', False):
+                # The asyncio server waits on its loop, leaving the worker threads it shares between all connections
+                # to requests that need them.
+                return self._reply_later(name, start, result)
+            result = result.wait()
+        self._reply(name, start, result)
+
+    async def _reply_later(self, name, start, deferred):
+        await self.server.run_in_executor(self._reply, name, start, await deferred.wait_async())
+
+    def _reply(self, name, start, result):
+        request_time.observe(time.perf_counter() - start, request=name)
         self.send(result)
         raise Disconnect()
 
@@ -45,7 +104,13 @@ class DjangoHandler(ZlibPacketHandler):
         banned_judges = data['banned-judges']
         if not self.judges.check_priority(priority):
             return {'name': 'bad-request'}
-        self.judges.judge(id, problem, language, source, judge_id, priority, banned_judges)
+        packet = get_submission_packet(id, problem, language, source)
+        if packet is None:
+            return {'name': 'bad-request'}
+        flow, weight = None, 1
+        if settings.BRIDGED_FAIR_QUEUE:
+            flow, weight = get_submission_flow(id, packet['meta']['user'])
+        self.judges.judge(id, problem, language, packet, judge_id, priority, banned_judges, flow=flow, weight=weight)
         return {'name': 'submission-received', 'submission-id': id}
 
     def on_termination(self, data):
@@ -61,6 +126,41 @@ class DjangoHandler(ZlibPacketHandler):
         is_disabled = data['is-disabled']
         self.judges.update_disable_judge(judge_id, is_disabled)
 
+    def on_bridge_stats(self, data):
+        return {'name': 'bridge-stats', 'metrics': registry.snapshot()}
+
+    def _expire_ide_runs(self):
+        # Runs are expired whenever they are started or polled, so that a run that never finishes is abandoned, and
+        # its slot freed, even if nobody else starts one.
+        for id in self.ide_runs.expire():
+            self.judges.abort(id)
+
+    def on_ide_run(self, data):
+        self._expire_ide_runs()
+
+        user = data['user']
+        run = self.ide_runs.start(user)
+        if run is None:
+            return {'name': 'ide-run-rejected', 'reason': 'too-many-runs'}
+        packet = get_ide_run_packet(run.id, data['language'], data['source'], data['input'], data['time-limit'],
+                                    data['memory-limit'], user)
+        self.judges.judge(run.id, 'run_ide', data['language'], packet, None, DEFAULT_PRIORITY)
+        return {'name': 'ide-run-received', 'run-key': run.key}
+
+    def on_ide_run_result(self, data):
+        self._expire_ide_runs()
+
+        wait = min(max(data.get('wait', 0), 0), settings.BRIDGED_IDE_RUN_MAX_WAIT)
+        run = self.ide_runs.find(data['run-key'], data['user'])
+        if run is None:
+            return {'name': 'bad-request'}
+
+        def reply():
+            done, result = self.ide_runs.result(run)
+            return {'name': 'ide-run-result', 'done': done, 'result': result}
+
+        return DeferredReply(run.done, wait, reply)
+
     def on_malformed(self, packet):
         logger.error('Malformed packet: %s', packet)
 
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import statistics
+import struct
+import time
+import zlib
+
+size_pack = struct.Struct('!I')
+
+
+async def _read_packet(reader):
+    size = size_pack.unpack(await reader.readexactly(size_pack.size))[0]
+    return zlib.decompress(await reader.readexactly(size))
+
+
+async def _client(host, port, requests, packet, ready, start, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    ready.release()
+    await start.wait()
+    try:
+        for _ in range(requests):
+            begin = time.perf_counter()
+            writer.write(packet)
+            await _read_packet(reader)
+            latencies.append(time.perf_counter() - begin)
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, requests, size):
+    """
+    Opens `connections` persistent connections to an echo server, then has all of them echo `requests` packets of
+    `size` bytes one after another, concurrently. Returns the connection setup time, the total time taken by the
+    echoes and their latencies.
+    """
+    payload = zlib.compress(b'x' * size)
+    packet = size_pack.pack(len(payload)) + payload
+    ready = asyncio.Semaphore(0)
+    start = asyncio.Event()
+    latencies = []
+
+    begin = time.perf_counter()
+    tasks = [asyncio.create_task(_client(host, port, requests, packet, ready, start, latencies))
+             for _ in range(connections)]
+    for _ in range(connections):
+        await ready.acquire()
+    connected = time.perf_counter()
+
+    start.set()
+    await asyncio.gather(*tasks)
+    return connected - begin, time.perf_counter() - connected, latencies
+
+
+async def run_short_lived(host, port, connections, concurrency, size):
+    """Opens `connections` connections echoing a single packet each, at most `concurrency` at a time, like Django
+    does when talking to the bridge. Returns the total time taken."""
+    payload = zlib.compress(b'x' * size)
+    packet = size_pack.pack(len(payload)) + payload
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def client():
+        async with semaphore:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(packet)
+            await _read_packet(reader)
+            writer.close()
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how an echo server scales with the number of connections, '
+                                                 'see judge.bridge.echo_test_server.')
+    parser.add_argument('-l', '--host', default='localhost')
+    parser.add_argument('-p', '--port', default=9999, type=int)
+    parser.add_argument('-c', '--connections', default='10,100,500', help='comma separated connection counts')
+    parser.add_argument('-r', '--requests', default=100, type=int, help='packets echoed by each connection')
+    parser.add_argument('-s', '--size', default=1024, type=int, help='size of each packet in bytes')
+    parser.add_argument('--short-lived', default=1000, type=int,
+                        help='number of single packet connections to open after the persistent ones')
+    args = parser.parse_args()
+
+    for connections in map(int, args.connections.split(',')):
+        setup, elapsed, latencies = asyncio.run(run(args.host, args.port, connections, args.requests, args.size))
+        latencies.sort()
+        print('%5d connections: setup %.3fs, %8.0f packets/s, latency p50 %.2fms p99 %.2fms' % (
+            connections, setup, len(latencies) / elapsed,
+            statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99)] * 1000,
+        ))
+
+    if args.short_lived:
+        elapsed = asyncio.run(run_short_lived(args.host, args.port, args.short_lived, 50, args.size))
+        print('%5d short-lived connections: %.0f connections/s' % (args.short_lived, args.short_lived / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -23,15 +23,63 @@ def dezlibify(data, skip_head=True):
     return zlib.decompress(data).decode('utf-8')
 
 
+def read_packet(sock):
+    header = b''
+    while len(header) < size_pack.size:
+        data = sock.recv(size_pack.size - len(header))
+        if not data:
+            raise ValueError('Server disconnected')
+        header += data
+    size = size_pack.unpack(header)[0]
+    body = bytearray(size)
+    view = memoryview(body)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ValueError('Server disconnected')
+        received += count
+    return body
+
+
+def benchmark(sizes, seconds):
+    """Echoes packets of each size over a single connection for a number of seconds, and reports throughput."""
+    for size in sizes:
+        for kind, payload in (('text', ('0123456789abcdef' * (size // 16 + 1))[:size]),
+                              ('random', os.urandom(size // 2).hex())):
+            packet = zlibify(payload)
+            sock = open_connection()
+            count = 0
+            begin = time.perf_counter()
+            while time.perf_counter() - begin < seconds:
+                sock.sendall(packet)
+                read_packet(sock)
+                count += 1
+            elapsed = time.perf_counter() - begin
+            sock.close()
+            print('%9d bytes %-6s: %8.1f packets/s, %8.1f MB/s' % (
+                size, kind, count / elapsed, count * size / elapsed / 1024 / 1024,
+            ))
+
+
 def main():
     global host, port
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--host', default='localhost')
     parser.add_argument('-p', '--port', default=9999, type=int)
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='measure echo throughput for several packet sizes instead of testing')
+    parser.add_argument('--sizes', default='1024,65536,1048576,4194304',
+                        help='comma separated packet sizes in bytes for the benchmark')
+    parser.add_argument('--seconds', default=2, type=float, help='duration of the benchmark for each size')
     args = parser.parse_args()
     host, port = args.host, args.port
 
+    if args.benchmark:
+        benchmark(list(map(int, args.sizes.split(','))), args.seconds)
+        return
+
     print('Opening idle connection:', end=' ')
     s1 = open_connection()
     print('Success')
@@ -2,36 +2,52 @@ from judge.bridge.base_handler import ZlibPacketHandler
 
 
 class EchoPacketHandler(ZlibPacketHandler):
+    verbose = True
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
     def on_connect(self):
-        print('New client:', self.client_address)
+        self.log('New client:', self.client_address)
         self.timeout = 5
 
     def on_timeout(self):
-        print('Inactive client:', self.client_address)
+        self.log('Inactive client:', self.client_address)
 
     def on_packet(self, data):
         self.timeout = None
-        print('Data from %s: %r' % (self.client_address, data[:30] if len(data) > 30 else data))
+        self.log('Data from %s: %r' % (self.client_address, data[:30] if len(data) > 30 else data))
         self.send(data)
 
     def on_disconnect(self):
-        print('Closed client:', self.client_address)
+        self.log('Closed client:', self.client_address)
 
 
 def main():
     import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    from judge.bridge.async_server import AsyncServer
     from judge.bridge.server import Server
 
     parser = argparse.ArgumentParser()
     parser.add_argument('-l', '--host', action='append')
     parser.add_argument('-p', '--port', type=int, action='append')
     parser.add_argument('-P', '--proxy', action='append')
+    parser.add_argument('-m', '--mode', choices=['threading', 'asyncio'], default='threading')
+    parser.add_argument('-w', '--workers', type=int, default=32, help='handler threads in asyncio mode')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print connections and packets')
     args = parser.parse_args()
 
     class Handler(EchoPacketHandler):
         proxies = args.proxy or []
+        verbose = not args.quiet
 
-    server = Server(list(zip(args.host, args.port)), Handler)
+    addresses = list(zip(args.host, args.port))
+    if args.mode == 'asyncio':
+        server = AsyncServer(addresses, ThreadPoolExecutor(args.workers), Handler)
+    else:
+        server = Server(addresses, Handler)
     server.serve_forever()
 
 
@@ -0,0 +1,75 @@
+import logging
+import threading
+
+from django import db
+
+from judge.models import Judge
+
+logger = logging.getLogger('judge.bridge')
+
+
+class HeartbeatAggregator:
+    """
+    Collects the latency and load reported by connected judges in memory, and periodically writes the values that
+    changed since the last flush for all judges in a single bulk update.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        # handler: (judge id, ping, load)
+        self.pending = {}
+        # judge id: (ping, load) as last written to the database
+        self.flushed = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_thread, daemon=True)
+
+    def update(self, handler, judge_id, ping, load):
+        with self.lock:
+            self.pending[handler] = (judge_id, ping, load)
+
+    def remove(self, handler):
+        with self.lock:
+            entry = self.pending.pop(handler, None)
+            if entry is not None:
+                self.flushed.pop(entry[0], None)
+
+    def _collect(self):
+        with self.lock:
+            changed = {}
+            for judge_id, ping, load in self.pending.values():
+                if self.flushed.get(judge_id) != (ping, load):
+                    changed[judge_id] = (ping, load)
+            return changed
+
+    def flush(self):
+        changed = self._collect()
+        if not changed:
+            return 0
+
+        db.connection.close_if_unusable_or_obsolete()
+        try:
+            Judge.objects.bulk_update(
+                [Judge(id=judge_id, ping=ping, load=load) for judge_id, (ping, load) in changed.items()],
+                ['ping', 'load'],
+            )
+        except Exception:
+            logger.exception('Failed to update judge heartbeats')
+            db.connection.close()
+            return 0
+
+        with self.lock:
+            self.flushed.update(changed)
+        return len(changed)
+
+    def _flush_thread(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+        db.connection.close()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,124 @@
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+
+logger = logging.getLogger('judge.bridge')
+
+
+def is_ide_run(id):
+    """IDE runs are given negative ids, which never collide with the ids of submissions."""
+    return isinstance(id, int) and id < 0
+
+
+class IdeRun:
+    __slots__ = ('id', 'key', 'user', 'created', 'finished', 'result', 'done')
+
+    def __init__(self, id, key, user):
+        self.id = id
+        self.key = key
+        self.user = user
+        self.created = time.monotonic()
+        self.finished = None
+        self.result = {}
+        # Set once the run finishes, so that waiters need not hold a thread
+        self.done = Future()
+
+
+class IdeRunStore:
+    """
+    Keeps IDE runs, which are graded like submissions but only exist in the memory of the bridge.
+
+    Each user may have at most `concurrency` runs waiting or being graded. Results are kept for about `ttl` seconds
+    after a run finishes, and runs that have not finished after about `ttl` seconds are abandoned. Waiters wait on a
+    future of the run, so neither the database nor the event server is involved.
+    """
+
+    def __init__(self, concurrency, ttl):
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._ids = itertools.count(-1, -1)
+        # key: run, in order of creation
+        self.runs = OrderedDict()
+        self.by_id = {}
+        self.active = defaultdict(int)
+
+    def start(self, user):
+        """Returns a new run for `user`, or None if the user has too many runs in progress."""
+        with self.lock:
+            if self.active[user] >= self.concurrency:
+                return None
+            run = IdeRun(next(self._ids), uuid.uuid4().hex, user)
+            self.runs[run.key] = run
+            self.by_id[run.id] = run
+            self.active[user] += 1
+            return run
+
+    def get(self, id):
+        with self.lock:
+            return self.by_id.get(id)
+
+    def update(self, id, **result):
+        with self.lock:
+            run = self.by_id.get(id)
+            if run is not None and run.finished is None:
+                run.result.update(result)
+
+    def _finish(self, run, status, result):
+        if run.finished is not None:
+            return
+        run.result.update(result)
+        run.result['status'] = status
+        run.finished = time.monotonic()
+        self.active[run.user] -= 1
+        if not self.active[run.user]:
+            del self.active[run.user]
+        run.done.set_result(None)
+
+    def finish(self, id, status, **result):
+        with self.lock:
+            run = self.by_id.get(id)
+            if run is not None:
+                self._finish(run, status, result)
+
+    def expire(self):
+        """Forgets old results and abandons runs that took too long. Returns the ids of the abandoned runs."""
+        now = time.monotonic()
+        abandoned = []
+        with self.lock:
+            while self.runs:
+                run = next(iter(self.runs.values()))
+                if now - run.created < self.ttl:
+                    break
+                if run.finished is None:
+                    self._finish(run, 'expired', {})
+                    abandoned.append(run.id)
+                    # Keep the result around for as long as a finished run's.
+                    self.runs.move_to_end(run.key)
+                    run.created = now
+                    continue
+                if now - run.finished < self.ttl:
+                    # Finished runs are ordered by creation, not completion, so wait for this one to expire.
+                    break
+                del self.runs[run.key]
+                del self.by_id[run.id]
+        if abandoned:
+            logger.info('Abandoned %d IDE runs', len(abandoned))
+        return abandoned
+
+    def find(self, key, user):
+        """Returns the run `key` of `user`, or None if it is unknown. Its `done` future is set once it finishes."""
+        with self.lock:
+            run = self.runs.get(key)
+        if run is None or run.user != user:
+            return None
+        return run
+
+    def result(self, run):
+        """Returns whether the run has finished and its result so far."""
+        with self.lock:
+            return run.finished is not None, dict(run.result)
@@ -12,9 +12,12 @@ from django.utils import timezone
 
 from judge import event_poster as event
 from judge.bridge.base_handler import ZlibPacketHandler, proxy_list
+from judge.bridge.ide_runs import is_ide_run
+from judge.bridge.metrics import registry
+from judge.bridge.structured_log import JsonMessage
 from judge.caching import finished_submission
-from judge.models import Judge, Language, LanguageLimit, Problem, Profile, \
-    RuntimeVersion, Submission, SubmissionTestCase
+from judge.models import Judge, Language, LanguageLimit, Organization, Profile, \
+    RuntimeVersion, Submission, SubmissionTestCase, SubmissionTestCaseArchive
 from judge.models.problem import ProblemTestcaseResultAccess
 from judge.utils.url import get_absolute_submission_file_url
 
@@ -28,18 +31,200 @@ SubmissionData = namedtuple(
     'time memory short_circuit pretests_only contest_no attempt_no user_id file_only file_size_limit',
 )
 
+packet_time = registry.histogram('bridge_judge_packet_seconds', 'Time spent handling packets from judges', ('packet',))
+event_post_time = registry.histogram('bridge_event_post_seconds', 'Time spent posting to the event daemon')
+busy_time = registry.counter('bridge_judge_busy_seconds_total', 'Time judges spent grading submissions', ('judge',))
+
 
 def _ensure_connection():
     db.connection.close_if_unusable_or_obsolete()
 
 
+def post_event(channel, message):
+    start = time.perf_counter()
+    try:
+        event.post(channel, message)
+    finally:
+        event_post_time.observe(time.perf_counter() - start)
+
+
+def get_related_submission_data(submission):
+    _ensure_connection()
+
+    try:
+        pid, time, memory, short_circuit, lid, is_pretested, sub_date, uid, part_virtual, part_id, \
+            file_only, file_size_limit = (
+                Submission.objects.filter(id=submission)
+                          .values_list('problem__id', 'problem__time_limit', 'problem__memory_limit',
+                                       'problem__short_circuit', 'language__id', 'is_pretested', 'date',
+                                       'user__id', 'contest__participation__virtual', 'contest__participation__id',
+                                       'language__file_only', 'language__file_size_limit')).get()
+    except Submission.DoesNotExist:
+        logger.error('Submission vanished: %s', submission)
+        json_log.error(JsonMessage({'submission': submission, 'action': 'request',
+                                    'info': 'submission vanished when fetching info'}))
+        return
+
+    attempt_no = Submission.objects.filter(problem__id=pid, contest__participation__id=part_id, user__id=uid,
+                                           date__lt=sub_date).exclude(status__in=('CE', 'IE')).count() + 1
+
+    try:
+        time, memory = (LanguageLimit.objects.filter(problem__id=pid, language__id=lid)
+                        .values_list('time_limit', 'memory_limit').get())
+    except LanguageLimit.DoesNotExist:
+        pass
+
+    return SubmissionData(
+        time=time,
+        memory=memory,
+        short_circuit=short_circuit,
+        pretests_only=is_pretested,
+        contest_no=part_virtual,
+        attempt_no=attempt_no,
+        user_id=uid,
+        file_only=file_only,
+        file_size_limit=file_size_limit,
+    )
+
+
+def get_submission_packet(id, problem, language, source):
+    """
+    Builds the `submission-request` packet sent to a judge.
+
+    The packet does not depend on which judge grades the submission, so it is built with all its queries before
+    the submission is handed to the JudgeList, keeping dispatching under the JudgeList lock free of database access.
+    Returns None if the submission no longer exists.
+    """
+    data = get_related_submission_data(id)
+    if data is None:
+        return
+
+    is_ide_mode = problem == 'run_ide'
+    ide_input = ''
+    if is_ide_mode:
+        try:
+            before_code, _, after_code = source.partition("###CODE###")
+            _, _, input_part = before_code.partition("###INPUT###")
+            input_part = input_part.strip()
+            code_part = after_code.strip()
+
+            ide_input = input_part
+            source = code_part
+        except Exception as e:
+            logger.error(f'Lỗi tách input/code: {e}')
+
+    meta_data = {
+        'pretests-only': data.pretests_only,
+        'in-contest': data.contest_no,
+        'attempt-no': data.attempt_no,
+        'user': data.user_id,
+        'file-only': data.file_only,
+        'file-size-limit': data.file_size_limit,
+    }
+
+    if is_ide_mode:
+        meta_data['ide_input'] = ide_input
+
+    return {
+        'name': 'submission-request',
+        'submission-id': id,
+        'problem-id': problem,
+        'language': language,
+        'source': source if not data.file_only else get_absolute_submission_file_url(source),
+        'time-limit': data.time,
+        'memory-limit': data.memory,
+        'short-circuit': data.short_circuit,
+        'meta': meta_data,
+    }
+
+
+def get_ide_run_packet(run_id, language, source, input, time_limit, memory_limit, user_id):
+    """Builds the `submission-request` packet for an IDE run, which judges grade like a submission to `run_ide`."""
+    return {
+        'name': 'submission-request',
+        'submission-id': run_id,
+        'problem-id': 'run_ide',
+        'language': language,
+        'source': source,
+        'time-limit': time_limit,
+        'memory-limit': memory_limit,
+        'short-circuit': False,
+        'meta': {
+            'pretests-only': False,
+            'in-contest': None,
+            'attempt-no': 1,
+            'user': user_id,
+            'file-only': False,
+            'file-size-limit': 1,
+            'ide_input': input,
+        },
+    }
+
+
+def get_case_status(status):
+    if status & 4:
+        return 'TLE'
+    elif status & 8:
+        return 'MLE'
+    elif status & 64:
+        return 'OLE'
+    elif status & 2:
+        return 'RTE'
+    elif status & 16:
+        return 'IR'
+    elif status & 1:
+        return 'WA'
+    elif status & 32:
+        return 'SC'
+    return 'AC'
+
+
+def get_submission_flow(id, user_id):
+    """
+    Returns the flow a submission shares judges in when the JudgeList queues fairly, and the weight of the flow.
+
+    Submissions charged to an organization, as in `Submission.update_credit`, share the flow of the organization,
+    so that a mass submission by its members counts as one. All other submissions share the flow of their user.
+    """
+    _ensure_connection()
+
+    try:
+        problem_id, problem_private, contest_id, contest_private = Submission.objects.filter(id=id).values_list(
+            'problem_id', 'problem__is_organization_private', 'contest_object_id',
+            'contest_object__is_organization_private',
+        ).get()
+    except Submission.DoesNotExist:
+        return ('user', user_id), 1
+
+    organizations = Organization.objects.none()
+    if problem_private:
+        organizations = Organization.objects.filter(problem=problem_id)
+    elif contest_private:
+        organizations = Organization.objects.filter(contest=contest_id)
+
+    organization = organizations.order_by('id').values_list('id', 'paid_credit', 'free_credit').first()
+    if organization is None:
+        return ('user', user_id), 1
+
+    organization_id, paid_credit, free_credit = organization
+    weight = 1
+    if settings.BRIDGED_FAIR_QUEUE_CREDIT_WEIGHT:
+        # An organization holding more credit than its monthly allowance gets a proportionally larger share.
+        weight = (paid_credit + free_credit) / settings.VNOJ_MONTHLY_FREE_CREDIT
+        weight = min(max(weight, 1), settings.BRIDGED_FAIR_QUEUE_CREDIT_WEIGHT)
+    return ('organization', organization_id), weight
+
+
 class JudgeHandler(ZlibPacketHandler):
     proxies = proxy_list(settings.BRIDGED_JUDGE_PROXIES or [])
 
-    def __init__(self, request, client_address, server, judges, ignore_problems_packet=True):
+    def __init__(self, request, client_address, server, judges, ignore_problems_packet=True, heartbeats=None,
+                 ide_runs=None):
         super().__init__(request, client_address, server)
 
         self.judges = judges
+        self.heartbeats = heartbeats
+        self.ide_runs = ide_runs
         self.handlers = {
             'grading-begin': self.on_grading_begin,
             'grading-end': self.on_grading_end,
@@ -58,7 +243,18 @@ class JudgeHandler(ZlibPacketHandler):
             'testcase-ide': self.on_test_case_ide,
 
         }
+        # Packets about IDE runs, which have no rows in the database
+        self.ide_handlers = {
+            'submission-acknowledged': self.on_ide_run_acknowledged,
+            'test-case-status': self.on_ide_run_test_case,
+            'testcase-ide': self.on_ide_run_test_case_ide,
+            'compile-error': self.on_ide_run_compile_error,
+            'internal-error': self.on_ide_run_internal_error,
+            'submission-terminated': self.on_ide_run_terminated,
+            'grading-end': self.on_ide_run_end,
+        }
         self._working = False
+        self._working_since = None
         self._no_response_job = None
         self.executors = {}
         self.problems = {}
@@ -83,6 +279,9 @@ class JudgeHandler(ZlibPacketHandler):
         self._submission_cache_id = None
         self._submission_cache = {}
 
+        self.connected_at = None
+        self.busy_time = 0
+
     def on_connect(self):
         self.timeout = 15
         logger.info('Judge connected from: %s', self.client_address)
@@ -98,7 +297,10 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('Judge disconnected from: %s with name %s', self.client_address, self.name)
 
         json_log.info(self._make_json_log(action='disconnect', info='judge disconnected'))
-        if self._working:
+        if is_ide_run(self._working):
+            if self.ide_runs is not None:
+                self.ide_runs.finish(self._working, 'internal-error', error='Judge disconnected')
+        elif self._working:
             Submission.objects.filter(id=self._working).update(status='IE', result='IE', error='')
             json_log.error(self._make_json_log(sub=self._working, action='close', info='IE due to shutdown on grading'))
 
@@ -126,27 +328,29 @@ class JudgeHandler(ZlibPacketHandler):
         judge = self.judge = Judge.objects.get(name=self.name)
         judge.start_time = timezone.now()
         judge.online = True
+        judge.last_ip = self.client_address[0]
+        Judge.objects.filter(id=judge.id).update(start_time=judge.start_time, online=True, last_ip=judge.last_ip)
 
         self.update_runtimes()
 
         if self.ignore_problems_packet:
             self.problems = self.judges.problems
-            judge.problems.set(self.judges.problem_ids)
+            self.sync_problems(self.judges.problem_ids)
         else:
-            judge.problems.set(Problem.objects.filter(code__in=list(self.problems)).values_list('id', flat=True))
+            self.sync_problems(self.judges.problem_map.resolve(self.problems))
 
         # Cache is_disabled for faster access
         self.is_disabled = judge.is_disabled
 
-        judge.last_ip = self.client_address[0]
-        judge.save()
         self.judge_address = '[%s]:%s' % (self.client_address[0], self.client_address[1])
         json_log.info(self._make_json_log(action='auth', info='judge successfully authenticated',
                                           executors=list(self.executors.keys())))
 
     def _disconnected(self):
+        if self.heartbeats is not None:
+            self.heartbeats.remove(self)
+        # Runtime versions are kept, so that reconnecting with the same runtimes does not rewrite them.
         Judge.objects.filter(id=self.judge.id).update(online=False)
-        RuntimeVersion.objects.filter(judge=self.judge).delete()
 
     def _update_ping(self):
         try:
@@ -170,14 +374,15 @@ class JudgeHandler(ZlibPacketHandler):
             return
 
         self.timeout = 60
-        self.problems = set(p[0] for p in packet['problems'])
+        self.problems = self.judges.problem_map.intern(p[0] for p in packet['problems'])
         self.executors = packet['executors']
         self.name = packet['id']
 
         self.send({'name': 'handshake-success'})
+        self.connected_at = time.monotonic()
         logger.info('Judge authenticated: %s (%s)', self.client_address, packet['id'])
         self.judges.register(self)
-        threading.Thread(target=self._ping_thread).start()
+        self.server.call_periodically(10, self._ping, self._stop_ping)
         self._connected()
 
     def can_judge(self, problem, executor, judge_id=None):
@@ -188,45 +393,16 @@ class JudgeHandler(ZlibPacketHandler):
     def working(self):
         return bool(self._working)
 
-    def get_related_submission_data(self, submission):
-        _ensure_connection()
-
-        try:
-            pid, time, memory, short_circuit, lid, is_pretested, sub_date, uid, part_virtual, part_id, \
-                file_only, file_size_limit = (
-                    Submission.objects.filter(id=submission)
-                              .values_list('problem__id', 'problem__time_limit', 'problem__memory_limit',
-                                           'problem__short_circuit', 'language__id', 'is_pretested', 'date',
-                                           'user__id', 'contest__participation__virtual', 'contest__participation__id',
-                                           'language__file_only', 'language__file_size_limit')).get()
-        except Submission.DoesNotExist:
-            logger.error('Submission vanished: %s', submission)
-            json_log.error(self._make_json_log(
-                sub=self._working, action='request',
-                info='submission vanished when fetching info',
-            ))
-            return
-
-        attempt_no = Submission.objects.filter(problem__id=pid, contest__participation__id=part_id, user__id=uid,
-                                               date__lt=sub_date).exclude(status__in=('CE', 'IE')).count() + 1
-
-        try:
-            time, memory = (LanguageLimit.objects.filter(problem__id=pid, language__id=lid)
-                            .values_list('time_limit', 'memory_limit').get())
-        except LanguageLimit.DoesNotExist:
-            pass
-
-        return SubmissionData(
-            time=time,
-            memory=memory,
-            short_circuit=short_circuit,
-            pretests_only=is_pretested,
-            contest_no=part_virtual,
-            attempt_no=attempt_no,
-            user_id=uid,
-            file_only=file_only,
-            file_size_limit=file_size_limit,
-        )
+    @property
+    def utilization(self):
+        """Fraction of the time since the judge connected that it spent grading."""
+        if self.connected_at is None:
+            return 0
+        now = time.monotonic()
+        busy = self.busy_time
+        if self._working and self._working_since is not None:
+            busy += now - self._working_since
+        return busy / max(now - self.connected_at, 1e-9)
 
     def disconnect(self, force=False):
         if force:
@@ -235,47 +411,11 @@ class JudgeHandler(ZlibPacketHandler):
         else:
             self.send({'name': 'disconnect'})
 
-    def submit(self, id, problem, language, source):
-        data = self.get_related_submission_data(id)
+    def submit(self, id, packet):
         self._working = id
+        self._working_since = time.monotonic()
         self._no_response_job = threading.Timer(20, self._kill_if_no_response)
-        is_ide_mode = problem == 'run_ide'
-        ide_input = ''
-        if is_ide_mode:
-            try:
-                before_code, _, after_code = source.partition("###CODE###")
-                _, _, input_part = before_code.partition("###INPUT###")
-                input_part = input_part.strip()
-                code_part = after_code.strip()
-
-                ide_input = input_part
-                source = code_part
-            except Exception as e:
-                logger.error(f'Lỗi tách input/code: {e}')
-        
-        meta_data = {
-            'pretests-only': data.pretests_only,
-            'in-contest': data.contest_no,
-            'attempt-no': data.attempt_no,
-            'user': data.user_id,
-            'file-only': data.file_only,
-            'file-size-limit': data.file_size_limit,
-        }
-
-        if is_ide_mode:
-            meta_data['ide_input'] = ide_input
-        
-        self.send({
-            'name': 'submission-request',
-            'submission-id': id,
-            'problem-id': problem,
-            'language': language,
-            'source': source if not data.file_only else get_absolute_submission_file_url(source),
-            'time-limit': data.time,
-            'memory-limit': data.memory,
-            'short-circuit': data.short_circuit,
-            'meta': meta_data,
-        })
+        self.send(packet)
 
     def _kill_if_no_response(self):
         logger.error('Judge failed to acknowledge submission: %s: %s', self.name, self._working)
@@ -290,7 +430,7 @@ class JudgeHandler(ZlibPacketHandler):
 
         id = packet['submission-id']
         if Submission.objects.filter(id=id).update(status='P', judged_on=self.judge):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'processing'})
+            post_event('sub_%s' % Submission.get_id_secret(id), {'type': 'processing'})
             self._post_update_submission(id, 'processing')
             json_log.info(self._make_json_log(packet, action='processing'))
         else:
@@ -332,8 +472,25 @@ class JudgeHandler(ZlibPacketHandler):
             except ValueError:
                 self.on_malformed(data)
             else:
-                handler = self.handlers.get(data['name'], self.on_malformed)
-                handler(data)
+                name = data['name']
+                if name == 'testcase-ide':
+                    id = data['result'].get('current_submission_id')
+                else:
+                    id = data.get('submission-id')
+                if is_ide_run(id):
+                    handler = self.ide_handlers.get(name, self.ignore_ide_run_packet)
+                    name = 'ide-run'
+                else:
+                    handler = self.handlers.get(name)
+                start = time.perf_counter()
+                try:
+                    if handler is None:
+                        name = 'unknown'
+                        self.on_malformed(data)
+                    else:
+                        handler(data)
+                finally:
+                    packet_time.observe(time.perf_counter() - start, packet=name)
         except Exception:
             logger.exception('Error in packet handling (Judge-side): %s', self.name)
             self._packet_exception()
@@ -347,35 +504,49 @@ class JudgeHandler(ZlibPacketHandler):
         if not Submission.objects.filter(id=id).update(batch=True):
             logger.warning('Unknown submission: %s', id)
 
-    def update_problems(self, problems, problem_ids):
-        logger.info('%s: Updating problem list', self.name)
-        self.problems = problems
-        self.judge.problems.set(problem_ids)
-        logger.info('%s: Updated %d problems', self.name, len(problem_ids))
-        json_log.info(self._make_json_log(action='update-problems', count=len(problem_ids)))
+    def sync_problems(self, problem_ids):
+        # Judges that are still authenticating synchronize their problems once connected.
+        if self.judge is None:
+            return
+
+        _ensure_connection()
+        added, removed = self.judges.problem_map.sync_judge(self.judge.id, problem_ids)
+        if added or removed:
+            json_log.info(self._make_json_log(action='update-problems', count=len(problem_ids),
+                                              added=len(added), removed=len(removed)))
 
     def on_supported_problems(self, packet):
         if self.ignore_problems_packet:
             return
 
-        problems = set(p[0] for p in packet['problems'])
-        problem_ids = list(Problem.objects.filter(code__in=list(problems)).values_list('id', flat=True))
-        self.judges.update_problems(self, problems, problem_ids)
+        self.judges.update_problems(self, [p[0] for p in packet['problems']])
 
     def update_runtimes(self):
         self.judge.runtimes.set(
             Language.objects.filter(key__in=list(self.executors.keys())).values_list('id', flat=True),
         )
 
-        RuntimeVersion.objects.filter(judge=self.judge).delete()
-        versions = []
-        for lang in self.judge.runtimes.all():
-            versions += [
-                RuntimeVersion(language=lang, name=name, version='.'.join(map(str, version)),
-                               priority=idx, judge=self.judge)
-                for idx, (name, version) in enumerate(self.executors[lang.key])
-            ]
-        RuntimeVersion.objects.bulk_create(versions)
+        wanted = {
+            (lang_id, name, '.'.join(map(str, version)), idx)
+            for lang_id, key in self.judge.runtimes.values_list('id', 'key')
+            for idx, (name, version) in enumerate(self.executors[key])
+        }
+        existing = set()
+        stale = []
+        for id, *version in RuntimeVersion.objects.filter(judge=self.judge) \
+                                                  .values_list('id', 'language_id', 'name', 'version', 'priority'):
+            version = tuple(version)
+            if version in wanted and version not in existing:
+                existing.add(version)
+            else:
+                stale.append(id)
+
+        if stale:
+            RuntimeVersion.objects.filter(id__in=stale).delete()
+        RuntimeVersion.objects.bulk_create([
+            RuntimeVersion(language_id=lang_id, name=name, version=version, priority=priority, judge=self.judge)
+            for lang_id, name, version, priority in wanted - existing
+        ])
 
     def on_executors(self, packet):
         logger.info('%s: Updating runtimes', self.name)
@@ -391,7 +562,8 @@ class JudgeHandler(ZlibPacketHandler):
                 status='G', is_pretested=False, current_testcase=1,
                 batch=False, judged_date=timezone.now()):
             SubmissionTestCase.objects.filter(submission_id=packet['submission-id']).delete()
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'grading-begin'})
+            SubmissionTestCaseArchive.objects.filter(submission_id=packet['submission-id']).delete()
+            post_event('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'grading-begin'})
             self._post_update_submission(packet['submission-id'], 'grading-begin')
             json_log.info(self._make_json_log(packet, action='grading-begin'))
         else:
@@ -475,10 +647,10 @@ class JudgeHandler(ZlibPacketHandler):
 
         finished_submission(submission)
 
-        event.post('sub_%s' % submission.id_secret, {'type': 'grading-end'})
+        post_event('sub_%s' % submission.id_secret, {'type': 'grading-end'})
         if hasattr(submission, 'contest'):
             participation = submission.contest.participation
-            event.post('contest_%d' % participation.contest_id, {'type': 'update'})
+            post_event('contest_%d' % participation.contest_id, {'type': 'update'})
         self._post_update_submission(submission.id, 'grading-end', done=True)
 
     def on_compile_error(self, packet):
@@ -486,8 +658,8 @@ class JudgeHandler(ZlibPacketHandler):
         self._free_self(packet)
 
         if Submission.objects.filter(id=packet['submission-id']).update(status='CE', result='CE', error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-error'})
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'ide-compile-error', 'msg': packet})
+            post_event('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-error'})
+            post_event('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'ide-compile-error', 'msg': packet})
 
             self._post_update_submission(packet['submission-id'], 'compile-error', done=True)
             json_log.info(self._make_json_log(packet, action='compile-error', log=packet['log'],
@@ -501,7 +673,7 @@ class JudgeHandler(ZlibPacketHandler):
         logger.info('%s: Submission generated compiler messages: %s', self.name, packet['submission-id'])
 
         if Submission.objects.filter(id=packet['submission-id']).update(error=packet['log']):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-message'})
+            post_event('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'compile-message'})
             json_log.info(self._make_json_log(packet, action='compile-message', log=packet['log']))
         else:
             logger.warning('Unknown submission: %s', packet['submission-id'])
@@ -517,7 +689,7 @@ class JudgeHandler(ZlibPacketHandler):
 
         id = packet['submission-id']
         if Submission.objects.filter(id=id).update(status='IE', result='IE', error=packet['message']):
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'internal-error'})
+            post_event('sub_%s' % Submission.get_id_secret(id), {'type': 'internal-error'})
             self._post_update_submission(id, 'internal-error', done=True)
             json_log.info(self._make_json_log(packet, action='internal-error', message=packet['message'],
                                               finish=True, result='IE'))
@@ -531,7 +703,7 @@ class JudgeHandler(ZlibPacketHandler):
         self._free_self(packet)
 
         if Submission.objects.filter(id=packet['submission-id']).update(status='AB', result='AB', points=0):
-            event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'aborted'})
+            post_event('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'aborted'})
             self._post_update_submission(packet['submission-id'], 'aborted', done=True)
             json_log.info(self._make_json_log(packet, action='aborted', finish=True, result='AB'))
         else:
@@ -568,23 +740,7 @@ class JudgeHandler(ZlibPacketHandler):
         bulk_test_case_updates = []
         for result in updates:
             test_case = SubmissionTestCase(submission_id=id, case=result['position'])
-            status = result['status']
-            if status & 4:
-                test_case.status = 'TLE'
-            elif status & 8:
-                test_case.status = 'MLE'
-            elif status & 64:
-                test_case.status = 'OLE'
-            elif status & 2:
-                test_case.status = 'RTE'
-            elif status & 16:
-                test_case.status = 'IR'
-            elif status & 1:
-                test_case.status = 'WA'
-            elif status & 32:
-                test_case.status = 'SC'
-            else:
-                test_case.status = 'AC'
+            test_case.status = get_case_status(result['status'])
             test_case.time = result['time']
             test_case.memory = result['memory']
             test_case.points = result['points']
@@ -626,19 +782,62 @@ class JudgeHandler(ZlibPacketHandler):
             self.update_counter[id] = (1, time.monotonic())
 
         if do_post:
-            event.post('sub_%s' % Submission.get_id_secret(id), {'type': 'test-case'})
-            event.post('sub_%s' % Submission.get_id_secret(id),{'type': 'on_test_case_ide2', 'result': packet})
+            post_event('sub_%s' % Submission.get_id_secret(id), {'type': 'test-case'})
+            post_event('sub_%s' % Submission.get_id_secret(id),{'type': 'on_test_case_ide2', 'result': packet})
             self._post_update_submission(id, state='test-case')
 
     def on_test_case_ide(self, packet):
         self.in_batch = False
         #logger.info('%s: Testcase IDE on: %s', self.name, packet['result'])
-        event.post('sub_%s' % Submission.get_id_secret(packet['result']['current_submission_id']
+        post_event('sub_%s' % Submission.get_id_secret(packet['result']['current_submission_id']
 ),{'type': 'on_test_case_ide', 'result': packet})
 
         json_log.info(self._make_json_log(packet, action='batch-end', batch=self.batch_id))
 
 
+    def on_ide_run_acknowledged(self, packet):
+        if packet['submission-id'] != self._working:
+            logger.error('Wrong acknowledgement: %s: %s, expected: %s', self.name, packet['submission-id'],
+                         self._working)
+            self.close()
+            return
+        if self._no_response_job:
+            self._no_response_job.cancel()
+            self._no_response_job = None
+
+    def on_ide_run_test_case(self, packet):
+        # IDE runs have a single test case, the input of the user.
+        case = packet['cases'][0]
+        self.ide_runs.update(packet['submission-id'], case_status=get_case_status(case['status']),
+                             output=case['output'], time=case['time'], memory=case['memory'])
+
+    def on_ide_run_test_case_ide(self, packet):
+        result = packet['result']
+        self.ide_runs.update(result['current_submission_id'], output=result.get('proc_output'),
+                             time=result.get('execution_time'), memory=result.get('max_memory'),
+                             error=result.get('error'))
+
+    def on_ide_run_compile_error(self, packet):
+        self.ide_runs.finish(packet['submission-id'], 'compile-error', log=packet['log'])
+        self._free_self(packet)
+
+    def on_ide_run_internal_error(self, packet):
+        logger.error('Judge %s failed while handling IDE run %s: %s', self.name, packet['submission-id'],
+                     packet['message'])
+        self.ide_runs.finish(packet['submission-id'], 'internal-error', error=packet['message'])
+        self._free_self(packet)
+
+    def on_ide_run_terminated(self, packet):
+        self.ide_runs.finish(packet['submission-id'], 'aborted')
+        self._free_self(packet)
+
+    def on_ide_run_end(self, packet):
+        self.ide_runs.finish(packet['submission-id'], 'done')
+        self._free_self(packet)
+
+    def ignore_ide_run_packet(self, packet):
+        pass
+
     def on_malformed(self, packet):
         logger.error('%s: Malformed packet: %s', self.name, packet)
         json_log.exception(self._make_json_log(sub=self._working, info='malformed json packet'))
@@ -650,21 +849,26 @@ class JudgeHandler(ZlibPacketHandler):
         self.latency = sum(self._ping_average) / len(self._ping_average)
         self.time_delta = sum(self._time_delta) / len(self._time_delta)
         self.load = packet['load']
-        self._update_ping()
+        if self.heartbeats is not None and self.judge is not None:
+            self.heartbeats.update(self, self.judge.id, self.latency, self.load)
+        else:
+            self._update_ping()
 
     def _free_self(self, packet):
+        if self._working_since is not None:
+            elapsed = time.monotonic() - self._working_since
+            self._working_since = None
+            self.busy_time += elapsed
+            busy_time.inc(elapsed, judge=self.name)
         self.judges.on_judge_free(self, packet['submission-id'])
 
-    def _ping_thread(self):
+    def _ping(self):
         try:
-            while True:
-                self.ping()
-                if self._stop_ping.wait(10):
-                    break
+            self.ping()
         except Exception:
             logger.exception('Ping error in %s', self.name)
+            self._stop_ping.set()
             self.close()
-            raise
 
     def _make_json_log(self, packet=None, sub=None, **kwargs):
         data = {
@@ -676,7 +880,7 @@ class JudgeHandler(ZlibPacketHandler):
         if sub is not None:
             data['submission'] = sub
         data.update(kwargs)
-        return json.dumps(data)
+        return JsonMessage(data)
 
     def _get_submission_cache(self, id):
         if self._submission_cache_id != id:
@@ -691,7 +895,7 @@ class JudgeHandler(ZlibPacketHandler):
     def _post_update_submission(self, id, state, done=False):
         data = self._get_submission_cache(id)
         if data['problem__is_public']:
-            event.post('submissions', {
+            post_event('submissions', {
                 'type': 'done-submission' if done else 'update-submission',
                 'state': state, 'id': id,
                 'contest': data['contest_object_id'],
@@ -1,11 +1,13 @@
 import logging
-from collections import namedtuple
+import time
+from collections import deque, namedtuple
 from random import random
-from threading import RLock
 
 from django.conf import settings
 
-from judge.judge_priority import REJUDGE_PRIORITY
+from judge.bridge.metrics import TimedLock, registry
+from judge.bridge.problem_map import ProblemMap
+from judge.judge_priority import DEFAULT_PRIORITY, REJUDGE_PRIORITY
 from judge.tasks import on_long_queue
 
 try:
@@ -16,27 +18,143 @@ except ImportError:
 logger = logging.getLogger('judge.bridge')
 
 PriorityMarker = namedtuple('PriorityMarker', 'priority')
+QueuedSubmission = namedtuple(
+    'QueuedSubmission',
+    'id problem language packet judge_id banned_judges priority flow weight tag queued_at entered_at',
+)
+
+dispatch_latency = registry.histogram('bridge_dispatch_latency_seconds',
+                                      'Time from a submission request to its dispatch to a judge', ('priority',))
+dispatched = registry.counter('bridge_dispatched_total', 'Submissions dispatched to judges', ('priority',))
 
 
 class JudgeList(object):
     priorities = 4
 
-    def __init__(self):
+    def __init__(self, fair_queue=False, aging_interval=None):
         self.queue = dllist()
         self.priority = [self.queue.append(PriorityMarker(i)) for i in range(self.priorities)]
         self.judges = set()
         self.node_map = {}
         self.submission_map = {}
-        self.lock = RLock()
+        self.lock_hold_time = registry.histogram('bridge_judge_list_lock_hold_seconds',
+                                                 'Time the JudgeList lock is held').labels()
+        self.lock = TimedLock(self.lock_hold_time)
         self.min_tier = None
-        self.problems = set()
-        self.problem_ids = []
+        self.problems = frozenset()
+        self.problem_ids = frozenset()
+        self.problem_map = ProblemMap()
+
+        # With fair queuing, submissions are ordered by finish tag within each priority. For each priority, this
+        # keeps the tag of the last dispatched submission, and for each flow with queued submissions, the tag of
+        # its last one and how many are queued.
+        self.fair_queue = fair_queue
+        self.virtual_time = [0] * self.priorities
+        self.flows = [{} for _ in range(self.priorities)]
+        # For each priority, the id and time of entry of queued submissions in order of entry, some of which may
+        # have left the priority since.
+        self.aging_interval = aging_interval
+        self.arrivals = [deque() for _ in range(self.priorities)]
+        # The number of queued submissions of each priority, kept so that metrics need not walk the queue.
+        self.depths = [0] * self.priorities
+
+        registry.gauge('bridge_queue_depth', 'Submissions waiting for a judge', ('priority',),
+                       function=self._queue_depths)
+        registry.gauge('bridge_judges', 'Connected judges', ('state',), function=self._judge_states)
+        registry.gauge('bridge_judge_working', 'Whether a judge is grading a submission', ('judge',),
+                       function=self._judge_working)
+        registry.gauge('bridge_judge_utilization', 'Fraction of the time since a judge connected spent grading',
+                       ('judge',), function=self._judge_utilization)
+
+    def _queue_depths(self):
+        # A copy of the list is consistent enough without taking the lock away from judging.
+        return {(str(priority),): depth for priority, depth in enumerate(list(self.depths))}
+
+    def _judge_states(self):
+        states = {('working',): 0, ('idle',): 0, ('disabled',): 0}
+        with self.lock:
+            for judge in self.judges:
+                state = 'disabled' if judge.is_disabled else 'working' if judge.working else 'idle'
+                states[(state,)] += 1
+        return states
+
+    def _judge_working(self):
+        with self.lock:
+            return {(judge.name,): int(judge.working) for judge in self.judges if judge.name}
+
+    def _judge_utilization(self):
+        with self.lock:
+            return {(judge.name,): judge.utilization for judge in self.judges if judge.name}
+
+    def _record_dispatch(self, priority, queued_at):
+        dispatch_latency.observe(time.monotonic() - queued_at, priority=priority)
+        dispatched.inc(priority=priority)
+
+    def _enqueue(self, submission):
+        priority = submission.priority
+        entered_at = time.monotonic()
+        tag = None
+        if self.fair_queue:
+            # Each submission finishes 1 / weight after the previous one of its flow, or after the last dispatched
+            # one if the flow has nothing queued. Serving them in order of finish tag is deficit round robin between
+            # flows with a quantum of their weight.
+            state = self.flows[priority].get(submission.flow)
+            if state is None:
+                state = self.flows[priority][submission.flow] = [self.virtual_time[priority], 0]
+            tag = state[0] = max(state[0], self.virtual_time[priority]) + 1 / submission.weight
+            state[1] += 1
+
+        submission = submission._replace(tag=tag, entered_at=entered_at)
+        before = self.priority[priority]
+        if tag is not None:
+            node = before.prev
+            while node is not None and not isinstance(node.value, PriorityMarker) and node.value.tag > tag:
+                node = node.prev
+            before = node.next if node is not None else self.queue.first
+        self.node_map[submission.id] = self.queue.insert(submission, before)
+        self.depths[priority] += 1
+
+        if self.aging_interval is not None:
+            self.arrivals[priority].append((submission.id, entered_at))
+
+    def _dequeue(self, node):
+        submission = node.value
+        self.queue.remove(node)
+        del self.node_map[submission.id]
+        self.depths[submission.priority] -= 1
+        if submission.tag is not None:
+            flows = self.flows[submission.priority]
+            state = flows[submission.flow]
+            state[1] -= 1
+            if not state[1]:
+                del flows[submission.flow]
+        return submission
+
+    def _age_queue(self):
+        if self.aging_interval is None:
+            return
+
+        now = time.monotonic()
+        for priority in range(DEFAULT_PRIORITY + 1, self.priorities):
+            arrivals = self.arrivals[priority]
+            while arrivals:
+                id, entered_at = arrivals[0]
+                node = self.node_map.get(id)
+                if node is not None and node.value.priority == priority and node.value.entered_at == entered_at:
+                    if now - entered_at < self.aging_interval:
+                        break
+                    submission = self._dequeue(node)
+                    logger.info('Moving submission %d up to priority %d after waiting %.0fs',
+                                id, priority - 1, now - entered_at)
+                    self._enqueue(submission._replace(priority=priority - 1))
+                arrivals.popleft()
 
     def _handle_free_judge(self, judge):
         with self.lock:
             if judge.tier > self.min_tier:
                 return
 
+            self._age_queue()
             node = self.queue.first
             priority = 0
             while node:
@@ -45,18 +163,22 @@ class JudgeList(object):
                 elif priority >= REJUDGE_PRIORITY and self.should_reserve_judge():
                     return
                 else:
-                    id, problem, language, source, judge_id, banned_judges = node.value
-                    if judge.name not in banned_judges and judge.can_judge(problem, language, judge_id):
-                        self.submission_map[id] = judge
+                    submission = node.value
+                    if judge.name not in submission.banned_judges and \
+                            judge.can_judge(submission.problem, submission.language, submission.judge_id):
+                        self.submission_map[submission.id] = judge
                         try:
-                            judge.submit(id, problem, language, source)
+                            judge.submit(submission.id, submission.packet)
                         except Exception:
-                            logger.exception('Failed to dispatch %d (%s, %s) to %s', id, problem, language, judge.name)
+                            logger.exception('Failed to dispatch %d (%s, %s) to %s', submission.id,
+                                             submission.problem, submission.language, judge.name)
                             self.judges.remove(judge)
                             return
-                        logger.info('Dispatched queued submission %d: %s', id, judge.name)
-                        self.queue.remove(node)
-                        del self.node_map[id]
+                        self._record_dispatch(priority, submission.queued_at)
+                        logger.info('Dispatched queued submission %d: %s', submission.id, judge.name)
+                        self._dequeue(node)
+                        if submission.tag is not None:
+                            self.virtual_time[priority] = max(self.virtual_time[priority], submission.tag)
                         break
                 node = node.next
 
@@ -109,20 +231,45 @@ class JudgeList(object):
                 if judge.name == judge_id:
                     judge.disconnect(force=force)
 
-    def update_problems_all(self, problems, problem_ids):
+    def update_problems_all(self, problems):
+        problems = self.problem_map.intern(problems)
+        self._set_problems_all(problems, self.problem_map.resolve(problems))
+
+    def update_problems_delta(self, added, removed):
+        added = self.problem_map.intern(added)
+        added_ids = self.problem_map.resolve(added)
+        removed_ids = self.problem_map.resolve(removed)
+        self.problem_map.forget(removed)
+        with self.lock:
+            problems = (self.problems - removed) | added
+            problem_ids = (self.problem_ids - removed_ids) | added_ids
+        self._set_problems_all(problems, problem_ids)
+
+    def _set_problems_all(self, problems, problem_ids):
         with self.lock:
             self.problems = problems
             self.problem_ids = problem_ids
-            for judge in self.judges:
-                judge.update_problems(problems, problem_ids)
+            judges = list(self.judges)
+            for judge in judges:
+                judge.problems = problems
                 if not judge.working:
                     self._handle_free_judge(judge)
 
-    def update_problems(self, judge, problems, problem_ids):
+        # The database is only updated with the difference for each judge, and outside the lock,
+        # so that dispatching is never blocked by it.
+        for judge in judges:
+            judge.sync_problems(problem_ids)
+
+    def update_problems(self, judge, problems):
+        problems = self.problem_map.intern(problems)
+        # A code a judge stops supporting may be renamed or reused by the time it is seen again.
+        self.problem_map.forget(judge.problems - problems)
+        problem_ids = self.problem_map.resolve(problems)
         with self.lock:
-            judge.update_problems(problems, problem_ids)
+            judge.problems = problems
             if not judge.working:
                 self._handle_free_judge(judge)
+        judge.sync_problems(problem_ids)
 
     def update_disable_judge(self, judge_id, is_disabled):
         with self.lock:
@@ -172,14 +319,17 @@ class JudgeList(object):
                 except KeyError:
                     pass
                 else:
-                    self.queue.remove(node)
-                    del self.node_map[submission]
+                    self._dequeue(node)
                 return False
 
     def check_priority(self, priority):
         return 0 <= priority < self.priorities
 
-    def judge(self, id, problem, language, source, judge_id, priority, banned_judges=[]):
+    def judge(self, id, problem, language, packet, judge_id, priority, banned_judges=[], queued_at=None, flow=None,
+              weight=1):
+        if queued_at is None:
+            queued_at = time.monotonic()
+        # The packet is prepared by the caller, so that nothing here waits on the database while holding the lock.
         with self.lock:
             if id in self.submission_map or id in self.node_map:
                 # Already judging, don't queue again. This can happen during batch rejudges, rejudges should be
@@ -206,16 +356,19 @@ class JudgeList(object):
                 logger.info('Dispatched submission %d to: %s', id, judge.name)
                 self.submission_map[id] = judge
                 try:
-                    judge.submit(id, problem, language, source)
+                    judge.submit(id, packet)
                 except Exception:
                     logger.exception('Failed to dispatch %d (%s, %s) to %s', id, problem, language, judge.name)
                     self.judges.discard(judge)
-                    return self.judge(id, problem, language, source, judge_id, priority, banned_judges)
+                    return self.judge(id, problem, language, packet, judge_id, priority, banned_judges, queued_at,
+                                      flow, weight)
+                self._record_dispatch(priority, queued_at)
             else:
-                self.node_map[id] = self.queue.insert(
-                    (id, problem, language, source, judge_id, banned_judges),
-                    self.priority[priority],
-                )
+                self._enqueue(QueuedSubmission(
+                    id=id, problem=problem, language=language, packet=packet, judge_id=judge_id,
+                    banned_judges=banned_judges, priority=priority, flow=flow, weight=weight, tag=None,
+                    queued_at=queued_at, entered_at=None,
+                ))
                 logger.info('Queued submission: %d', id)
                 if self.queue.size == settings.VNOJ_LONG_QUEUE_ALERT_THRESHOLD + self.priorities:
                     on_long_queue.delay()
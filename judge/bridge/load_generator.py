@@ -0,0 +1,177 @@
+import json
+import socket
+import threading
+import time
+import zlib
+
+from judge.bridge.base_handler import size_pack
+from judge.judge_priority import DEFAULT_PRIORITY
+from judge.judgeapi import judge_request
+
+
+class PacketConnection:
+    """A blocking client for the zlib length-prefixed JSON protocol spoken by the bridge."""
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+        self.send_lock = threading.Lock()
+
+    def _read_exactly(self, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise EOFError('bridge closed the connection')
+            received += count
+        return buffer
+
+    def receive(self):
+        size = size_pack.unpack(self._read_exactly(size_pack.size))[0]
+        return json.loads(zlib.decompress(self._read_exactly(size)).decode('utf-8'))
+
+    def send(self, packet):
+        data = zlib.compress(json.dumps(packet, separators=(',', ':')).encode('utf-8'))
+        with self.send_lock:
+            self.sock.sendall(size_pack.pack(len(data)) + data)
+
+    def close(self):
+        self.sock.close()
+
+
+class SimulatedJudge(threading.Thread):
+    """
+    A judge speaking the real bridge protocol: it authenticates, reports its executors and problems, answers pings,
+    and grades every submission it receives by reporting `cases` accepted test cases, each taking `case_time`
+    seconds.
+    """
+
+    def __init__(self, address, name, key, problems, executors, cases, case_time, on_dispatch, on_graded):
+        super().__init__(daemon=True)
+        self.address = address
+        self.name = name
+        self.key = key
+        self.problems = problems
+        self.executors = executors
+        self.cases = cases
+        self.case_time = case_time
+        self.on_dispatch = on_dispatch
+        self.on_graded = on_graded
+        self.connection = None
+        self.authenticated = threading.Event()
+
+    def handshake(self):
+        self.connection = PacketConnection(self.address)
+        self.connection.send({
+            'name': 'handshake',
+            'problems': [[code, 0] for code in self.problems],
+            'executors': {key: [[key.lower(), [1, 0]]] for key in self.executors},
+            'id': self.name,
+            'key': self.key,
+        })
+        if self.connection.receive().get('name') != 'handshake-success':
+            raise ValueError('judge %s failed to authenticate' % self.name)
+        self.authenticated.set()
+
+    def grade(self, id):
+        self.connection.send({'name': 'submission-acknowledged', 'submission-id': id})
+        self.connection.send({'name': 'grading-begin', 'submission-id': id, 'pretested': False})
+        for position in range(1, self.cases + 1):
+            if self.case_time:
+                time.sleep(self.case_time)
+            self.connection.send({
+                'name': 'test-case-status',
+                'submission-id': id,
+                'cases': [{
+                    'position': position, 'status': 0, 'time': self.case_time, 'memory': 1024,
+                    'points': 1, 'total-points': 1, 'output': '', 'feedback': '',
+                }],
+            })
+        self.connection.send({'name': 'grading-end', 'submission-id': id})
+        self.on_graded(id)
+
+    def run(self):
+        self.handshake()
+        try:
+            while True:
+                packet = self.connection.receive()
+                name = packet.get('name')
+                if name == 'ping':
+                    self.connection.send({'name': 'ping-response', 'when': packet['when'], 'time': time.time(),
+                                          'load': 0.0})
+                elif name == 'submission-request':
+                    self.on_dispatch(packet['submission-id'])
+                    self.grade(packet['submission-id'])
+                elif name == 'disconnect':
+                    return
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.connection.close()
+
+
+class SubmissionClient(threading.Thread):
+    """Plays the site, sending submission requests taken from `pending` to the bridge with `judge_request`."""
+
+    def __init__(self, pending, on_submit):
+        super().__init__(daemon=True)
+        self.pending = pending
+        self.on_submit = on_submit
+        self.errors = 0
+
+    def run(self):
+        while True:
+            try:
+                id, problem, language, source = self.pending.pop()
+            except IndexError:
+                return
+
+            self.on_submit(id)
+            response = judge_request({
+                'name': 'submission-request',
+                'submission-id': id,
+                'problem-id': problem,
+                'language': language,
+                'source': source,
+                'judge-id': None,
+                'banned-judges': [],
+                'priority': DEFAULT_PRIORITY,
+            })
+            if response.get('name') != 'submission-received':
+                self.errors += 1
+
+
+class LoadRecorder:
+    """Records when each submission was sent, dispatched to a judge and graded."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted = {}
+        self.dispatched = {}
+        self.graded = {}
+
+    def _record(self, times, id):
+        now = time.perf_counter()
+        with self.lock:
+            times[id] = now
+
+    def on_submit(self, id):
+        self._record(self.submitted, id)
+
+    def on_dispatch(self, id):
+        self._record(self.dispatched, id)
+
+    def on_graded(self, id):
+        self._record(self.graded, id)
+
+    def dispatch_latencies(self, ids=None):
+        with self.lock:
+            return sorted(self.dispatched[id] - self.submitted[id] for id in self.dispatched
+                          if id in self.submitted and (ids is None or id in ids))
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    return values[min(int(len(values) * q), len(values) - 1)]
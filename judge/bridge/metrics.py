@@ -0,0 +1,292 @@
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('judge.bridge')
+
+# Upper bounds in seconds, from 10 microseconds to 10 seconds.
+DEFAULT_LATENCY_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+
+def _format_bound(bound):
+    return '+Inf' if math.isinf(bound) else repr(float(bound))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+                                          .replace('\n', r'\n'))
+                             for name, value in pairs)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError('%s expects labels %s, got %s' % (self.name, self.label_names, tuple(labels)))
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        with self.lock:
+            return list(self._values.items())
+
+    def remove(self, **labels):
+        with self.lock:
+            self._values.pop(self._key(labels), None)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A gauge that is either set explicitly, or computed on collection by `function`, which returns a dict from
+    label value tuples to values."""
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is not None:
+            return list(self.function().items())
+        return super().samples()
+
+
+class HistogramData:
+    """A thread-safe histogram with fixed buckets, in the style of Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        """Returns the cumulative count of observations for each bucket upper bound, the sum and the count."""
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+    def quantile(self, q):
+        return histogram_quantile(self.snapshot()[0], q, self.max)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def labels(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            try:
+                return self._values[key]
+            except KeyError:
+                data = self._values[key] = HistogramData(self.buckets)
+                return data
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+
+def histogram_quantile(cumulative, q, maximum=math.inf):
+    """Estimates a quantile from cumulative bucket counts, as the upper bound of the bucket it falls in."""
+    if not cumulative or not cumulative[-1][1]:
+        return 0
+    rank = q * cumulative[-1][1]
+    for bound, running in cumulative:
+        if running >= rank:
+            return min(float(bound), maximum)
+    return maximum
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError('metric %s is already registered as a %s' % (name, metric.type))
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=(), function=None):
+        gauge = self._register(Gauge, name, help, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def _collect(self):
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            try:
+                yield metric, metric.samples()
+            except Exception:
+                logger.exception('Failed to collect metric %s', metric.name)
+
+    def snapshot(self):
+        """Returns all metrics as a JSON serializable dict."""
+        result = {}
+        for metric, samples in self._collect():
+            values = []
+            for key, value in samples:
+                labels = dict(zip(metric.label_names, key))
+                if isinstance(value, HistogramData):
+                    cumulative, total, count = value.snapshot()
+                    value = {
+                        'count': count,
+                        'sum': total,
+                        'max': value.max,
+                        'buckets': [[_format_bound(bound), running] for bound, running in cumulative],
+                    }
+                values.append({'labels': labels, 'value': value})
+            result[metric.name] = {'type': metric.type, 'help': metric.help, 'samples': values}
+        return result
+
+    def render_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric, samples in self._collect():
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for key, value in samples:
+                if isinstance(value, HistogramData):
+                    cumulative, total, count = value.snapshot()
+                    for bound, running in cumulative:
+                        lines.append('%s_bucket%s %d' % (
+                            metric.name, _format_labels(metric.label_names, key, [('le', _format_bound(bound))]),
+                            running,
+                        ))
+                    lines.append('%s_sum%s %r' % (metric.name, _format_labels(metric.label_names, key), float(total)))
+                    lines.append('%s_count%s %d' % (metric.name, _format_labels(metric.label_names, key), count))
+                else:
+                    lines.append('%s%s %r' % (metric.name, _format_labels(metric.label_names, key), float(value)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def snapshot_quantile(sample, q):
+    """Estimates a quantile of a histogram sample from `MetricsRegistry.snapshot`."""
+    value = sample['value']
+    return histogram_quantile([(float(bound), running) for bound, running in value['buckets']], q, value['max'])
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(address):
+    """Serves the metrics in the Prometheus text format at /metrics on `address`, in a background thread."""
+    server = ThreadingHTTPServer(tuple(address), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info('Serving metrics on %s', address)
+    return server
+
+
+class TimedLock:
+    """
+    A reentrant lock recording in a histogram how long it is held, from the outermost acquire to the matching
+    release.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._lock = threading.RLock()
+        # Only modified by the thread holding the lock.
+        self._depth = 0
+        self._acquired_at = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired_at = time.perf_counter()
+        return True
+
+    def release(self):
+        self._depth -= 1
+        held = time.perf_counter() - self._acquired_at if not self._depth else None
+        self._lock.release()
+        if held is not None:
+            self.histogram.observe(held)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -1,14 +1,12 @@
+import fnmatch
 import glob
 import logging
 import os
 import threading
 import time
+from collections import Counter
 from pathlib import Path
 
-from django import db
-
-from judge.models import Problem
-
 try:
     from watchdog.observers import Observer
     from watchdog.events import (
@@ -27,10 +25,6 @@ except ImportError:
 logger = logging.getLogger('judge.monitor')
 
 
-def _ensure_connection():
-    db.connection.close_if_unusable_or_obsolete()
-
-
 def find_glob_root(g: str) -> Path:
     """
     Given a glob, find a directory that contains all its possible patterns
@@ -41,72 +35,191 @@ def find_glob_root(g: str) -> Path:
     return root
 
 
-class SendProblemsHandler(FileSystemEventHandler):
-    ALLOWED_EVENT_TYPES = (
-        EVENT_TYPE_MOVED,
-        EVENT_TYPE_DELETED,
-        EVENT_TYPE_MODIFIED,
-        EVENT_TYPE_CREATED,
-    )
+def _match_parts(parts, patterns):
+    if not patterns:
+        return not parts
+    if patterns[0] == '**':
+        return any(_match_parts(parts[i:], patterns[1:]) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], patterns[0]) and _match_parts(parts[1:], patterns[1:])
+
 
-    def __init__(self, signal):
-        self.signal = signal
+class ProblemCatalog:
+    """
+    The problems found under the problem storage globs, kept up to date from individual filesystem events.
+
+    A problem is supported as long as at least one readable `init.yml` of the same code matches one of the globs.
+    """
+
+    def __init__(self, problem_globs):
+        self.problem_globs = problem_globs
+        self.patterns = [Path(os.path.abspath(os.path.join(dir_glob, 'init.yml'))).parts for dir_glob in problem_globs]
+        # path of init.yml: problem code
+        self.paths = {}
+        self.codes = Counter()
+
+    @property
+    def problems(self):
+        return set(self.codes)
+
+    def matches(self, path):
+        parts = Path(path).parts
+        return any(_match_parts(parts, pattern) for pattern in self.patterns)
+
+    def scan(self, root=None):
+        """Finds all problem configurations, or only those under `root` if given."""
+        if root is None:
+            paths = set()
+            for dir_glob in self.problem_globs:
+                paths.update(map(os.path.abspath, glob.iglob(os.path.join(dir_glob, 'init.yml'), recursive=True)))
+        else:
+            paths = {os.path.join(dirpath, 'init.yml') for dirpath, _, filenames in os.walk(root)
+                     if 'init.yml' in filenames}
+        return {path for path in paths if self.matches(path) and os.access(path, os.R_OK)}
+
+    def add(self, path):
+        if path not in self.paths:
+            code = os.path.basename(os.path.dirname(path))
+            self.paths[path] = code
+            self.codes[code] += 1
+
+    def remove(self, path):
+        code = self.paths.pop(path, None)
+        if code is not None:
+            self.codes[code] -= 1
+            if not self.codes[code]:
+                del self.codes[code]
+
+    def remove_tree(self, root):
+        prefix = os.path.join(root, '')
+        for path in [path for path in self.paths if path.startswith(prefix)]:
+            self.remove(path)
+
+    def apply(self, events):
+        """Applies a batch of (event type, path, is directory) filesystem events, returning the added and removed
+        problem codes."""
+        before = self.problems
+        for event_type, path, is_directory in events:
+            path = os.path.abspath(path)
+            if event_type == EVENT_TYPE_DELETED:
+                if is_directory:
+                    self.remove_tree(path)
+                else:
+                    self.remove(path)
+            elif is_directory:
+                for config in self.scan(path):
+                    self.add(config)
+            elif os.path.basename(path) == 'init.yml':
+                if self.matches(path) and os.access(path, os.R_OK):
+                    self.add(path)
+                else:
+                    self.remove(path)
+        after = self.problems
+        return after - before, before - after
+
+    def reconcile(self):
+        """Replaces the catalog with a full scan, returning the added and removed problem codes."""
+        before = self.problems
+        self.paths = {}
+        self.codes = Counter()
+        for path in self.scan():
+            self.add(path)
+        after = self.problems
+        return after - before, before - after
+
+
+class SendProblemsHandler(FileSystemEventHandler):
+    def __init__(self, monitor):
+        self.monitor = monitor
 
     def on_any_event(self, event):
-        if event.event_type not in self.ALLOWED_EVENT_TYPES:
-            return
-        self.signal.set()
+        if event.event_type == EVENT_TYPE_MOVED:
+            # A move is a deletion of the source followed by a creation of the destination.
+            self.monitor.push_event(EVENT_TYPE_DELETED, event.src_path, event.is_directory)
+            self.monitor.push_event(EVENT_TYPE_CREATED, event.dest_path, event.is_directory)
+        elif event.event_type in (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED):
+            self.monitor.push_event(event.event_type, event.src_path, event.is_directory)
+        elif event.event_type == EVENT_TYPE_MODIFIED and not event.is_directory and \
+                os.path.basename(event.src_path) == 'init.yml':
+            # The permissions of a configuration may have changed.
+            self.monitor.push_event(event.event_type, event.src_path, event.is_directory)
 
 
 class Monitor:
-    def __init__(self, judges, problem_globs):
+    # Number of seconds to wait after an event for further events, so that they are applied together
+    EVENT_BATCH_DELAY = 1
+
+    def __init__(self, judges, problem_globs, reconcile_interval=3600):
         if not has_watchdog_installed:
             raise ImportError('watchdog is not installed')
 
         self.judges = judges
-        self.problem_globs = problem_globs
+        self.catalog = ProblemCatalog(problem_globs)
+        self.reconcile_interval = reconcile_interval
+
+        self.events = []
+        self.events_lock = threading.Lock()
 
         self.updater_exit = False
         self.updater_signal = threading.Event()
         self.updater = threading.Thread(target=self.updater_thread)
 
-        self._handler = SendProblemsHandler(self.updater_signal)
+        self._handler = SendProblemsHandler(self)
         self._observer = Observer()
 
         for root in set(map(find_glob_root, problem_globs)):
             self._observer.schedule(self._handler, root, recursive=True)
             logger.info('Scheduled for monitoring: %s', root)
 
-    def update_supported_problems(self):
-        problems = []
-        for dir_glob in self.problem_globs:
-            for problem_config in glob.iglob(os.path.join(dir_glob, 'init.yml'), recursive=True):
-                if os.access(problem_config, os.R_OK):
-                    problem_dir = os.path.dirname(problem_config)
-                    problem = os.path.basename(problem_dir)
-                    problems.append(problem)
-        problems = set(problems)
+    def push_event(self, event_type, path, is_directory):
+        with self.events_lock:
+            self.events.append((event_type, path, is_directory))
+        self.updater_signal.set()
+
+    def reconcile(self):
+        added, removed = self.catalog.reconcile()
+        if added or removed:
+            logger.info('Full scan found %d problems, %d added and %d removed',
+                        len(self.catalog.codes), len(added), len(removed))
+        changed = self.judges.problem_map.refresh()
+        if changed:
+            logger.info('Problem codes changed in the database: %s', ', '.join(sorted(changed)))
+        self.judges.update_problems_all(self.catalog.problems)
+
+    def process_events(self):
+        with self.events_lock:
+            events, self.events = self.events, []
+        if not events:
+            return
 
-        _ensure_connection()
-        problem_ids = list(Problem.objects.filter(code__in=list(problems)).values_list('id', flat=True))
-        self.judges.update_problems_all(problems, problem_ids)
+        added, removed = self.catalog.apply(events)
+        if added or removed:
+            logger.info('Problems changed: %d added, %d removed', len(added), len(removed))
+            self.judges.update_problems_delta(added, removed)
 
     def updater_thread(self) -> None:
+        next_reconcile = time.monotonic()
         while True:
-            self.updater_signal.wait()
-            self.updater_signal.clear()
+            self.updater_signal.wait(max(next_reconcile - time.monotonic(), 0))
             if self.updater_exit:
                 return
 
             try:
-                self.update_supported_problems()
-                time.sleep(3)
+                if time.monotonic() >= next_reconcile:
+                    # Events received before the scan are covered by it.
+                    with self.events_lock:
+                        self.events = []
+                    self.updater_signal.clear()
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+                    self.reconcile()
+                else:
+                    time.sleep(self.EVENT_BATCH_DELAY)
+                    self.updater_signal.clear()
+                    self.process_events()
             except Exception:
                 logger.exception('Failed to update problems.')
 
     def start(self):
         self.updater.start()
-        self.updater_signal.set()
         try:
             self._observer.start()
         except OSError:
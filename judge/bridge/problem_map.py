@@ -0,0 +1,119 @@
+import logging
+import sys
+import threading
+from collections import defaultdict
+
+from django import db
+
+from judge.models import Judge, Problem
+from judge.utils.iterator import chunk
+
+logger = logging.getLogger('judge.bridge')
+
+QUERY_CHUNK_SIZE = 1000
+
+
+class ProblemMap:
+    """
+    Shared state for synchronizing the problems supported by judges with the `judge_judge_problems` table.
+
+    Problem codes are resolved to ids once and kept in a map shared by all judges, so that a judge (re)connecting
+    with thousands of problems only queries the codes that were never seen before. The ids last written for each
+    judge are remembered as well, so that the table is updated with insert and delete diffs instead of rewriting
+    the whole set.
+
+    Codes that judges stop supporting are dropped from the map, and all the codes are resolved again on each full
+    reconcile, so that a renamed or reused code is not kept pointing at the wrong problem.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.judge_problems = {}
+        self.judge_locks = defaultdict(threading.Lock)
+
+    @staticmethod
+    def intern(codes):
+        return frozenset(map(sys.intern, codes))
+
+    def resolve(self, codes):
+        with self.lock:
+            missing = [code for code in codes if code not in self.ids]
+
+        if missing:
+            db.connection.close_if_unusable_or_obsolete()
+            found = []
+            for part in chunk(missing, QUERY_CHUNK_SIZE):
+                found += Problem.objects.filter(code__in=part).values_list('code', 'id')
+            with self.lock:
+                for code, id in found:
+                    self.ids[sys.intern(code)] = id
+
+        with self.lock:
+            return frozenset(self.ids[code] for code in codes if code in self.ids)
+
+    def forget(self, codes):
+        """Drops problem codes, so that they are resolved again the next time they are seen."""
+        with self.lock:
+            for code in codes:
+                self.ids.pop(code, None)
+
+    def refresh(self):
+        """
+        Resolves all the known problem codes again, since a code may have been renamed or given to another problem
+        since it was resolved. Returns the codes whose id changed or which no longer exist.
+        """
+        with self.lock:
+            codes = list(self.ids)
+
+        db.connection.close_if_unusable_or_obsolete()
+        found = {}
+        for part in chunk(codes, QUERY_CHUNK_SIZE):
+            found.update(Problem.objects.filter(code__in=part).values_list('code', 'id'))
+
+        with self.lock:
+            changed = {code for code in codes if code in self.ids and self.ids[code] != found.get(code)}
+            for code in changed:
+                if code in found:
+                    self.ids[code] = found[code]
+                else:
+                    del self.ids[code]
+        return changed
+
+    def _forget(self, problem_ids):
+        with self.lock:
+            self.ids = {code: id for code, id in self.ids.items() if id not in problem_ids}
+
+    def sync_judge(self, judge_id, problem_ids):
+        through = Judge.problems.through
+
+        with self.judge_locks[judge_id]:
+            with self.lock:
+                current = self.judge_problems.get(judge_id)
+            if current is None:
+                current = frozenset(through.objects.filter(judge_id=judge_id).values_list('problem_id', flat=True))
+
+            added = problem_ids - current
+            removed = current - problem_ids
+
+            for part in chunk(removed, QUERY_CHUNK_SIZE):
+                through.objects.filter(judge_id=judge_id, problem_id__in=part).delete()
+
+            if added:
+                # Problems deleted since their codes were resolved are dropped here, as the insert cannot report them:
+                # MySQL skips them with ignore_conflicts, while other databases fail on the foreign key.
+                existing = set()
+                for part in chunk(added, QUERY_CHUNK_SIZE):
+                    existing.update(Problem.objects.filter(id__in=part).values_list('id', flat=True))
+                if added - existing:
+                    self._forget(added - existing)
+                    problem_ids -= added - existing
+                    added &= existing
+                through.objects.bulk_create([through(judge_id=judge_id, problem_id=id) for id in added],
+                                            batch_size=QUERY_CHUNK_SIZE, ignore_conflicts=True)
+
+            with self.lock:
+                self.judge_problems[judge_id] = problem_ids
+
+        logger.info('Judge %s problems synchronized: %d added, %d removed', judge_id, len(added), len(removed))
+        return added, removed
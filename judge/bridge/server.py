@@ -4,6 +4,17 @@ from socketserver import TCPServer, ThreadingMixIn
 
 class ThreadingTCPListener(ThreadingMixIn, TCPServer):
     allow_reuse_address = True
+    # The default of 5 drops connections when many clients connect at once.
+    request_queue_size = 128
+
+    def call_periodically(self, interval, function, stop):
+        def run():
+            while True:
+                function()
+                if stop.wait(interval):
+                    break
+
+        threading.Thread(target=run).start()
 
 
 class Server:
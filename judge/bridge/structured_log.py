@@ -0,0 +1,131 @@
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from random import random
+
+from judge.bridge.metrics import registry
+
+logger = logging.getLogger('judge.bridge')
+
+dropped = registry.counter('bridge_json_log_dropped_total', 'JSON log records dropped', ('reason',))
+
+# Fields holding text sent by judges, which can be as large as the output of a submission
+FREE_TEXT_FIELDS = ('feedback', 'extended_feedback', 'output', 'info')
+
+
+class JsonMessage:
+    """
+    A log message serialized to JSON only when it is formatted, so that logging it costs a reference until a
+    handler actually writes it. The data must not be modified once logged.
+    """
+
+    __slots__ = ('data', 'max_field_length')
+
+    def __init__(self, data, max_field_length=None):
+        self.data = data
+        self.max_field_length = max_field_length
+
+    def __str__(self):
+        data = self.data
+        limit = self.max_field_length
+        if limit is not None:
+            data = dict(data)
+            for field in FREE_TEXT_FIELDS:
+                value = data.get(field)
+                if isinstance(value, str) and len(value) > limit:
+                    data[field] = value[:limit]
+                    data[field + '_truncated'] = len(value)
+        return json.dumps(data)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the records of each action given in `rates`. Warnings and errors are always kept."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, JsonMessage):
+            return True
+        rate = self.rates.get(record.msg.data.get('action'))
+        if rate is None or random() < rate:
+            return True
+        dropped.inc(reason='sampled')
+        return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A `QueueHandler` that leaves formatting, and so serialization, to the listener thread, and drops records
+    instead of blocking the logging thread when the queue is full.
+    """
+
+    def __init__(self, queue, max_field_length=None):
+        super().__init__(queue)
+        self.max_field_length = max_field_length
+
+    def prepare(self, record):
+        if isinstance(record.msg, JsonMessage) and self.max_field_length is not None:
+            record.msg.max_field_length = self.max_field_length
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped.inc(reason='queue-full')
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full, in which case this waits for the listener to make room.
+        self.queue.put(self._sentinel)
+
+
+class JsonLog:
+    """
+    Moves the handlers of a logger, including those it propagates to, behind a queue drained by a listener thread,
+    so that logging never waits on the disk.
+    """
+
+    def __init__(self, name, sampling=None, max_field_length=None, queue_size=10000):
+        self.logger = logging.getLogger(name)
+        self.queue = queue.Queue(queue_size)
+        self.handler = DeferredQueueHandler(self.queue, max_field_length)
+        if sampling:
+            self.handler.addFilter(SamplingFilter(sampling))
+        self.listener = None
+        self._handlers = None
+        self._propagate = None
+
+    def _effective_handlers(self):
+        handlers = []
+        current = self.logger
+        while current is not None:
+            handlers.extend(current.handlers)
+            if not current.propagate:
+                break
+            current = current.parent
+        return handlers
+
+    def start(self):
+        handlers = self._effective_handlers()
+        self._handlers = list(self.logger.handlers)
+        self._propagate = self.logger.propagate
+
+        self.listener = DrainingQueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.logger.handlers = [self.handler]
+        self.logger.propagate = False
+        logger.info('Writing %s logs from a background thread', self.logger.name)
+
+    def stop(self):
+        if self.listener is None:
+            return
+        self.logger.handlers = self._handlers
+        self.logger.propagate = self._propagate
+        # Writes the records still in the queue.
+        self.listener.stop()
+        self.listener = None
@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from judge.bridge.ide_runs import IdeRunStore, is_ide_run
+
+
+@mock.patch('judge.bridge.ide_runs.time.monotonic')
+class IdeRunStoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.runs = IdeRunStore(concurrency=1, ttl=300)
+
+    def test_start(self, monotonic):
+        monotonic.return_value = 0
+        run = self.runs.start('user')
+        self.assertTrue(is_ide_run(run.id))
+        self.assertIs(self.runs.find(run.key, 'user'), run)
+        self.assertIsNone(self.runs.find(run.key, 'other'))
+        self.assertIsNone(self.runs.start('user'))
+
+        self.runs.finish(run.id, 'done', output='hello')
+        self.assertTrue(run.done.done())
+        self.assertEqual(self.runs.result(run), (True, {'output': 'hello', 'status': 'done'}))
+        self.assertIsNotNone(self.runs.start('user'))
+
+    def test_expire_abandons_unfinished_runs(self, monotonic):
+        monotonic.return_value = 0
+        run = self.runs.start('user')
+
+        monotonic.return_value = 299
+        self.assertEqual(self.runs.expire(), [])
+
+        monotonic.return_value = 300
+        self.assertEqual(self.runs.expire(), [run.id])
+        self.assertTrue(run.done.done())
+        self.assertEqual(self.runs.result(run), (True, {'status': 'expired'}))
+        # The slot of the abandoned run is free again, and its result is kept for another while.
+        self.assertIsNotNone(self.runs.start('user'))
+        self.assertIs(self.runs.find(run.key, 'user'), run)
+
+        monotonic.return_value = 600
+        self.runs.expire()
+        self.assertIsNone(self.runs.find(run.key, 'user'))
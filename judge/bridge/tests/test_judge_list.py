@@ -0,0 +1,157 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from judge.bridge.judge_list import JudgeList
+from judge.judge_priority import BATCH_REJUDGE_PRIORITY, DEFAULT_PRIORITY, REJUDGE_PRIORITY
+
+
+class FakeJudge:
+    def __init__(self, name, tier=1):
+        self.name = name
+        self.tier = tier
+        self.is_disabled = False
+        self.load = 0
+        self.utilization = 0
+        self._working = False
+        self.submissions = []
+
+    @property
+    def working(self):
+        return bool(self._working)
+
+    def get_current_submission(self):
+        return self._working or None
+
+    def can_judge(self, problem, executor, judge_id=None):
+        return not judge_id or judge_id == self.name
+
+    def submit(self, id, packet):
+        self._working = id
+        self.submissions.append(id)
+
+
+class JudgeListTestCase(SimpleTestCase):
+    def setUp(self):
+        self.judge = FakeJudge('judge')
+
+    def make_judge_list(self, **kwargs):
+        judges = JudgeList(**kwargs)
+        judges.register(self.judge)
+        return judges
+
+    def submit(self, judges, id, flow, priority=DEFAULT_PRIORITY, weight=1):
+        judges.judge(id, 'aplusb', 'PY3', {}, None, priority, flow=flow, weight=weight)
+
+    def drain(self, judges):
+        while self.judge.working:
+            judges.on_judge_free(self.judge, self.judge.get_current_submission())
+        return self.judge.submissions
+
+    def test_first_come_first_served(self):
+        judges = self.make_judge_list()
+        for id, flow in ((1, 'a'), (2, 'a'), (3, 'a'), (4, 'a'), (5, 'b')):
+            self.submit(judges, id, flow)
+        self.assertEqual(self.drain(judges), [1, 2, 3, 4, 5])
+
+    def test_fair_queue(self):
+        judges = self.make_judge_list(fair_queue=True)
+        for id, flow in ((1, 'a'), (2, 'a'), (3, 'a'), (4, 'a'), (5, 'b'), (6, 'b')):
+            self.submit(judges, id, flow)
+        # Submission 1 is dispatched at once, then the queued ones take turns between users.
+        self.assertEqual(self.drain(judges), [1, 2, 5, 3, 6, 4])
+
+    def test_fair_queue_weights(self):
+        judges = self.make_judge_list(fair_queue=True)
+        self.submit(judges, 1, 'a')
+        for id in range(2, 6):
+            self.submit(judges, id, 'a', weight=2)
+        for id in range(6, 8):
+            self.submit(judges, id, 'b')
+        self.assertEqual(self.drain(judges), [1, 2, 3, 6, 4, 5, 7])
+
+    def test_fair_queue_within_priority(self):
+        judges = self.make_judge_list(fair_queue=True)
+        self.submit(judges, 1, 'a')
+        self.submit(judges, 2, 'a', priority=REJUDGE_PRIORITY)
+        self.submit(judges, 3, 'a')
+        self.submit(judges, 4, 'b')
+        self.assertEqual(self.drain(judges), [1, 3, 4, 2])
+
+    def test_queue_depths(self):
+        judges = self.make_judge_list(aging_interval=600)
+        self.submit(judges, 1, 'a')
+        self.submit(judges, 2, 'a', priority=REJUDGE_PRIORITY)
+        self.submit(judges, 3, 'a')
+        self.submit(judges, 4, 'a', priority=BATCH_REJUDGE_PRIORITY)
+        judges.abort(3)
+        # Submission 1 is being graded, and the others are counted by their priority.
+        self.assertEqual(judges._queue_depths(), {('0',): 0, ('1',): 0, ('2',): 1, ('3',): 1})
+
+        with mock.patch('judge.bridge.judge_list.time.monotonic', return_value=time.monotonic() + 600):
+            judges._age_queue()
+        self.assertEqual(judges._queue_depths(), {('0',): 0, ('1',): 1, ('2',): 1, ('3',): 0})
+
+        self.drain(judges)
+        self.assertEqual(judges._queue_depths(), {('0',): 0, ('1',): 0, ('2',): 0, ('3',): 0})
+
+    def test_fair_queue_abort(self):
+        judges = self.make_judge_list(fair_queue=True)
+        for id, flow in ((1, 'a'), (2, 'a'), (3, 'a'), (4, 'b')):
+            self.submit(judges, id, flow)
+        judges.abort(2)
+        self.assertEqual(self.drain(judges), [1, 4, 3])
+        self.assertEqual(judges.flows[DEFAULT_PRIORITY], {})
+
+    def queued_priority(self, judges, id):
+        return judges.node_map[id].value.priority
+
+    @mock.patch('judge.bridge.judge_list.time.monotonic')
+    def test_aging(self, monotonic):
+        monotonic.return_value = 0
+        judges = self.make_judge_list(aging_interval=600)
+        self.submit(judges, 1, 'a')
+        self.submit(judges, 2, 'a', priority=BATCH_REJUDGE_PRIORITY)
+
+        monotonic.return_value = 599
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), BATCH_REJUDGE_PRIORITY)
+
+        # A submission moves up one priority at a time, and waits again before moving up the next one.
+        monotonic.return_value = 1300
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), REJUDGE_PRIORITY)
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), REJUDGE_PRIORITY)
+
+        monotonic.return_value = 1900
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), DEFAULT_PRIORITY)
+
+        monotonic.return_value = 10000
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), DEFAULT_PRIORITY)
+
+    @mock.patch('judge.bridge.judge_list.time.monotonic')
+    def test_aging_order(self, monotonic):
+        monotonic.return_value = 0
+        judges = self.make_judge_list(aging_interval=600)
+        self.submit(judges, 1, 'a')
+        self.submit(judges, 2, 'a', priority=REJUDGE_PRIORITY)
+        self.submit(judges, 3, 'a')
+        monotonic.return_value = 600
+        judges._age_queue()
+        self.submit(judges, 4, 'a')
+        # Submission 2 moves up behind submission 3, but ahead of submission 4, which came in after it moved.
+        self.assertEqual(self.drain(judges), [1, 3, 2, 4])
+
+    @mock.patch('judge.bridge.judge_list.time.monotonic')
+    def test_no_aging(self, monotonic):
+        monotonic.return_value = 0
+        judges = self.make_judge_list()
+        self.submit(judges, 1, 'a')
+        self.submit(judges, 2, 'a', priority=BATCH_REJUDGE_PRIORITY)
+        monotonic.return_value = 100000
+        judges._age_queue()
+        self.assertEqual(self.queued_priority(judges, 2), BATCH_REJUDGE_PRIORITY)
@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from judge.bridge.problem_map import ProblemMap
+from judge.models import Judge, Problem
+from judge.models.tests.util import create_problem
+
+
+class ProblemMapTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = create_problem(code='first')
+        cls.second = create_problem(code='second')
+
+    def test_resolve(self):
+        problem_map = ProblemMap()
+        self.assertEqual(problem_map.resolve({'first', 'second', 'missing'}), {self.first.id, self.second.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(problem_map.resolve({'first'}), {self.first.id})
+
+    def test_forget(self):
+        problem_map = ProblemMap()
+        problem_map.resolve({'first'})
+        Problem.objects.filter(id=self.first.id).update(code='renamed')
+        Problem.objects.filter(id=self.second.id).update(code='first')
+
+        problem_map.forget({'first'})
+        self.assertEqual(problem_map.resolve({'first'}), {self.second.id})
+
+    def test_refresh(self):
+        problem_map = ProblemMap()
+        problem_map.resolve({'first', 'second'})
+        Problem.objects.filter(id=self.first.id).update(code='renamed')
+        Problem.objects.filter(id=self.second.id).update(code='first')
+
+        self.assertEqual(problem_map.refresh(), {'first', 'second'})
+        self.assertEqual(problem_map.ids, {'first': self.second.id})
+        self.assertEqual(problem_map.refresh(), set())
+
+    def test_sync_judge(self):
+        judge = Judge.objects.create(name='judge', auth_key='key')
+        problem_map = ProblemMap()
+        ids = problem_map.resolve({'first', 'second'})
+        # The second problem is deleted after its code was resolved.
+        Problem.objects.filter(id=self.second.id).delete()
+
+        self.assertEqual(problem_map.sync_judge(judge.id, ids), ({self.first.id}, set()))
+        self.assertEqual(set(judge.problems.values_list('id', flat=True)), {self.first.id})
+        self.assertEqual(problem_map.ids, {'first': self.first.id})
+        self.assertEqual(problem_map.judge_problems[judge.id], {self.first.id})
@@ -10,6 +10,7 @@ from django.utils.translation import gettext as _, gettext_lazy
 
 from judge.contest_format.base import BaseContestFormat
 from judge.contest_format.registry import register_contest_format
+from judge.contest_format.solves import SolveSummary
 from judge.utils.timedelta import nice_repr
 
 
@@ -45,31 +46,19 @@ class DefaultContestFormat(BaseContestFormat):
         participation.format_data = format_data
         participation.save()
 
+    @property
+    def has_first_solves(self):
+        return True
+
+    def get_problem_result(self, format_data, frozen=False):
+        """Returns the points and time of a participation on a problem, from its format data for the problem."""
+        return format_data['points'], format_data['time']
+
     def get_first_solves_and_total_ac(self, problems, participations, frozen=False):
-        first_solves = {}
-        total_ac = {}
-
-        for problem in problems:
-            problem_id = str(problem.id)
-            min_time = None
-            first_solves[problem_id] = None
-            total_ac[problem_id] = 0
-
-            for participation in participations:
-                format_data = (participation.format_data or {}).get(problem_id)
-                if format_data:
-                    points = format_data['points']
-                    time = format_data['time']
-
-                    if points == problem.points:
-                        total_ac[problem_id] += 1
-
-                        # Only acknowledge first solves for live participations
-                        if participation.virtual == 0 and (min_time is None or min_time > time):
-                            min_time = time
-                            first_solves[problem_id] = participation.id
-
-        return first_solves, total_ac
+        summary = SolveSummary(self, problems, frozen)
+        for participation in participations:
+            summary.add(participation.id, participation.virtual, participation.format_data)
+        return summary.result()
 
     def display_user_problem(self, participation, contest_problem, first_solves, frozen=False):
         format_data = (participation.format_data or {}).get(str(contest_problem.id))
@@ -144,32 +144,9 @@ class ICPCContestFormat(DefaultContestFormat):
         participation.format_data = format_data
         participation.save()
 
-    def get_first_solves_and_total_ac(self, problems, participations, frozen=False):
-        first_solves = {}
-        total_ac = {}
-
+    def get_problem_result(self, format_data, frozen=False):
         prefix = 'frozen_' if frozen else ''
-        for problem in problems:
-            problem_id = str(problem.id)
-            min_time = None
-            first_solves[problem_id] = None
-            total_ac[problem_id] = 0
-
-            for participation in participations:
-                format_data = (participation.format_data or {}).get(problem_id)
-                if format_data:
-                    points = format_data[prefix + 'points']
-                    time = format_data['time']
-
-                    if points == problem.points:
-                        total_ac[problem_id] += 1
-
-                        # Only acknowledge first solves for live participations
-                        if participation.virtual == 0 and (min_time is None or min_time > time):
-                            min_time = time
-                            first_solves[problem_id] = participation.id
-
-        return first_solves, total_ac
+        return format_data[prefix + 'points'], format_data['time']
 
     def display_user_problem(self, participation, contest_problem, first_solves, frozen=False):
         format_data = (participation.format_data or {}).get(str(contest_problem.id))
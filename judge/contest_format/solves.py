@@ -0,0 +1,161 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger('judge.contest_format')
+
+# Summaries are updated in place as participations change, and rebuilt from scratch when they expire, which bounds
+# how long a count can be off after two results of one participation are recomputed at the same time.
+SUMMARY_TIMEOUT = 600
+LOCK_TIMEOUT = 30
+
+
+def summary_key(contest_id, frozen):
+    return 'contest_solves:%d:%d' % (contest_id, frozen)
+
+
+def lock_key(contest_id):
+    return 'contest_solves_lock:%d' % contest_id
+
+
+def dirty_key(contest_id):
+    return 'contest_solves_dirty:%d' % contest_id
+
+
+class SolveSummary:
+    """
+    The first solve and the number of full solves of every problem of a contest, built in one pass over the
+    participations rather than one pass per problem.
+    """
+
+    def __init__(self, contest_format, problems, frozen=False):
+        self.format = contest_format
+        self.frozen = frozen
+        self.points = {str(problem.id): problem.points for problem in problems}
+        # problem id: (time, participation id) of the first live solve
+        self.first = dict.fromkeys(self.points)
+        self.live_ac = dict.fromkeys(self.points, 0)
+        self.all_ac = dict.fromkeys(self.points, 0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The format is tied to a contest object, and is set again when the summary is read from the cache.
+        del state['format']
+        return state
+
+    def solve_times(self, format_data):
+        """Returns a dict of problem id: time of the problems fully solved in `format_data`."""
+        times = {}
+        for problem_id, problem_data in (format_data or {}).items():
+            points = self.points.get(problem_id)
+            if points is None or not problem_data:
+                continue
+            problem_points, time = self.format.get_problem_result(problem_data, self.frozen)
+            if problem_points == points:
+                times[problem_id] = time
+        return times
+
+    def add(self, participation_id, virtual, format_data):
+        # Only acknowledge first solves for live participations
+        live = virtual == 0
+        for problem_id, time in self.solve_times(format_data).items():
+            self.all_ac[problem_id] += 1
+            if not live:
+                continue
+            self.live_ac[problem_id] += 1
+            first = self.first[problem_id]
+            if self.format.has_first_solves and (first is None or (time, participation_id) < first):
+                self.first[problem_id] = (time, participation_id)
+
+    def update(self, participation_id, virtual, old_format_data, format_data):
+        """
+        Replaces the results of a participation. Returns False if this takes away a first solve, in which case the
+        summary has to be rebuilt to find the next one.
+        """
+        times = self.solve_times(format_data)
+        for problem_id, first in self.first.items():
+            if first is not None and first[1] == participation_id:
+                time = times.get(problem_id)
+                if time is None or time > first[0]:
+                    return False
+
+        live = virtual == 0
+        for problem_id in self.solve_times(old_format_data):
+            self.all_ac[problem_id] -= 1
+            if live:
+                self.live_ac[problem_id] -= 1
+        self.add(participation_id, virtual, format_data)
+        return True
+
+    def result(self, include_virtual=True):
+        """Returns the dictionaries of `BaseContestFormat.get_first_solves_and_total_ac`."""
+        first_solves = {problem_id: first and first[1] for problem_id, first in self.first.items()}
+        return first_solves, dict(self.all_ac if include_virtual else self.live_ac)
+
+
+def build_solve_summaries(contest, problems):
+    """Builds the summaries of a contest for the live and the frozen scoreboard, in one pass over the participations."""
+    summaries = {frozen: SolveSummary(contest.format, problems, frozen) for frozen in (False, True)}
+    participations = contest.users.filter(virtual__gte=0).values_list('id', 'virtual', 'format_data')
+    for participation_id, virtual, format_data in participations.iterator():
+        for summary in summaries.values():
+            summary.add(participation_id, virtual, format_data)
+    return summaries
+
+
+def get_first_solves_and_total_ac(contest, problems, frozen=False, include_virtual=True):
+    """Returns the first solves and AC counts of all the participations of a contest, from the cached summary."""
+    summary = cache.get(summary_key(contest.id, frozen))
+    if summary is None or summary.points != {str(problem.id): problem.points for problem in problems}:
+        # Only one process builds the summaries, so that none of them overwrites a newer one with an older one.
+        if cache.add(lock_key(contest.id), True, LOCK_TIMEOUT):
+            try:
+                cache.delete(dirty_key(contest.id))
+                summaries = build_solve_summaries(contest, problems)
+                # A participation that changed while the summaries were built may not be in them.
+                if not cache.get(dirty_key(contest.id)):
+                    cache.set_many({summary_key(contest.id, key): value for key, value in summaries.items()},
+                                   SUMMARY_TIMEOUT)
+            finally:
+                cache.delete(lock_key(contest.id))
+        else:
+            summaries = build_solve_summaries(contest, problems)
+        summary = summaries[frozen]
+    summary.format = contest.format
+    return summary.result(include_virtual)
+
+
+def invalidate_solve_summaries(contest_id):
+    cache.delete_many([summary_key(contest_id, frozen) for frozen in (False, True)])
+
+
+def _update_solve_summaries(contest, participation_id, virtual, old_format_data, format_data):
+    if not cache.add(lock_key(contest.id), True, LOCK_TIMEOUT):
+        logger.info('Solve summaries of contest %s are busy, dropping them', contest.key)
+        cache.set(dirty_key(contest.id), True, LOCK_TIMEOUT)
+        invalidate_solve_summaries(contest.id)
+        return
+
+    try:
+        for frozen in (False, True):
+            key = summary_key(contest.id, frozen)
+            summary = cache.get(key)
+            if summary is None:
+                continue
+            summary.format = contest.format
+            if summary.update(participation_id, virtual, old_format_data, format_data):
+                cache.set(key, summary, SUMMARY_TIMEOUT)
+            else:
+                cache.delete(key)
+    finally:
+        cache.delete(lock_key(contest.id))
+
+
+def update_solve_summaries(participation, old_format_data):
+    """Applies the change of a participation's results to the cached summaries, once it is committed."""
+    if old_format_data == participation.format_data:
+        return
+    transaction.on_commit(lambda: _update_solve_summaries(participation.contest, participation.id,
+                                                          participation.virtual, old_format_data,
+                                                          participation.format_data))
@@ -0,0 +1,93 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from judge.contest_format.solves import SolveSummary
+
+
+class FakeFormat:
+    has_first_solves = True
+
+    def get_problem_result(self, format_data, frozen=False):
+        prefix = 'frozen_' if frozen else ''
+        return format_data[prefix + 'points'], format_data['time']
+
+
+def naive_first_solves_and_total_ac(problems, participations, frozen=False):
+    """The per-problem loop that `SolveSummary` replaces, breaking ties on time by participation id."""
+    prefix = 'frozen_' if frozen else ''
+    first_solves = {}
+    total_ac = {}
+    for problem in problems:
+        problem_id = str(problem.id)
+        first = None
+        total_ac[problem_id] = 0
+        for participation in participations:
+            format_data = (participation.format_data or {}).get(problem_id)
+            if format_data and format_data[prefix + 'points'] == problem.points:
+                total_ac[problem_id] += 1
+                if participation.virtual == 0 and (first is None or (format_data['time'], participation.id) < first):
+                    first = (format_data['time'], participation.id)
+        first_solves[problem_id] = first and first[1]
+    return first_solves, total_ac
+
+
+class SolveSummaryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(4)
+        self.problems = [SimpleNamespace(id=id, points=100) for id in range(1, 6)]
+        self.participations = [
+            SimpleNamespace(id=id, virtual=self.random.choice((0, 0, 1)), format_data=self.make_format_data())
+            for id in range(1, 200)
+        ]
+
+    def make_format_data(self):
+        format_data = {}
+        for problem in self.problems:
+            if self.random.random() < 0.6:
+                format_data[str(problem.id)] = {
+                    'points': self.random.choice((0, 50, 100)),
+                    'frozen_points': self.random.choice((0, 100)),
+                    'time': self.random.randrange(100),
+                }
+        return format_data
+
+    def build(self, frozen=False):
+        summary = SolveSummary(FakeFormat(), self.problems, frozen)
+        for participation in self.participations:
+            summary.add(participation.id, participation.virtual, participation.format_data)
+        return summary
+
+    def test_matches_per_problem_loop(self):
+        for frozen in (False, True):
+            with self.subTest(frozen=frozen):
+                self.assertEqual(self.build(frozen).result(),
+                                 naive_first_solves_and_total_ac(self.problems, self.participations, frozen))
+
+    def test_live_only(self):
+        live = [participation for participation in self.participations if participation.virtual == 0]
+        self.assertEqual(self.build().result(include_virtual=False),
+                         naive_first_solves_and_total_ac(self.problems, live))
+
+    def test_update(self):
+        summary = self.build()
+        first_solvers = {id for id in summary.result()[0].values() if id is not None}
+        rebuilds = 0
+        for participation in self.random.sample(self.participations, 50):
+            old_format_data = participation.format_data
+            participation.format_data = self.make_format_data()
+            if summary.update(participation.id, participation.virtual, old_format_data, participation.format_data):
+                self.assertEqual(summary.result(), naive_first_solves_and_total_ac(self.problems, self.participations))
+            else:
+                self.assertIn(participation.id, first_solvers)
+                rebuilds += 1
+                summary = self.build()
+            first_solvers = {id for id in summary.result()[0].values() if id is not None}
+        self.assertLess(rebuilds, 50)
+
+    def test_no_first_solves(self):
+        summary = SolveSummary(FakeFormat(), self.problems)
+        summary.format.has_first_solves = False
+        for participation in self.participations:
+            summary.add(participation.id, participation.virtual, participation.format_data)
+        self.assertEqual(set(summary.result()[0].values()), {None})
@@ -26,9 +26,9 @@ def _post_update_submission(submission, done=False):
                                    })
 
 
-def judge_request(packet, reply=True):
+def judge_request(packet, reply=True, timeout=None):
     sock = socket.create_connection(settings.BRIDGED_DJANGO_CONNECT or
-                                    settings.BRIDGED_DJANGO_ADDRESS[0])
+                                    settings.BRIDGED_DJANGO_ADDRESS[0], timeout)
 
     output = json.dumps(packet, separators=(',', ':'))
     output = zlib.compress(output.encode('utf-8'))
@@ -54,7 +54,7 @@ def judge_request(packet, reply=True):
 
 
 def judge_submission(submission, name='submission-request', rejudge=False, batch_rejudge=False, judge_id=None ):
-    from .models import ContestSubmission, Submission, SubmissionTestCase
+    from .models import ContestSubmission, Submission, SubmissionTestCase, SubmissionTestCaseArchive
 
     updates = {'time': None, 'memory': None, 'points': None, 'result': None, 'case_points': 0, 'case_total': 0,
                'error': None, 'rejudged_date': timezone.now() if rejudge or batch_rejudge else None, 'status': 'QU'}
@@ -80,6 +80,8 @@ def judge_submission(submission, name='submission-request', rejudge=False, batch
         return False
 
     SubmissionTestCase.objects.filter(submission_id=submission.id).delete()
+    # The new test cases are stored as rows again, until the submission is old enough to be archived.
+    SubmissionTestCaseArchive.objects.filter(submission_id=submission.id).delete()
 
     banned_judges = []
     if hasattr(submission, 'contest'):
@@ -121,6 +123,42 @@ def update_disable_judge(judge):
     judge_request({'name': 'disable-judge', 'judge-id': judge.name, 'is-disabled': judge.is_disabled})
 
 
+def get_bridge_stats(timeout=1):
+    response = judge_request({'name': 'bridge-stats'}, timeout=timeout)
+    if response.get('name') != 'bridge-stats':
+        raise ValueError('Bridge did not return stats')
+    return response['metrics']
+
+
+def run_ide(user, language, source, input, time_limit, memory_limit):
+    """Asks the bridge to run `source` on `input`, without creating a submission. Returns the key of the run, or
+    None if the user has too many runs in progress."""
+    response = judge_request({
+        'name': 'ide-run-request',
+        'user': user,
+        'language': language,
+        'source': source,
+        'input': input,
+        'time-limit': time_limit,
+        'memory-limit': memory_limit,
+    })
+    if response.get('name') == 'ide-run-rejected':
+        return None
+    if response.get('name') != 'ide-run-received':
+        raise ValueError('Bridge rejected the IDE run')
+    return response['run-key']
+
+
+def get_ide_run_result(run_key, user, wait=0):
+    """Returns whether the IDE run has finished and its result so far, waiting up to `wait` seconds for it to
+    finish, or None if the run is unknown or has expired."""
+    response = judge_request({'name': 'ide-run-result', 'run-key': run_key, 'user': user, 'wait': wait},
+                             timeout=wait + 10)
+    if response.get('name') != 'ide-run-result':
+        return None
+    return response['done'], response['result']
+
+
 def abort_submission(submission):
     from .models import Submission
     # We only want to try to abort a submission if it's still grading, otherwise this can lead to fully graded
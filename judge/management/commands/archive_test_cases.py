@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from judge.models import Submission, SubmissionTestCaseArchive
+
+
+class Command(BaseCommand):
+    help = 'pack the test cases of old graded submissions into archives, or restore archived test cases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.VNOJ_TEST_CASE_ARCHIVE_AGE,
+                            help='archive submissions older than this many days')
+        parser.add_argument('--batch-size', type=int, default=500, help='number of submissions archived at a time')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='seconds to wait between batches, to limit the load on the database')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='SUBMISSION',
+                            help='restore the test cases of these submissions instead')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            restored = SubmissionTestCaseArchive.restore(options['restore'])
+            print('Restored test cases of %d submissions' % restored)
+            return
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        queryset = Submission.objects.filter(date__lt=cutoff, test_case_archive__isnull=True) \
+            .exclude(status__in=Submission.IN_PROGRESS_GRADING_STATUS)
+
+        last_id = 0
+        archived = 0
+        while True:
+            submission_ids = list(queryset.filter(id__gt=last_id).order_by('id')
+                                  .values_list('id', flat=True)[:options['batch_size']])
+            if not submission_ids:
+                break
+            last_id = submission_ids[-1]
+            archived += SubmissionTestCaseArchive.archive(submission_ids)
+
+            print('Archived test cases of %d submissions, up to id %d' % (archived, last_id))
+            if options['sleep']:
+                time.sleep(options['sleep'])
@@ -1,43 +1,27 @@
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db.models import ExpressionWrapper, FloatField, Sum
 from django.utils import timezone
 
-from judge.models import Organization, Submission
+from judge.models import Organization, Submission, SubmissionTestCaseArchive
 
 
 class Command(BaseCommand):
     help = 'backfill current credit usage for all organizations'
 
     def backfill_current_credit(self, org: Organization, month_start):
-        credit_problem = (
-            Submission.objects.filter(
-                problem__organizations=org,
-                contest_object__isnull=True,
-                date__gte=month_start,
-            )
-            .annotate(
-                credit=ExpressionWrapper(
-                    Sum('test_cases__time'), output_field=FloatField(),
-                ),
-            )
-            .aggregate(Sum('credit'))['credit__sum'] or 0
-        )
-
-        credit_contest = (
-            Submission.objects.filter(
-                contest_object__organizations=org,
-                date__gte=month_start,
-            )
-            .annotate(
-                credit=ExpressionWrapper(
-                    Sum('test_cases__time'), output_field=FloatField(),
-                ),
-            )
-            .aggregate(Sum('credit'))['credit__sum'] or 0
-        )
+        credit_problem = SubmissionTestCaseArchive.total_time(Submission.objects.filter(
+            problem__organizations=org,
+            contest_object__isnull=True,
+            date__gte=month_start,
+        ))
+
+        credit_contest = SubmissionTestCaseArchive.total_time(Submission.objects.filter(
+            contest_object__organizations=org,
+            date__gte=month_start,
+        ))
 
         org.free_credit = settings.VNOJ_MONTHLY_FREE_CREDIT
+        org.save(update_fields=['free_credit'])
 
         org.consume_credit(credit_problem + credit_contest)
 
@@ -2,44 +2,27 @@ import datetime
 
 import dateutil.relativedelta
 from django.core.management.base import BaseCommand
-from django.db.models import ExpressionWrapper, FloatField, Sum
 from django.utils import timezone
 
-from judge.models import Organization, OrganizationMonthlyUsage, Submission
+from judge.models import Organization, OrganizationMonthlyUsage, Submission, SubmissionTestCaseArchive
 
 
 class Command(BaseCommand):
     help = 'backfill monthly credit usage for all organizations'
 
     def backfill_credit(self, org, month_start, next_month_start):
-        credit_problem = (
-            Submission.objects.filter(
-                problem__organizations=org,
-                contest_object__isnull=True,
-                date__gte=month_start,
-                date__lt=next_month_start,
-            )
-            .annotate(
-                credit=ExpressionWrapper(
-                    Sum('test_cases__time'), output_field=FloatField(),
-                ),
-            )
-            .aggregate(Sum('credit'))['credit__sum'] or 0
-        )
-
-        credit_contest = (
-            Submission.objects.filter(
-                contest_object__organizations=org,
-                date__gte=month_start,
-                date__lt=next_month_start,
-            )
-            .annotate(
-                credit=ExpressionWrapper(
-                    Sum('test_cases__time'), output_field=FloatField(),
-                ),
-            )
-            .aggregate(Sum('credit'))['credit__sum'] or 0
-        )
+        credit_problem = SubmissionTestCaseArchive.total_time(Submission.objects.filter(
+            problem__organizations=org,
+            contest_object__isnull=True,
+            date__gte=month_start,
+            date__lt=next_month_start,
+        ))
+
+        credit_contest = SubmissionTestCaseArchive.total_time(Submission.objects.filter(
+            contest_object__organizations=org,
+            date__gte=month_start,
+            date__lt=next_month_start,
+        ))
 
         usage, created = OrganizationMonthlyUsage.objects.get_or_create(
             organization=org,
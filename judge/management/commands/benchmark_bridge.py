@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import resource
+import socket
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from judge.bridge.load_generator import LoadRecorder, SimulatedJudge, SubmissionClient, percentile
+from judge.models import Judge, Language, Problem, ProblemGroup, Profile, Submission, SubmissionSource
+
+BENCHMARK_LANGUAGE = 'BENCH'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _run_bridge(server_mode, query_count):
+    from judge.bridge.daemon import judge_daemon
+
+    def count_queries(execute, sql, params, many, context):
+        with query_count.get_lock():
+            query_count.value += 1
+        return execute(sql, params, many, context)
+
+    def on_connection_created(sender, connection, **kwargs):
+        connection.execute_wrappers.append(count_queries)
+
+    connection_created.connect(on_connection_created, weak=False)
+    judge_daemon(server_mode=server_mode)
+
+
+class Command(BaseCommand):
+    help = 'benchmark the bridge end to end with simulated judges and submissions, against a test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--judges', type=int, default=4, help='number of simulated judges')
+        parser.add_argument('--clients', type=int, default=4, help='number of concurrent submitting clients')
+        parser.add_argument('--submissions', type=int, default=200, help='number of submissions to judge')
+        parser.add_argument('--problems', type=int, default=100, help='number of problems supported by the judges')
+        parser.add_argument('--test-cases', type=int, default=5, help='number of test cases per submission')
+        parser.add_argument('--case-time', type=float, default=0.0, help='seconds taken by each test case')
+        parser.add_argument('--users', type=int, default=10, help='number of users submitting')
+        parser.add_argument('--flood', type=float, default=0,
+                            help='fraction of the submissions sent first by a single flooding user')
+        parser.add_argument('--fair-queue', action='store_true', default=False,
+                            help='share judges fairly between users (BRIDGED_FAIR_QUEUE)')
+        parser.add_argument('--server-mode', choices=['threading', 'asyncio'], default=None,
+                            help='bridge server mode (default: BRIDGED_SERVER_MODE)')
+        parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for all submissions')
+        parser.add_argument('--keepdb', action='store_true', default=False,
+                            help='keep the test database between runs')
+
+    def handle(self, *args, **options):
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        temporary = None
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # The bridge runs in another process, so the default in-memory test database cannot be used.
+            temporary = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+            test_settings['NAME'] = temporary.name
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            if temporary is not None:
+                os.unlink(temporary.name)
+
+    def create_fixtures(self, options):
+        language, _ = Language.objects.get_or_create(key=BENCHMARK_LANGUAGE, defaults={
+            'name': 'Benchmark', 'short_name': 'Benchmark', 'common_name': 'Benchmark', 'ace': 'text',
+            'pygments': 'text', 'extension': 'txt',
+        })
+        profiles = [self.create_profile('bridge_benchmark%d' % i, language) for i in range(options['users'])]
+        flood_profile = self.create_profile('bridge_benchmark_flood', language)
+        group, _ = ProblemGroup.objects.get_or_create(name='benchmark', defaults={'full_name': 'Benchmark'})
+
+        codes = ['bench%d' % i for i in range(options['problems'])]
+        Problem.objects.bulk_create([
+            Problem(code=code, name=code, description='', time_limit=1, memory_limit=65536, points=1, group=group)
+            for code in codes
+        ], ignore_conflicts=True)
+        problems = dict(Problem.objects.filter(code__in=codes).values_list('id', 'code'))
+
+        judges = []
+        for i in range(options['judges']):
+            judge, _ = Judge.objects.update_or_create(name='bench%d' % i, defaults={'auth_key': 'bench%d' % i})
+            judges.append(judge)
+
+        pending = []
+        flood_ids = set()
+        problem_ids = list(problems)
+        flood = int(options['submissions'] * options['flood'])
+        for i in range(options['submissions']):
+            # The flooding user sends all its submissions first.
+            profile = flood_profile if i < flood else profiles[i % len(profiles)]
+            submission = Submission.objects.create(user=profile, problem_id=problem_ids[i % len(problem_ids)],
+                                                   language=language)
+            SubmissionSource.objects.create(submission=submission, source='print(1)')
+            pending.append((submission.id, problems[submission.problem_id], language.key, 'print(1)'))
+            if profile == flood_profile:
+                flood_ids.add(submission.id)
+        # Submissions are popped from the end.
+        pending.reverse()
+        return codes, judges, pending, flood_ids
+
+    def create_profile(self, username, language):
+        user, _ = User.objects.get_or_create(username=username)
+        profile, _ = Profile.objects.get_or_create(user=user, defaults={'language': language})
+        return profile
+
+    def run_benchmark(self, options):
+        codes, judges, pending, flood_ids = self.create_fixtures(options)
+        total = len(pending)
+        ids = [id for id, *_ in pending]
+
+        judge_address = ('127.0.0.1', _free_port())
+        django_address = ('127.0.0.1', _free_port())
+        settings.BRIDGED_JUDGE_ADDRESS = [judge_address]
+        settings.BRIDGED_DJANGO_ADDRESS = [django_address]
+        settings.BRIDGED_DJANGO_CONNECT = django_address
+        settings.BRIDGED_FAIR_QUEUE = options['fair_queue']
+
+        # The bridge is forked, so that its CPU usage and queries are measured apart from the simulated clients.
+        query_count = multiprocessing.Value('q', 0)
+        connections.close_all()
+        cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        bridge = multiprocessing.get_context('fork').Process(target=_run_bridge,
+                                                             args=(options['server_mode'], query_count))
+        bridge.start()
+
+        try:
+            self.wait_for_port(judge_address)
+            self.wait_for_port(django_address)
+
+            recorder = LoadRecorder()
+            simulated = [
+                SimulatedJudge(judge_address, judge.name, judge.auth_key, codes, [BENCHMARK_LANGUAGE],
+                               options['test_cases'], options['case_time'], recorder.on_dispatch, recorder.on_graded)
+                for judge in judges
+            ]
+            for judge in simulated:
+                judge.start()
+            for judge in simulated:
+                if not judge.authenticated.wait(30):
+                    raise RuntimeError('judge %s failed to connect' % judge.name)
+            # Let the bridge finish synchronizing the problems and runtimes of the judges.
+            time.sleep(1)
+
+            queries_before = query_count.value
+            start = time.perf_counter()
+            clients = [SubmissionClient(pending, recorder.on_submit) for _ in range(options['clients'])]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+
+            done = self.wait_for_submissions(ids, options['timeout'])
+            elapsed = time.perf_counter() - start
+            queries = query_count.value - queries_before
+        finally:
+            bridge.terminate()
+            bridge.join()
+        cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+
+        self.stdout.write('Judged %d/%d submissions in %.2fs: %.1f submissions/s' % (
+            done, total, elapsed, done / elapsed))
+        self.write_latencies('Dispatch latency', recorder.dispatch_latencies())
+        if flood_ids:
+            self.write_latencies('Dispatch latency, flooding user', recorder.dispatch_latencies(flood_ids))
+            self.write_latencies('Dispatch latency, other users',
+                                 recorder.dispatch_latencies(set(ids) - flood_ids))
+        self.stdout.write('Bridge database queries: %.1f per submission' % (queries / max(total, 1)))
+        self.stdout.write('Bridge CPU time: %.2fs in total, including startup, %.2fms per submission' % (
+            cpu, cpu / max(total, 1) * 1000))
+        errors = sum(client.errors for client in clients)
+        if errors:
+            self.stderr.write('%d submission requests were rejected by the bridge' % errors)
+
+    def write_latencies(self, title, latencies):
+        self.stdout.write('%s: p50 %.2fms, p90 %.2fms, p99 %.2fms, max %.2fms' % ((title,) + tuple(
+            percentile(latencies, q) * 1000 for q in (0.5, 0.9, 0.99, 1))))
+
+    def wait_for_port(self, address, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(address).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def wait_for_submissions(self, ids, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            done = Submission.objects.filter(id__in=ids, status='D').count()
+            if done == len(ids) or time.monotonic() > deadline:
+                return done
+            time.sleep(0.1)
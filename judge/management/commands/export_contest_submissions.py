@@ -2,7 +2,7 @@ import os
 
 from django.core.management.base import BaseCommand, CommandError
 
-from judge.models import Contest, ContestParticipation
+from judge.models import Contest, ContestParticipation, SubmissionSource
 
 
 class Command(BaseCommand):
@@ -40,12 +40,13 @@ class Command(BaseCommand):
             os.makedirs(user_dir)
 
             problems = set()
-            submissions = user.submissions.order_by('-id') \
-                .select_related('problem__problem', 'submission__source', 'submission__language') \
-                .values_list('problem__problem__code', 'submission__source__source',
-                             'submission__language__extension', 'submission__id')
+            submissions = list(user.submissions.order_by('-id')
+                               .values_list('problem__problem__code', 'submission__language__extension',
+                                            'submission__id'))
+            sources = SubmissionSource.get_sources([sub_id for problem, ext, sub_id in submissions])
 
-            for problem, source, ext, sub_id in submissions:
+            for problem, ext, sub_id in submissions:
+                source = sources.get(sub_id, '')
                 submission_count += 1
 
                 if problem not in problems:  # Last submission
@@ -2,7 +2,7 @@ import csv
 
 from django.core.management.base import BaseCommand, CommandError
 
-from judge.models import Contest, Submission, SubmissionTestCase
+from judge.models import Contest, Submission
 from judge.utils.raw_sql import use_straight_join
 from judge.views.submission import submission_related
 
@@ -36,7 +36,7 @@ class Command(BaseCommand):
         writer.writeheader()
 
         for submission in queryset:
-            testcases = SubmissionTestCase.objects.filter(submission=submission)
+            testcases = submission.get_test_cases()
 
             for testcase in testcases:
                 case_id = f'case{testcase.case}'
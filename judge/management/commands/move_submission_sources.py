@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from judge.models import SubmissionSource
+from judge.utils.source_storage import store_sources
+
+
+class Command(BaseCommand):
+    help = 'move inline submission sources into the source storage, compressed and deduplicated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='number of sources moved at a time')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='seconds to wait between batches, to limit the load on the database')
+
+    def handle(self, *args, **options):
+        if not settings.VNOJ_SOURCE_STORAGE:
+            raise CommandError('VNOJ_SOURCE_STORAGE is not set')
+
+        batch_size = options['batch_size']
+        last_id = 0
+        moved = blob_count = inline_bytes = stored_bytes = 0
+
+        while True:
+            rows = list(SubmissionSource.objects.filter(id__gt=last_id, source_hash='').order_by('id')
+                        .values_list('id', 'inline_source')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            rows = [(source_id, source) for source_id, source in rows if source]
+
+            hashes, blobs = store_sources([source for source_id, source in rows])
+            for (source_id, source), hash in zip(rows, hashes):
+                # A source edited since it was read is left for the next run.
+                moved += SubmissionSource.objects.filter(id=source_id, source_hash='', inline_source=source) \
+                    .update(inline_source='', source_hash=hash)
+                inline_bytes += len(source.encode('utf-8'))
+            blob_count += len(blobs)
+            stored_bytes += sum(len(blob) for blob in blobs.values())
+
+            print('Moved %d sources, up to id %d' % (moved, last_id))
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        print('Moved %d sources of %d bytes into %d new blobs of %d bytes (%.1f%% saved)' % (
+            moved, inline_bytes, blob_count, stored_bytes,
+            100 * (1 - stored_bytes / inline_bytes) if inline_bytes else 0,
+        ))
@@ -9,6 +9,9 @@ class Command(BaseCommand):
                             help='if specified, run a monitor to automatically update problems')
         parser.add_argument('--problem-storage-globs', nargs='*', default=[],
                             help='globs to monitor for problem updates')
+        parser.add_argument('--server-mode', choices=['threading', 'asyncio'], default=None,
+                            help='serve connections with a thread each, or all on one event loop '
+                                 '(default: BRIDGED_SERVER_MODE)')
 
     def handle(self, *args, **options):
-        judge_daemon(options['monitor'], options['problem_storage_globs'])
+        judge_daemon(options['monitor'], options['problem_storage_globs'], options['server_mode'])
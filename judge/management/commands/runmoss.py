@@ -2,7 +2,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from moss import *
 
-from judge.models import Contest, ContestParticipation, Submission
+from judge.models import Contest, ContestParticipation, Submission, SubmissionSource
 
 
 class Command(BaseCommand):
@@ -35,7 +35,7 @@ class Command(BaseCommand):
                     contest__participation__contest__key=contest,
                     result='AC', problem__id=problem.id,
                     language__common_name=dmoj_lang,
-                ).values_list('user__user__username', 'source__source')
+                ).values_list('user__user__username', 'id')
                 if not subs:
                     print('<no submissions>')
                     continue
@@ -43,12 +43,13 @@ class Command(BaseCommand):
                 moss_call = MOSS(moss_api_key, language=moss_lang, matching_file_limit=100,
                                  comment='%s - %s' % (contest, problem.code))
 
-                users = set()
+                best = {}
+                for username, sub_id in subs:
+                    best.setdefault(username, sub_id)
 
-                for username, source in subs:
-                    if username in users:
-                        continue
-                    users.add(username)
-                    moss_call.add_file_from_memory(username, source.encode('utf-8'))
+                sources = SubmissionSource.get_sources(best.values())
+                for username, sub_id in best.items():
+                    if sub_id in sources:
+                        moss_call.add_file_from_memory(username, sources[sub_id].encode('utf-8'))
 
                 print('(%d): %s' % (subs.count(), moss_call.process()))
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0212_rename_credit_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestSimilarity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=20)),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity', to='judge.contest', verbose_name='contest')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity', to='judge.problem', verbose_name='problem')),
+            ],
+            options={
+                'verbose_name': 'contest similarity result',
+                'verbose_name_plural': 'contest similarity results',
+                'unique_together': {('contest', 'problem', 'language')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ContestSimilarityPair',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField(verbose_name='similarity')),
+                ('first', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='judge.submission', verbose_name='first submission')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pairs', to='judge.contestsimilarity', verbose_name='similarity result')),
+                ('second', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='judge.submission', verbose_name='second submission')),
+            ],
+            options={
+                'verbose_name': 'contest similarity pair',
+                'verbose_name_plural': 'contest similarity pairs',
+                'ordering': ['-similarity'],
+            },
+        ),
+    ]
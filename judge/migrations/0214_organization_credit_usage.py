@@ -0,0 +1,36 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0213_contest_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationCreditUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='time')),
+                ('consumed_credit', models.FloatField(verbose_name='consumed credit')),
+                ('rolled_up', models.BooleanField(default=False, verbose_name='rolled up')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_usages', to='judge.organization', verbose_name='organization')),
+                ('submission', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='judge.submission', verbose_name='submission')),
+            ],
+            options={
+                'verbose_name': 'organization credit usage',
+                'verbose_name_plural': 'organization credit usages',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='organizationcreditusage',
+            index=models.Index(fields=['organization', 'rolled_up'], name='judge_organ_organiz_aaa9dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationcreditusage',
+            index=models.Index(fields=['rolled_up', 'time'], name='judge_organ_rolled__ebe16b_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0214_organization_credit_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='source hash')),
+                ('data', models.BinaryField(verbose_name='compressed source')),
+            ],
+            options={
+                'verbose_name': 'source blob',
+                'verbose_name_plural': 'source blobs',
+            },
+        ),
+        # The column keeps its name, so only the state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='submissionsource',
+                    old_name='source',
+                    new_name='inline_source',
+                ),
+                migrations.AlterField(
+                    model_name='submissionsource',
+                    name='inline_source',
+                    field=models.TextField(blank=True, db_column='source', max_length=65536, verbose_name='source code'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submissionsource',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='source hash'),
+        ),
+    ]
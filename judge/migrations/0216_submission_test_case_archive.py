@@ -0,0 +1,23 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0215_source_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionTestCaseArchive',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='test_case_archive', serialize=False, to='judge.submission', verbose_name='associated submission')),
+                ('data', models.BinaryField(verbose_name='packed test cases')),
+            ],
+            options={
+                'verbose_name': 'submission test case archive',
+                'verbose_name_plural': 'submission test case archives',
+            },
+        ),
+    ]
@@ -3,16 +3,17 @@ from reversion import revisions
 from judge.models.choices import ACE_THEMES, EFFECTIVE_MATH_ENGINES, MATH_ENGINES_CHOICES, TIMEZONE
 from judge.models.comment import Comment, CommentLock, CommentVote
 from judge.models.contest import Contest, ContestAnnouncement, ContestMoss, ContestParticipation, ContestProblem, \
-    ContestSubmission, ContestTag, Rating
+    ContestSimilarity, ContestSimilarityPair, ContestSubmission, ContestTag, Rating
 from judge.models.interface import BlogPost, BlogVote, MiscConfig, NavigationBar, validate_regex
 from judge.models.problem import LanguageLimit, License, Problem, ProblemClarification, ProblemGroup, \
     ProblemTranslation, ProblemType, Solution, SubmissionSourceAccess, TranslatedProblemQuerySet
 from judge.models.problem_data import CHECKERS, ProblemData, ProblemTestCase, problem_data_storage, \
     problem_directory_file
-from judge.models.profile import Badge, Organization, OrganizationMonthlyUsage, OrganizationRequest, \
-    Profile, WebAuthnCredential
+from judge.models.profile import Badge, Organization, OrganizationCreditUsage, OrganizationMonthlyUsage, \
+    OrganizationRequest, Profile, WebAuthnCredential
 from judge.models.runtime import Judge, Language, RuntimeVersion
-from judge.models.submission import SUBMISSION_RESULT, Submission, SubmissionSource, SubmissionTestCase
+from judge.models.submission import SUBMISSION_RESULT, SourceBlob, Submission, SubmissionSource, \
+    SubmissionTestCase, SubmissionTestCaseArchive
 from judge.models.tag import Tag, TagData, TagGroup, TagProblem
 from judge.models.ticket import GeneralIssue, Ticket, TicketMessage
 
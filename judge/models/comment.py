@@ -1,12 +1,12 @@
-import itertools
+from collections import defaultdict
 
-from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import CASCADE
+from django.db import IntegrityError, models, transaction
+from django.db.models import CASCADE, F
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from mptt.fields import TreeForeignKey
@@ -17,13 +17,198 @@ from judge.models.interface import BlogPost
 from judge.models.problem import Problem, Solution
 from judge.models.profile import Profile
 from judge.models.tag import TagProblem
-from judge.utils.cachedict import CacheDict
 
 __all__ = ['Comment', 'CommentLock', 'CommentVote']
 
 comment_validator = RegexValidator(r'^\w+:[a-z0-9A-Z_]+$',
                                    _(r'Page code must be ^\w+:[a-z0-9A-Z_]+$'))
 
+# How long whether a comment page is public is cached, in seconds.
+PUBLIC_PAGE_CACHE_TIMEOUT = 300
+
+
+def public_page_cache_key(page):
+    return 'comment_page_public:%s' % page
+
+
+class CommentPageResolver:
+    """
+    Finds which comment pages a viewer can see, and their titles, for many pages at once.
+
+    The targets of each kind of page are fetched with one query. Whether a target is public is decided from the
+    fetched fields and cached for all viewers, so only the targets that are not public need a set-based visibility
+    query, and only for authenticated viewers.
+    """
+
+    def __init__(self, viewer):
+        self.viewer = viewer
+        self.profile = viewer.profile if viewer.is_authenticated else None
+        # page: title, or None for pages without one; missing for pages the viewer cannot see.
+        self.titles = {}
+        self.seen = set()
+
+    @cached_property
+    def current_contest(self):
+        if self.profile is None:
+            return None
+        participation = self.profile.current_contest
+        return participation.contest if participation is not None else None
+
+    @cached_property
+    def hides_problems(self):
+        # Problems cannot be accessed while in a contest that has not started yet.
+        contest = self.current_contest
+        return contest is not None and not contest.can_join
+
+    def visible_problems(self, codes):
+        """Returns the codes among `codes` of the problems the viewer can see."""
+        if not codes or self.profile is None or self.hides_problems:
+            return set()
+        visible = set(Problem.get_visible_problems(self.viewer).filter(code__in=codes)
+                      .values_list('code', flat=True))
+        if self.current_contest is not None:
+            visible.update(self.current_contest.contest_problems.filter(problem__code__in=codes)
+                           .values_list('problem__code', flat=True))
+        return visible
+
+    def resolve(self, pages):
+        """Returns the titles of all the visible pages resolved so far, including those among `pages`."""
+        pending = set(pages) - self.seen
+        if not pending:
+            return self.titles
+        self.seen.update(pending)
+
+        cached = cache.get_many([public_page_cache_key(page) for page in pending])
+        by_kind = defaultdict(set)
+        for page in pending:
+            kind, key = page[:2], page[2:]
+            if kind not in self.resolvers:
+                self.titles[page] = None
+                continue
+            if kind in ('p:', 's:') and self.hides_problems:
+                continue
+            # Either the title of a public page, or False for a page that is not public or does not exist.
+            public = cached.get(public_page_cache_key(page))
+            if public:
+                self.titles[page] = self.format_title(kind, public)
+            elif public is None or self.profile is not None:
+                by_kind[kind].add(key)
+
+        for kind, keys in by_kind.items():
+            public, private = self.resolvers[kind](self, keys)
+            cache.set_many({public_page_cache_key(kind + key): public.get(key, False) for key in keys},
+                           PUBLIC_PAGE_CACHE_TIMEOUT)
+            for titles in (public, private):
+                for key, title in titles.items():
+                    self.titles[kind + key] = self.format_title(kind, title)
+        return self.titles
+
+    @staticmethod
+    def format_title(kind, title):
+        if kind == 's:':
+            return _('Editorial for %s') % title
+        return title
+
+    # Each of the following returns the titles of the public targets among `keys`, and those of the other targets
+    # the viewer can see.
+
+    def resolve_problems(self, codes):
+        public, private = {}, {}
+        for code, name, is_public, is_organization_private in (
+            Problem.objects.filter(code__in=codes)
+                           .values_list('code', 'name', 'is_public', 'is_organization_private')
+        ):
+            if is_public and not is_organization_private:
+                public[code] = name
+            else:
+                private[code] = name
+        visible = self.visible_problems(private.keys())
+        return public, {code: name for code, name in private.items() if code in visible}
+
+    def resolve_solutions(self, codes):
+        now = timezone.now()
+        public, private, published = {}, {}, set()
+        for code, name, is_public, publish_on, problem_public, problem_organization_private in (
+            Solution.objects.filter(problem__code__in=codes)
+                            .values_list('problem__code', 'problem__name', 'is_public', 'publish_on',
+                                         'problem__is_public', 'problem__is_organization_private')
+        ):
+            solution_public = is_public and publish_on < now
+            if solution_public and problem_public and not problem_organization_private:
+                public[code] = name
+            else:
+                private[code] = name
+                if solution_public:
+                    published.add(code)
+        if not private or self.profile is None:
+            return public, {}
+
+        visible = self.visible_problems(private.keys())
+        if not self.viewer.has_perm('judge.see_private_solution'):
+            editable = set(Problem.get_editable_problems(self.viewer).filter(code__in=visible - published)
+                           .values_list('code', flat=True))
+            visible = {code for code in visible if code in published or code in editable}
+        return public, {code: name for code, name in private.items() if code in visible}
+
+    def resolve_contests(self, keys):
+        public, private = {}, {}
+        for key, name, is_visible, is_private, is_organization_private in (
+            Contest.objects.filter(key__in=keys)
+                           .values_list('key', 'name', 'is_visible', 'is_private', 'is_organization_private')
+        ):
+            if is_visible and not is_private and not is_organization_private:
+                public[key] = name
+            else:
+                private[key] = name
+        if not private or self.profile is None:
+            return public, {}
+
+        visible = set(Contest.get_visible_contests(self.viewer).filter(key__in=private.keys())
+                      .values_list('key', flat=True))
+        return public, {key: name for key, name in private.items() if key in visible}
+
+    def resolve_blog_posts(self, ids):
+        now = timezone.now()
+        public, private, organizations, published = {}, {}, {}, set()
+        ids = [int(id) for id in ids if id.isdigit()]
+        for id, title, visible, publish_on, organization_id in (
+            BlogPost.objects.filter(id__in=ids).values_list('id', 'title', 'visible', 'publish_on', 'organization_id')
+        ):
+            if visible and publish_on <= now:
+                if organization_id is None:
+                    public[str(id)] = title
+                    continue
+                published.add(id)
+            private[id] = title
+            organizations[id] = organization_id
+        if not private or self.profile is None:
+            return public, {}
+
+        if self.viewer.has_perm('judge.edit_all_post'):
+            return public, {str(id): title for id, title in private.items()}
+
+        member_of = set(self.profile.organizations.values_list('id', flat=True))
+        visible = {id for id in published if organizations[id] in member_of}
+        authored = BlogPost.authors.through.objects.filter(blogpost_id__in=private.keys() - visible,
+                                                           profile=self.profile).values_list('blogpost_id', flat=True)
+        if self.viewer.has_perm('judge.edit_organization_post'):
+            admin_of = set(self.profile.admin_of.values_list('id', flat=True))
+        else:
+            admin_of = set()
+        visible.update(id for id in authored if organizations[id] is None or organizations[id] in admin_of)
+        return public, {str(id): title for id, title in private.items() if id in visible}
+
+    def resolve_tags(self, codes):
+        return dict(TagProblem.objects.filter(code__in=codes).values_list('code', 'name')), {}
+
+    resolvers = {
+        'p:': resolve_problems,
+        's:': resolve_solutions,
+        'c:': resolve_contests,
+        'b:': resolve_blog_posts,
+        't:': resolve_tags,
+    }
+
 
 class Comment(MPTTModel):
     author = models.ForeignKey(Profile, verbose_name=_('commenter'), on_delete=CASCADE)
@@ -48,9 +233,28 @@ class Comment(MPTTModel):
         order_insertion_by = ['-time']
 
     def vote(self, delta):
+        from judge.tasks import schedule_contribution_update
+        Comment.objects.filter(id=self.id).update(score=F('score') + delta)
         self.score += delta
-        self.save(update_fields=['score'])
-        self.author.update_contribution_points(delta * settings.VNOJ_CP_COMMENT)
+        schedule_contribution_update([self.author_id])
+
+    vote.alters_data = True
+
+    def cast_vote(self, voter, delta):
+        """Records the vote of `voter` on this comment. Returns False if they have already voted on it."""
+        try:
+            with transaction.atomic():
+                # The score is updated first, taking the exclusive lock on the row before inserting the vote takes a
+                # shared one through the foreign key. The other way round, concurrent voters deadlock on upgrading it.
+                self.vote(delta)
+                CommentVote.objects.create(comment=self, voter=voter, score=delta)
+        except IntegrityError:
+            # The update of the score was rolled back.
+            self.score -= delta
+            return False
+        return True
+
+    cast_vote.alters_data = True
 
     @classmethod
     def get_newest_visible_comments(cls, viewer, author=None, n=None, batch=None):
@@ -62,52 +266,28 @@ class Comment(MPTTModel):
         queryset = (queryset.prefetch_related('author__user', 'author__display_badge')
                     .defer('author__about', 'body').order_by('-id'))
 
-        problem_cache = CacheDict(lambda code: Problem.objects.defer('description', 'summary').get(code=code))
-        solution_cache = CacheDict(lambda code: Solution.objects.defer('content').get(problem__code=code))
-        contest_cache = CacheDict(lambda key: Contest.objects.defer('description').get(key=key))
-        blog_cache = CacheDict(lambda id: BlogPost.objects.defer('summary', 'content').get(id=id))
-        problemtag_cache = CacheDict(lambda code: TagProblem.objects.get(code=code))
-
-        problem_access = CacheDict(lambda code: problem_cache[code].is_accessible_by(viewer))
-        solution_access = CacheDict(lambda code: problem_access[code] and solution_cache[code].is_accessible_by(viewer))
-        contest_access = CacheDict(lambda key: contest_cache[key].is_accessible_by(viewer))
-        blog_access = CacheDict(lambda id: blog_cache[id].can_see(viewer))
-
         if batch is None:
             batch = 2 * n
 
+        resolver = CommentPageResolver(viewer)
         output = []
-        for i in itertools.count(0):
-            slice = queryset[i * batch:i * batch + batch]
+        offset = 0
+        while True:
+            slice = queryset[offset:offset + batch]
             if not slice:
                 break
+            offset += batch
+            titles = resolver.resolve(comment.page for comment in slice)
             for comment in slice:
-                page_key = comment.page[2:]
-                try:
-                    if comment.page.startswith('p:'):
-                        has_access = problem_access[page_key]
-                        comment.page_title = problem_cache[page_key].name
-                    elif comment.page.startswith('s:'):
-                        has_access = solution_access[page_key]
-                        comment.page_title = _('Editorial for %s') % problem_cache[page_key].name
-                    elif comment.page.startswith('c:'):
-                        has_access = contest_access[page_key]
-                        comment.page_title = contest_cache[page_key].name
-                    elif comment.page.startswith('b:'):
-                        has_access = blog_access[page_key]
-                        comment.page_title = blog_cache[page_key].title
-                    elif comment.page.startswith('t:'):
-                        has_access = True
-                        comment.page_title = problemtag_cache[page_key].name
-                    else:
-                        has_access = True
-                except ObjectDoesNotExist:
-                    pass
-                else:
-                    if has_access:
-                        output.append(comment)
+                if comment.page not in titles:
+                    continue
+                if titles[comment.page] is not None:
+                    comment.page_title = titles[comment.page]
+                output.append(comment)
                 if n is not None and len(output) >= n:
                     return output
+            # Grow the slices when most comments are on pages the viewer cannot see.
+            batch = min(batch * 2, 1000)
         return output
 
     @classmethod
@@ -164,7 +344,9 @@ class Comment(MPTTModel):
             if self.page.startswith('p:'):
                 return Problem.objects.get(code=self.page[2:]).is_accessible_by(user)
             elif self.page.startswith('s:'):
-                return Solution.objects.get(problem__code=self.page[2:]).is_accessible_by(user)
+                # The editorial is shown on the page of its problem, which must be visible too.
+                solution = Solution.objects.select_related('problem').get(problem__code=self.page[2:])
+                return solution.problem.is_accessible_by(user) and solution.is_accessible_by(user)
             elif self.page.startswith('c:'):
                 return Contest.objects.get(key=self.page[2:]).is_accessible_by(user)
             elif self.page.startswith('b:'):
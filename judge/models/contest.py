@@ -16,6 +16,7 @@ from lupa import LuaRuntime
 from moss import MOSS_LANG_C, MOSS_LANG_CC, MOSS_LANG_JAVA, MOSS_LANG_PASCAL, MOSS_LANG_PYTHON
 
 from judge import contest_format, event_poster as event
+from judge.contest_format.solves import update_solve_summaries
 from judge.models.problem import Problem
 from judge.models.profile import Organization, Profile
 from judge.models.submission import Submission
@@ -583,7 +584,9 @@ class ContestParticipation(models.Model):
 
     def recompute_results(self):
         with transaction.atomic():
+            old_format_data = self.format_data
             self.contest.format.update_participation(self)
+            update_solve_summaries(self, old_format_data)
             if self.is_disqualified:
                 self.score = -9999
                 self.cumtime = 0
@@ -764,3 +767,28 @@ class ContestMoss(models.Model):
         unique_together = ('contest', 'problem', 'language')
         verbose_name = _('contest moss result')
         verbose_name_plural = _('contest moss results')
+
+
+class ContestSimilarity(models.Model):
+    contest = models.ForeignKey(Contest, verbose_name=_('contest'), related_name='similarity', on_delete=CASCADE)
+    problem = models.ForeignKey(Problem, verbose_name=_('problem'), related_name='similarity', on_delete=CASCADE)
+    language = models.CharField(max_length=20)
+    submission_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('contest', 'problem', 'language')
+        verbose_name = _('contest similarity result')
+        verbose_name_plural = _('contest similarity results')
+
+
+class ContestSimilarityPair(models.Model):
+    result = models.ForeignKey(ContestSimilarity, verbose_name=_('similarity result'), related_name='pairs',
+                               on_delete=CASCADE)
+    first = models.ForeignKey(Submission, verbose_name=_('first submission'), related_name='+', on_delete=CASCADE)
+    second = models.ForeignKey(Submission, verbose_name=_('second submission'), related_name='+', on_delete=CASCADE)
+    similarity = models.FloatField(verbose_name=_('similarity'))
+
+    class Meta:
+        ordering = ['-similarity']
+        verbose_name = _('contest similarity pair')
+        verbose_name_plural = _('contest similarity pairs')
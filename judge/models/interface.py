@@ -1,9 +1,8 @@
 import re
 
-from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import CASCADE
+from django.db import IntegrityError, models, transaction
+from django.db.models import CASCADE, F
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -84,14 +83,31 @@ class BlogPost(models.Model):
         return self.title
 
     def vote(self, delta):
+        from judge.tasks import schedule_contribution_update
+        BlogPost.objects.filter(id=self.id).update(score=F('score') + delta)
         self.score += delta
-        self.save(update_fields=['score'])
 
         # Only update contributions for global and personal posts
-        if self.visible and self.organization is None:
-            for author in self.authors.all():
-                # Blog votes are counted as comment votes
-                author.update_contribution_points(delta * settings.VNOJ_CP_COMMENT)
+        if self.visible and self.organization_id is None:
+            schedule_contribution_update(self.authors.values_list('id', flat=True))
+
+    vote.alters_data = True
+
+    def cast_vote(self, voter, delta):
+        """Records the vote of `voter` on this post. Returns False if they have already voted on it."""
+        try:
+            with transaction.atomic():
+                # The score is updated first, taking the exclusive lock on the row before inserting the vote takes a
+                # shared one through the foreign key. The other way round, concurrent voters deadlock on upgrading it.
+                self.vote(delta)
+                BlogVote.objects.create(blog=self, voter=voter, score=delta)
+        except IntegrityError:
+            # The update of the score was rolled back.
+            self.score -= delta
+            return False
+        return True
+
+    cast_vote.alters_data = True
 
     def get_absolute_url(self):
         return reverse('blog_post', args=(self.id, self.slug))
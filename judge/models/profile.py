@@ -11,6 +11,7 @@ from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from django.db import models
 from django.db.models import F, Max, Sum
+from django.db.models.functions import Greatest
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes
@@ -27,7 +28,8 @@ from judge.ratings import rating_class
 from judge.utils.float_compare import float_compare_equal
 from judge.utils.two_factor import webauthn_decode
 
-__all__ = ['Organization', 'OrganizationMonthlyUsage', 'Profile', 'OrganizationRequest', 'WebAuthnCredential']
+__all__ = ['Organization', 'OrganizationCreditUsage', 'OrganizationMonthlyUsage', 'Profile', 'OrganizationRequest',
+           'WebAuthnCredential']
 
 
 class EncryptedNullCharField(EncryptedCharField):
@@ -122,21 +124,28 @@ class Organization(models.Model):
         return reverse('organization_users', args=[self.slug])
 
     def has_credit_left(self):
-        return self.paid_credit + self.free_credit > 0
+        # Usage not rolled up into the balance yet counts too, so that a busy organization cannot overdraw by the
+        # usage of a whole roll-up interval.
+        pending = self.credit_usages.filter(rolled_up=False).aggregate(sum=Sum('consumed_credit'))['sum'] or 0
+        return self.paid_credit + self.free_credit - pending > 0
 
     def consume_credit(self, consumed):
-        # reduce credit in free credit first
-        # then reduce the left to available credit
-        if self.free_credit >= consumed:
-            self.free_credit -= consumed
-        else:
-            consumed -= self.free_credit
-            self.free_credit = 0
-            # paid credit can be negative if we don't enable the monthly credit limitation
-            self.paid_credit -= consumed
+        Organization.consume_credits({self.id: consumed})
+
+    consume_credit.alters_data = True
 
-        self.current_consumed_credit += consumed
-        self.save(update_fields=['free_credit', 'paid_credit', 'current_consumed_credit'])
+    @classmethod
+    def consume_credits(cls, consumed_by_organization):
+        """Atomically takes the credit consumed by each organization id from its free credit, then its paid credit."""
+        for organization_id, consumed in consumed_by_organization.items():
+            consumed = float(consumed)
+            # paid_credit is assigned first, as MySQL evaluates assignments from left to right, and it needs the old
+            # free_credit. Paid credit can be negative if we don't enable the monthly credit limitation.
+            cls.objects.filter(id=organization_id).update(
+                paid_credit=F('paid_credit') - Greatest(consumed - F('free_credit'), 0.0),
+                free_credit=Greatest(F('free_credit') - consumed, 0.0),
+                current_consumed_credit=F('current_consumed_credit') + consumed,
+            )
 
     class Meta:
         ordering = ['name']
@@ -162,6 +171,28 @@ class OrganizationMonthlyUsage(models.Model):
         unique_together = ('organization', 'time')
 
 
+class OrganizationCreditUsage(models.Model):
+    """
+    An append-only ledger of the credit consumed by submissions, rolled up periodically into the balance of the
+    organization, so that grading never writes to the organization row itself.
+    """
+    organization = models.ForeignKey(Organization, verbose_name=_('organization'), related_name='credit_usages',
+                                     on_delete=models.CASCADE)
+    submission = models.ForeignKey('Submission', verbose_name=_('submission'), related_name='+', null=True,
+                                   on_delete=models.SET_NULL)
+    time = models.DateTimeField(verbose_name=_('time'), default=timezone.now, db_index=True)
+    consumed_credit = models.FloatField(verbose_name=_('consumed credit'))
+    rolled_up = models.BooleanField(verbose_name=_('rolled up'), default=False)
+
+    class Meta:
+        verbose_name = _('organization credit usage')
+        verbose_name_plural = _('organization credit usages')
+        indexes = [
+            models.Index(fields=['organization', 'rolled_up']),
+            models.Index(fields=['rolled_up', 'time']),
+        ]
+
+
 class Badge(models.Model):
     name = models.CharField(max_length=128, verbose_name=_('badge name'))
     mini = models.URLField(verbose_name=_('mini badge URL'), blank=True)
@@ -297,6 +328,7 @@ class Profile(models.Model):
 
     def calculate_points(self, table=_pp_table):
         from judge.models import Problem
+        from judge.tasks import schedule_rank_index_patch
         public_problems = Problem.get_public_problems()
         data = (
             public_problems.filter(submission__user=self, submission__points__isnull=False)
@@ -318,6 +350,7 @@ class Profile(models.Model):
             self.problem_count = problems
             self.performance_points = pp
             self.save(update_fields=['points', 'problem_count', 'performance_points'])
+            schedule_rank_index_patch(self.id, ('points', 'problem_count', 'performance_points'))
             for org in self.organizations.get_queryset():
                 org.calculate_points()
         return points
@@ -326,6 +359,7 @@ class Profile(models.Model):
 
     def calculate_contribution_points(self):
         from judge.models import BlogPost, Comment, Ticket
+        from judge.tasks import schedule_rank_index_patch
         old_pp = self.contribution_points
         # Because the aggregate function can return None
         # So we use `X or 0` to get 0 if X is None
@@ -343,6 +377,7 @@ class Profile(models.Model):
         if new_pp != old_pp:
             self.contribution_points = new_pp
             self.save(update_fields=['contribution_points'])
+            schedule_rank_index_patch(self.id, ('contribution_points',))
         return new_pp
 
     calculate_contribution_points.alters_data = True
@@ -1,9 +1,11 @@
 import hashlib
 import hmac
+from collections import defaultdict
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -12,13 +14,16 @@ from reversion import revisions
 
 from judge.judgeapi import abort_submission, judge_submission
 from judge.models.problem import Problem, SubmissionSourceAccess
-from judge.models.profile import Profile
+from judge.models.profile import OrganizationCreditUsage, Profile
 from judge.models.runtime import Language
+from judge.utils.source_storage import load_sources, store_sources
+from judge.utils.test_case_archive import pack_test_cases, unpack_test_case_times, unpack_test_cases
 from judge.utils.unicode import utf8bytes
 import logging
 logger = logging.getLogger(__name__)
 
-__all__ = ['SUBMISSION_RESULT', 'Submission', 'SubmissionSource', 'SubmissionTestCase']
+__all__ = ['SUBMISSION_RESULT', 'SourceBlob', 'Submission', 'SubmissionSource', 'SubmissionTestCase',
+           'SubmissionTestCaseArchive']
 
 SUBMISSION_RESULT = (
     ('AC', _('Accepted')),
@@ -199,7 +204,7 @@ class Submission(models.Model):
 
         organizations = []
         if problem.is_organization_private:
-            organizations = problem.organizations.all()
+            organizations = list(problem.organizations.values_list('id', flat=True))
 
         if len(organizations) == 0:
             contest_object = None
@@ -209,10 +214,14 @@ class Submission(models.Model):
                 pass
 
             if contest_object is not None and contest_object.is_organization_private:
-                organizations = contest_object.organizations.all()
+                organizations = list(contest_object.organizations.values_list('id', flat=True))
 
-        for organization in organizations:
-            organization.consume_credit(consumed_credit)
+        # Recorded in the ledger, and taken from the balance of the organizations by the periodic roll-up.
+        OrganizationCreditUsage.objects.bulk_create([
+            OrganizationCreditUsage(organization_id=organization, submission_id=self.id,
+                                    consumed_credit=consumed_credit)
+            for organization in organizations
+        ])
 
     update_credit.alters_data = True
 
@@ -220,6 +229,16 @@ class Submission(models.Model):
     def is_graded(self):
         return self.status not in ('QU', 'P', 'G')
 
+    def get_test_cases(self):
+        """Returns the test cases of the submission, from the archive if they were archived."""
+        cases = list(self.test_cases.all())
+        if cases or not self.is_graded:
+            return cases
+        try:
+            return self.test_case_archive.unpack()
+        except ObjectDoesNotExist:
+            return []
+
     @cached_property
     def contest_key(self):
         if hasattr(self, 'contest'):
@@ -289,14 +308,63 @@ class Submission(models.Model):
         ]
 
 
+class SourceBlob(models.Model):
+    hash = models.CharField(max_length=64, primary_key=True, verbose_name=_('source hash'))
+    data = models.BinaryField(verbose_name=_('compressed source'))
+
+    class Meta:
+        verbose_name = _('source blob')
+        verbose_name_plural = _('source blobs')
+
+
 class SubmissionSource(models.Model):
     submission = models.OneToOneField(Submission, on_delete=models.CASCADE, verbose_name=_('associated submission'),
                                       related_name='source')
-    source = models.TextField(verbose_name=_('source code'), max_length=65536)
+    # Sources are compressed into the source storage when saved, addressed by their hash, so that identical sources
+    # are stored once. Sources saved without a source storage, or before there was one, are kept inline.
+    inline_source = models.TextField(verbose_name=_('source code'), max_length=65536, blank=True, db_column='source')
+    source_hash = models.CharField(max_length=64, verbose_name=_('source hash'), blank=True, default='')
 
     def __str__(self):
         return _('Source of %(submission)s') % {'submission': self.submission}
 
+    @property
+    def source(self):
+        if not self.source_hash:
+            return self.inline_source
+        if '_source' not in self.__dict__:
+            source = load_sources([self.source_hash]).get(self.source_hash)
+            if source is None:
+                logger.error('Source %s of submission %d is missing from the source storage',
+                             self.source_hash, self.submission_id)
+                source = ''
+            self.__dict__['_source'] = source
+        return self.__dict__['_source']
+
+    @source.setter
+    def source(self, source):
+        self.inline_source = source
+        self.source_hash = ''
+        self.__dict__.pop('_source', None)
+
+    def save(self, *args, **kwargs):
+        if self.inline_source and settings.VNOJ_SOURCE_STORAGE:
+            self.source_hash = store_sources([self.inline_source])[0][0]
+            self.__dict__['_source'] = self.inline_source
+            self.inline_source = ''
+        super().save(*args, **kwargs)
+
+    save.alters_data = True
+
+    @classmethod
+    def get_sources(cls, submission_ids):
+        """Returns a dict of submission id: source, loading the stored sources in bulk."""
+        rows = list(cls.objects.filter(submission_id__in=submission_ids)
+                    .values_list('submission_id', 'inline_source', 'source_hash'))
+        stored = load_sources({source_hash for submission_id, inline_source, source_hash in rows if source_hash})
+        return {submission_id: stored.get(source_hash, '') if source_hash else inline_source
+                for submission_id, inline_source, source_hash in rows}
+
 
 @revisions.register()
 class SubmissionTestCase(models.Model):
@@ -329,3 +397,63 @@ class SubmissionTestCase(models.Model):
         unique_together = ('submission', 'case')
         verbose_name = _('submission test case')
         verbose_name_plural = _('submission test cases')
+
+
+class SubmissionTestCaseArchive(models.Model):
+    """
+    The test cases of an old submission, packed into one row by `archive` to keep the test case table small. The
+    submission status page reads them transparently through `Submission.get_test_cases`.
+    """
+    submission = models.OneToOneField(Submission, verbose_name=_('associated submission'), primary_key=True,
+                                      related_name='test_case_archive', on_delete=models.CASCADE)
+    data = models.BinaryField(verbose_name=_('packed test cases'))
+
+    def unpack(self):
+        # The case number stands in for the id, which is only used to link to the case on the status page.
+        return [SubmissionTestCase(id=fields['case'], submission_id=self.submission_id, **fields)
+                for fields in unpack_test_cases(self.data)]
+
+    @classmethod
+    def archive(cls, submission_ids):
+        """Moves the test cases of graded submissions into archives. Returns the number of submissions archived."""
+        with transaction.atomic():
+            # Locking the submissions keeps a rejudge from replacing their test cases while they are moved.
+            submission_ids = list(Submission.objects.filter(id__in=submission_ids)
+                                  .exclude(status__in=Submission.IN_PROGRESS_GRADING_STATUS)
+                                  .select_for_update().values_list('id', flat=True))
+            cases = defaultdict(list)
+            for case in SubmissionTestCase.objects.filter(submission_id__in=submission_ids).order_by('id'):
+                cases[case.submission_id].append(case)
+
+            # The test cases of a submission rejudged since it was last archived replace its old archive.
+            cls.objects.filter(submission_id__in=cases.keys()).delete()
+            cls.objects.bulk_create([cls(submission_id=submission_id, data=pack_test_cases(submission_cases))
+                                     for submission_id, submission_cases in cases.items()])
+            SubmissionTestCase.objects.filter(submission_id__in=cases.keys()).delete()
+        return len(cases)
+
+    @classmethod
+    def total_time(cls, submissions):
+        """Returns the total execution time of the test cases of `submissions`, a queryset, archived or not."""
+        total = SubmissionTestCase.objects.filter(submission__in=submissions).aggregate(time=Sum('time'))['time'] or 0
+        # As in `Submission.get_test_cases`, an archive is only read if the submission has no test cases left.
+        archives = cls.objects.filter(submission__in=submissions, submission__test_cases__isnull=True)
+        for data in archives.values_list('data', flat=True).iterator():
+            total += sum(time for time in unpack_test_case_times(data) if time is not None)
+        return total
+
+    @classmethod
+    def restore(cls, submission_ids):
+        """Moves archived test cases back into the test case table."""
+        with transaction.atomic():
+            archives = list(cls.objects.filter(submission_id__in=submission_ids).select_for_update())
+            SubmissionTestCase.objects.bulk_create([
+                SubmissionTestCase(submission_id=archive.submission_id, **fields)
+                for archive in archives for fields in unpack_test_cases(archive.data)
+            ])
+            cls.objects.filter(submission_id__in=[archive.submission_id for archive in archives]).delete()
+        return len(archives)
+
+    class Meta:
+        verbose_name = _('submission test case archive')
+        verbose_name_plural = _('submission test case archives')
@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from judge.models import Comment, CommentVote
+from judge.models.tests.util import CommonDataMixin, EagerCeleryMixin, create_blogpost, create_contest, \
+    create_problem, create_solution, create_user
+
+
+class CommentTestCase(EagerCeleryMixin, CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.users.update({
+            'normal_author': create_user(
+                username='normal_author',
+            ),
+        })
+
+        create_problem(code='public', is_public=True)
+        create_problem(code='private', is_public=False, authors=('normal_author',))
+        create_solution(problem='public')
+        create_solution(problem='private')
+        create_contest(key='public', is_visible=True)
+        create_contest(key='hidden', is_visible=False, curators=('normal_author',))
+        visible_post = create_blogpost(title='visible', visible=True)
+        hidden_post = create_blogpost(title='hidden', visible=False, authors=('normal_author',))
+
+        author = self.users['normal'].profile
+        self.pages = ['p:public', 'p:private', 's:public', 's:private', 'c:public', 'c:hidden',
+                      'b:%d' % visible_post.id, 'b:%d' % hidden_post.id, 'p:deleted']
+        for page in self.pages:
+            Comment.objects.create(author=author, page=page, body='comment on %s' % page)
+
+    def setUp(self):
+        cache.clear()
+
+    def visible_pages(self, user):
+        return [comment.page for comment in Comment.get_newest_visible_comments(viewer=user, n=100, batch=2)]
+
+    def test_newest_visible_comments_match_access(self):
+        for username in ('superuser', 'normal', 'normal_author', 'anonymous'):
+            user = self.users[username]
+            expected = [comment.page for comment in Comment.objects.order_by('-id') if comment.is_accessible_by(user)]
+            with self.subTest(username=username):
+                self.assertEqual(self.visible_pages(user), expected)
+                # Again, with whether each page is public cached.
+                self.assertEqual(self.visible_pages(user), expected)
+
+    def test_newest_visible_comments_titles(self):
+        titles = {comment.page: comment.page_title
+                  for comment in Comment.get_newest_visible_comments(viewer=self.users['anonymous'], n=100)}
+        self.assertEqual(titles, {
+            'p:public': 'public',
+            's:public': 'Editorial for public',
+            'c:public': 'public',
+            self.pages[6]: 'visible',
+        })
+
+    def test_newest_visible_comments_limit(self):
+        comments = Comment.get_newest_visible_comments(viewer=self.users['superuser'], n=3)
+        self.assertEqual(len(comments), 3)
+
+
+class CommentVoteTestCase(EagerCeleryMixin, TransactionTestCase):
+    fixtures = ['language_all.json']
+    voter_count = 20
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user(username='author').profile
+        self.voters = [create_user(username='voter%d' % i).profile for i in range(self.voter_count)]
+        self.comment = Comment.objects.create(author=self.author, page='p:voting', body='vote on me')
+
+    def cast_votes(self, votes):
+        barrier = threading.Barrier(len(votes))
+
+        def cast(vote):
+            voter, delta = vote
+            try:
+                comment = Comment.objects.get(id=self.comment.id)
+                barrier.wait()
+                return comment.cast_vote(voter, delta)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(votes)) as executor:
+            return list(executor.map(cast, votes))
+
+    def test_concurrent_votes(self):
+        votes = [(voter, -1 if i % 3 == 0 else 1) for i, voter in enumerate(self.voters)]
+        # Every voter tries to vote twice at the same time.
+        results = self.cast_votes(votes + votes)
+
+        self.assertEqual(results.count(True), self.voter_count)
+        self.assertEqual(CommentVote.objects.filter(comment=self.comment).count(), self.voter_count)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.score, sum(delta for _, delta in votes))
+
+    def test_vote_updates_contribution(self):
+        self.assertTrue(self.comment.cast_vote(self.voters[0], 1))
+        self.assertTrue(self.comment.cast_vote(self.voters[1], 1))
+        self.assertFalse(self.comment.cast_vote(self.voters[1], -1))
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.contribution_points, 2 * settings.VNOJ_CP_COMMENT)
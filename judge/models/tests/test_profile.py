@@ -7,8 +7,9 @@ from django.test import TestCase
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 
-from judge.models import Profile
-from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation
+from judge.models import Organization, OrganizationCreditUsage, Profile
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_organization
 
 
 class OrganizationTestCase(CommonDataMixin, TestCase):
@@ -32,6 +33,41 @@ class OrganizationTestCase(CommonDataMixin, TestCase):
         self.assertEqual(str(self.organizations['open']), 'open')
 
 
+class OrganizationCreditTestCase(TestCase):
+    def setUp(self):
+        self.organization = create_organization(name='credit', free_credit=10, paid_credit=100)
+
+    def assertCredit(self, free, paid, consumed):
+        self.organization.refresh_from_db()
+        self.assertAlmostEqual(self.organization.free_credit, free)
+        self.assertAlmostEqual(self.organization.paid_credit, paid)
+        self.assertAlmostEqual(self.organization.current_consumed_credit, consumed)
+
+    def test_consume_free_credit(self):
+        self.organization.consume_credit(4)
+        self.assertCredit(6, 100, 4)
+
+    def test_consume_across_free_and_paid_credit(self):
+        self.organization.consume_credit(15)
+        # The whole amount counts as consumed this month, not only the part taken from paid credit.
+        self.assertCredit(0, 95, 15)
+        self.organization.consume_credit(5)
+        self.assertCredit(0, 90, 20)
+
+    def test_consume_credits(self):
+        other = create_organization(name='other', free_credit=0, paid_credit=1)
+        Organization.consume_credits({self.organization.id: 12, other.id: 3})
+        self.assertCredit(0, 98, 12)
+        other.refresh_from_db()
+        # Paid credit goes negative, as the monthly credit limitation may be disabled.
+        self.assertAlmostEqual(other.paid_credit, -2)
+
+    def test_has_credit_left(self):
+        self.assertTrue(self.organization.has_credit_left())
+        OrganizationCreditUsage.objects.create(organization=self.organization, consumed_credit=110)
+        self.assertFalse(self.organization.has_credit_left())
+
+
 class ProfileTestCase(CommonDataMixin, TestCase):
     @classmethod
     def setUpTestData(self):
@@ -2,7 +2,8 @@ from django.test import TestCase
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from judge.models import ContestSubmission, Language, Submission, SubmissionSource
+from judge.models import ContestSubmission, Language, Submission, SubmissionSource, SubmissionTestCaseArchive
+from judge.models import SubmissionTestCase as SubmissionTestCaseModel
 from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
     create_contest_problem, create_problem, create_user
 
@@ -189,3 +190,54 @@ class SubmissionTestCase(CommonDataMixin, TestCase):
             },
         }
         self._test_object_methods_with_users(self.ie_submission, data)
+
+
+class SubmissionTestCaseArchiveTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=create_problem(code='archived'),
+            language=Language.get_python3(),
+            result='WA',
+            status='D',
+        )
+        SubmissionTestCaseModel.objects.bulk_create([
+            SubmissionTestCaseModel(submission=self.submission, case=1, status='AC', time=0.1, memory=1024,
+                                    points=1, total=1, feedback='ok'),
+            SubmissionTestCaseModel(submission=self.submission, case=2, status='WA', time=0.2, memory=2048,
+                                    points=0, total=1, extended_feedback='wrong answer'),
+            SubmissionTestCaseModel(submission=self.submission, case=3, status='SC', points=0, total=1),
+        ])
+
+    def case_fields(self, cases):
+        return [(case.case, case.status, case.time, case.memory, case.points, case.total, case.batch,
+                 case.feedback, case.extended_feedback, case.output) for case in cases]
+
+    def test_archive_and_restore(self):
+        expected = self.case_fields(self.submission.get_test_cases())
+
+        self.assertEqual(SubmissionTestCaseArchive.archive([self.submission.id]), 1)
+        self.assertFalse(SubmissionTestCaseModel.objects.filter(submission=self.submission).exists())
+        self.assertEqual(self.case_fields(Submission.objects.get(id=self.submission.id).get_test_cases()), expected)
+
+        self.assertEqual(SubmissionTestCaseArchive.restore([self.submission.id]), 1)
+        self.assertFalse(SubmissionTestCaseArchive.objects.filter(submission=self.submission).exists())
+        self.assertEqual(self.case_fields(self.submission.test_cases.order_by('id')), expected)
+
+    def test_archive_skips_grading(self):
+        Submission.objects.filter(id=self.submission.id).update(status='G')
+        self.assertEqual(SubmissionTestCaseArchive.archive([self.submission.id]), 0)
+        self.assertEqual(self.submission.test_cases.count(), 3)
+
+    def test_total_time(self):
+        submissions = Submission.objects.filter(id=self.submission.id)
+        self.assertAlmostEqual(SubmissionTestCaseArchive.total_time(submissions), 0.3)
+
+        SubmissionTestCaseArchive.archive([self.submission.id])
+        self.assertAlmostEqual(SubmissionTestCaseArchive.total_time(submissions), 0.3)
+
+        # A rejudge after archiving replaces the archived test cases.
+        SubmissionTestCaseModel.objects.create(submission=self.submission, case=1, status='AC', time=0.5)
+        self.assertAlmostEqual(SubmissionTestCaseArchive.total_time(submissions), 0.5)
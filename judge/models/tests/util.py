@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AnonymousUser, Permission, User
 from django.utils import timezone
 
+from dmoj.celery import app as celery_app
 from judge.models import BlogPost, Contest, ContestParticipation, ContestProblem, ContestTag, Language, Organization, \
     Problem, ProblemGroup, ProblemType, Profile, Solution
 
@@ -320,3 +321,18 @@ class CommonDataMixin:
                             getattr(obj, method)(self.users[username]),
                             msg='Method "%s" failed for user "%s", object "%s".' % (method, username, obj),
                         )
+
+
+class EagerCeleryMixin:
+    """Runs celery tasks in the calling thread, as there is no broker in tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._task_always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        celery_app.conf.task_always_eager = cls._task_always_eager
@@ -141,6 +141,7 @@ def recalculate_ratings(ranking, old_mean, times_ranked, historical_p):
 
 def rate_contest(contest):
     from judge.models import Rating, Profile
+    from judge.tasks import schedule_rank_index_rebuild
 
     rating_subquery = Rating.objects.filter(user=OuterRef('user'))
     rating_sorted = rating_subquery.order_by('-contest__end_time')
@@ -186,6 +187,7 @@ def rate_contest(contest):
         Profile.objects.filter(contest_history__contest=contest, contest_history__virtual=0).update(
             rating=Subquery(Rating.objects.filter(user=OuterRef('id'))
                             .order_by('-contest__end_time').values('rating')[:1]))
+        schedule_rank_index_rebuild(['rating'])
 
 
 RATING_LEVELS = ['Newbie', 'Pupil', 'Specialist', 'Expert', 'Candidate Master', 'Master', 'International Master',
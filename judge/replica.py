@@ -0,0 +1,136 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+__all__ = ['ReplicaMiddleware', 'ReplicaRouter', 'replica_is_fresh', 'use_replica']
+
+logger = logging.getLogger('judge.replica')
+
+# Set while a request is served from the replica. Reads are only routed there within it, so that everything else,
+# like the bridge, celery tasks and management commands, reads what it has just written.
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+# Whether the replica was fresh at the last check, and when that check was, per process
+_replica_state = {'fresh': False, 'checked': None}
+
+PIN_COOKIE = 'db_primary_pin'
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def get_replica_lag(alias):
+    """Returns how many seconds the replica is behind, or None if it is not replicating."""
+    with connections[alias].cursor() as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except DatabaseError:
+            # MySQL before 8.0.22 and MariaDB before 10.5.1
+            cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        status = dict(zip([column[0] for column in cursor.description], row))
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+
+def replica_is_fresh():
+    """
+    Returns whether the replica is within VNOJ_DATABASE_REPLICA_MAX_LAG seconds of the primary. The replica is
+    checked at most once every VNOJ_DATABASE_REPLICA_CHECK_INTERVAL seconds in each process.
+    """
+    max_lag = settings.VNOJ_DATABASE_REPLICA_MAX_LAG
+    if max_lag is None:
+        return True
+
+    now = time.monotonic()
+    checked = _replica_state['checked']
+    if checked is not None and now - checked < settings.VNOJ_DATABASE_REPLICA_CHECK_INTERVAL:
+        return _replica_state['fresh']
+
+    _replica_state['checked'] = now
+    try:
+        lag = get_replica_lag(settings.VNOJ_DATABASE_REPLICA)
+    except DatabaseError:
+        logger.exception('Failed to check the lag of the database replica')
+        lag = None
+    fresh = lag is not None and lag <= max_lag
+    if fresh != _replica_state['fresh']:
+        logger.warning('Database replica is %s (lag: %s)', 'in use' if fresh else 'not in use', lag)
+    _replica_state['fresh'] = fresh
+    return fresh
+
+
+class ReplicaRouter:
+    """Sends the reads of requests served from the replica to it, and everything else to the primary database."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or not settings.VNOJ_DATABASE_REPLICA:
+            return None
+        # Reads in a transaction must see its writes.
+        if connections['default'].in_atomic_block:
+            return None
+        return settings.VNOJ_DATABASE_REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary, so objects read from either may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.VNOJ_DATABASE_REPLICA
+
+
+class ReplicaMiddleware:
+    """
+    Serves GET requests to the views in VNOJ_DATABASE_REPLICA_VIEWS from the replica, while it is fresh enough.
+
+    After a request that may have written, like a submission, the client is pinned to the primary for
+    VNOJ_DATABASE_REPLICA_PIN_SECONDS with a cookie, so that it reads its own writes.
+
+    This should be the last middleware, so that only the view and the rendering of its response use the replica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.replica_token = None
+        try:
+            response = self.get_response(request)
+            # Template responses are rendered by now, so their lazy querysets were run on the replica too.
+        finally:
+            if request.replica_token is not None:
+                _use_replica.reset(request.replica_token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and settings.VNOJ_DATABASE_REPLICA:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.VNOJ_DATABASE_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def should_use_replica(self, request):
+        if not settings.VNOJ_DATABASE_REPLICA or request.method not in ('GET', 'HEAD'):
+            return False
+        if PIN_COOKIE in request.COOKIES:
+            return False
+        view_name = request.resolver_match.view_name
+        if not any(fnmatchcase(view_name, pattern) for pattern in settings.VNOJ_DATABASE_REPLICA_VIEWS):
+            return False
+        return replica_is_fresh()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.should_use_replica(request):
+            request.replica_token = _use_replica.set(True)
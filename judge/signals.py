@@ -1,4 +1,6 @@
+import csv
 import errno
+import logging
 import os
 from typing import Optional
 
@@ -13,12 +15,18 @@ from registration.models import RegistrationProfile
 from registration.signals import user_registered
 
 from judge.caching import finished_submission
-from judge.models import BlogPost, Comment, Contest, ContestAnnouncement, ContestProblem, ContestSubmission, \
-    EFFECTIVE_MATH_ENGINES, Judge, Language, License, MiscConfig, Organization, Problem, Profile, Submission, \
-    WebAuthnCredential
+from judge.contest_format.solves import invalidate_solve_summaries
+from judge.models import BlogPost, Comment, Contest, ContestAnnouncement, ContestParticipation, ContestProblem, \
+    ContestSubmission, EFFECTIVE_MATH_ENGINES, Judge, Language, License, MiscConfig, Organization, Problem, Profile, \
+    Submission, WebAuthnCredential
+from judge.models.comment import public_page_cache_key
 from judge.tasks import on_new_comment
+from judge.utils.cms import cache_csv_ranking
+from judge.utils.homepage import invalidate_homepage_bundle
 from judge.views.register import RegistrationView
 
+logger = logging.getLogger('judge.signals')
+
 
 def get_pdf_path(basename: str) -> Optional[str]:
     if not settings.DMOJ_PDF_PROBLEM_CACHE:
@@ -50,6 +58,8 @@ def problem_update(sender, instance, **kwargs):
     cache.delete_many([make_template_fragment_key('problem_authors', (instance.id, lang))
                        for lang, _ in settings.LANGUAGES])
     cache.delete_many(['generated-meta-problem:%s:%d' % (lang, instance.id) for lang, _ in settings.LANGUAGES])
+    cache.delete_many([public_page_cache_key('p:%s' % instance.code), public_page_cache_key('s:%s' % instance.code)])
+    invalidate_homepage_bundle()
 
     for lang, _ in settings.LANGUAGES:
         cached_pdf_filename = get_pdf_path('%s.%s.pdf' % (instance.code, lang))
@@ -79,9 +89,24 @@ def contest_update(sender, instance, **kwargs):
     if hasattr(instance, '_updating_stats_only'):
         return
 
-    cache.delete_many(['generated-meta-contest:%d' % instance.id] +
+    cache.delete_many(['generated-meta-contest:%d' % instance.id, public_page_cache_key('c:%s' % instance.key)] +
                       [make_template_fragment_key('contest_html', (instance.id, engine))
                        for engine in EFFECTIVE_MATH_ENGINES])
+    invalidate_homepage_bundle()
+    # The format, and so how results are read from format data, may have changed.
+    invalidate_solve_summaries(instance.id)
+
+    # Parse the CSV ranking once here, rather than on every view of the official ranking.
+    if instance.csv_ranking and not instance.csv_ranking.startswith('http'):
+        try:
+            cache_csv_ranking(instance)
+        except (csv.Error, IndexError, ValueError):
+            logger.exception('Failed to parse the CSV ranking of contest %s', instance.key)
+
+
+@receiver(post_delete, sender=ContestParticipation)
+def contest_participation_delete(sender, instance, **kwargs):
+    invalidate_solve_summaries(instance.contest_id)
 
 
 @receiver(post_delete, sender=ContestProblem)
@@ -110,6 +135,7 @@ def judge_update(sender, instance, **kwargs):
 @receiver(post_save, sender=Comment)
 def comment_update(sender, instance, created, **kwargs):
     cache.delete('comment_feed:%d' % instance.id)
+    invalidate_homepage_bundle()
     if not created:
         return
     on_new_comment.delay(instance.id)
@@ -121,6 +147,7 @@ def post_update(sender, instance, **kwargs):
         make_template_fragment_key('post_summary', (instance.id,)),
         'blog_slug:%d' % instance.id,
         'blog_feed:%d' % instance.id,
+        public_page_cache_key('b:%d' % instance.id),
     ])
     cache.delete_many([make_template_fragment_key('post_content', (instance.id, engine))
                        for engine in EFFECTIVE_MATH_ENGINES])
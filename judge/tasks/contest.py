@@ -2,7 +2,7 @@ import fnmatch
 import json
 import os
 import re
-import zipfile
+from collections import defaultdict
 
 from celery import shared_task
 from django.conf import settings
@@ -11,10 +11,14 @@ from django.core.files.storage import default_storage
 from django.utils.translation import gettext as _
 from moss import MOSS
 
-from judge.models import Contest, ContestMoss, ContestParticipation, ContestSubmission, Problem, Submission
+from judge.models import Contest, ContestMoss, ContestParticipation, ContestSimilarity, ContestSimilarityPair, \
+    ContestSubmission, Problem, Submission, SubmissionSource
+from judge.utils.archive import ZipArchiveWriter
 from judge.utils.celery import Progress
+from judge.utils.iterator import keyset_chunks
+from judge.utils.similarity import find_similar_pairs, get_language_family
 
-__all__ = ('rescore_contest', 'run_moss', 'prepare_contest_data')
+__all__ = ('rescore_contest', 'run_moss', 'run_similarity', 'prepare_contest_data')
 rewildcard = re.compile(r'\*+')
 
 
@@ -55,19 +59,22 @@ def run_moss(self, contest_key):
                     contest_object=contest,
                     problem=problem,
                     language__common_name=dmoj_lang,
-                ).order_by('-points').values_list('user__user__username', 'source__source')
+                ).order_by('-points').values_list('user__user__username', 'id')
 
                 if subs.exists():
                     moss_call = MOSS(moss_api_key, language=moss_lang, matching_file_limit=100,
                                      comment='%s - %s' % (contest.key, problem.code))
 
-                    users = set()
+                    best = {}
+                    for username, sub_id in subs:
+                        best.setdefault(username, sub_id)
 
-                    for username, source in subs:
-                        if username in users:
-                            continue
-                        users.add(username)
-                        moss_call.add_file_from_memory(username, source.encode('utf-8'))
+                    sources = SubmissionSource.get_sources(best.values())
+                    users = set()
+                    for username, sub_id in best.items():
+                        if sub_id in sources:
+                            users.add(username)
+                            moss_call.add_file_from_memory(username, sources[sub_id].encode('utf-8'))
 
                     result.url = moss_call.process()
                     result.submission_count = len(users)
@@ -80,6 +87,60 @@ def run_moss(self, contest_key):
     return len(moss_results)
 
 
+@shared_task(bind=True)
+def run_similarity(self, contest_key):
+    contest = Contest.objects.get(key=contest_key)
+    ContestSimilarity.objects.filter(contest=contest).delete()
+
+    problems = list(contest.problems.all())
+    pair_count = 0
+
+    with Progress(self, len(problems), stage=_('Checking source similarity')) as p:
+        for problem in problems:
+            subs = Submission.objects.filter(
+                contest__participation__virtual__in=(ContestParticipation.LIVE, ContestParticipation.SPECTATE),
+                contest_object=contest,
+                problem=problem,
+                language__file_only=False,
+                source__isnull=False,
+            ).order_by('-points', 'id').values_list('id', 'user_id', 'language__common_name')
+
+            # Only compare the best submission of each user in each language.
+            best = defaultdict(list)
+            users = defaultdict(set)
+            for sub_id, user_id, language in subs.iterator():
+                if user_id in users[language]:
+                    continue
+                users[language].add(user_id)
+                best[language].append(sub_id)
+
+            loaded = SubmissionSource.get_sources([sub_id for ids in best.values() for sub_id in ids])
+            sources = {language: {sub_id: loaded[sub_id] for sub_id in ids if sub_id in loaded}
+                       for language, ids in best.items()}
+
+            for language, language_sources in sources.items():
+                result = ContestSimilarity.objects.create(
+                    contest=contest, problem=problem, language=language, submission_count=len(language_sources),
+                )
+                pairs = find_similar_pairs(
+                    language_sources, get_language_family(language),
+                    k=settings.VNOJ_SIMILARITY_KGRAM_SIZE,
+                    window=settings.VNOJ_SIMILARITY_WINDOW_SIZE,
+                    threshold=settings.VNOJ_SIMILARITY_THRESHOLD,
+                    common_ratio=settings.VNOJ_SIMILARITY_COMMON_RATIO,
+                    limit=settings.VNOJ_SIMILARITY_PAIR_LIMIT,
+                    workers=settings.VNOJ_SIMILARITY_WORKERS,
+                )
+                ContestSimilarityPair.objects.bulk_create([
+                    ContestSimilarityPair(result=result, first_id=first, second_id=second, similarity=similarity)
+                    for first, second, similarity in pairs
+                ])
+                pair_count += len(pairs)
+            p.did(1)
+
+    return pair_count
+
+
 @shared_task(bind=True)
 def prepare_contest_data(self, contest_id, options):
     options = json.loads(options)
@@ -89,13 +150,10 @@ def prepare_contest_data(self, contest_id, options):
         p.done = 0
         contest = Contest.objects.get(id=contest_id)
         queryset = ContestSubmission.objects.filter(participation__contest=contest, participation__virtual=0) \
-                                    .order_by('-points', 'id') \
-                                    .select_related('problem__problem', 'submission__user__user',
-                                                    'submission__source', 'submission__language') \
-                                    .values_list('submission__user__user__id', 'submission__user__user__username',
-                                                 'problem__problem__code', 'submission__source__source',
+                                    .values_list('id', 'points', 'submission__user__user__id',
+                                                 'submission__user__user__username', 'problem__problem__code',
                                                  'submission__language__extension', 'submission__id',
-                                                 'submission__language__file_only')
+                                                 'submission__language__file_only', named=True)
 
         if options['submission_results']:
             queryset = queryset.filter(result__in=options['submission_results'])
@@ -108,34 +166,41 @@ def prepare_contest_data(self, contest_id, options):
                 problem__problem__in=Problem.objects.filter(code__regex=fnmatch.translate(problem_glob)),
             )
 
-        submissions = list(queryset)
+        length = queryset.count()
         p.did(1)
 
-    length = len(submissions)
-    with Progress(self, length, stage=_('Preparing contest data')) as p:
-        data_file = zipfile.ZipFile(os.path.join(settings.DMOJ_CONTEST_DATA_CACHE, '%s.zip' % contest_id), mode='w')
+    with Progress(self, length, stage=_('Preparing contest data'),
+                  interval=settings.VNOJ_DATA_EXPORT_PROGRESS_INTERVAL) as p, \
+            ZipArchiveWriter(os.path.join(settings.DMOJ_CONTEST_DATA_CACHE, '%s.zip' % contest_id),
+                             background=settings.VNOJ_DATA_EXPORT_BACKGROUND_COMPRESSION) as data_file:
         exported = set()
-        for user_id, username, problem, source, ext, sub_id, file_only in submissions:
-            if (user_id, problem) in exported:
-                path = os.path.join(username, '$History', f'{problem}_{sub_id}.{ext}')
-            else:
-                path = os.path.join(username, f'{problem}.{ext}')
-                exported.add((user_id, problem))
-
-            if file_only:
-                # Get the basename of the source as it is an URL
-                filename = os.path.basename(source)
-                data_file.write(
-                    default_storage.path(os.path.join(settings.SUBMISSION_FILE_UPLOAD_MEDIA_DIR,
-                                         problem, str(user_id), filename)),
-                    path,
-                )
-                pass
-            else:
-                data_file.writestr(path, source)
-
-            p.did(1)
-
-        data_file.close()
+        # Submissions are exported best first, so that the best submission of each user is not put in $History.
+        for rows in keyset_chunks(queryset, ('-points', 'id'), settings.VNOJ_DATA_EXPORT_CHUNK_SIZE):
+            # Sources are only fetched for the current chunk, to keep memory usage independent of the contest size.
+            sources = SubmissionSource.get_sources([row.submission__id for row in rows])
+            for row in rows:
+                user_id, username = row.submission__user__user__id, row.submission__user__user__username
+                problem, ext, sub_id = row.problem__problem__code, row.submission__language__extension, \
+                    row.submission__id
+                source = sources.get(sub_id, '')
+
+                if (user_id, problem) in exported:
+                    path = os.path.join(username, '$History', f'{problem}_{sub_id}.{ext}')
+                else:
+                    path = os.path.join(username, f'{problem}.{ext}')
+                    exported.add((user_id, problem))
+
+                if row.submission__language__file_only:
+                    # Get the basename of the source as it is an URL
+                    filename = os.path.basename(source)
+                    data_file.write(
+                        default_storage.path(os.path.join(settings.SUBMISSION_FILE_UPLOAD_MEDIA_DIR,
+                                             problem, str(user_id), filename)),
+                        path,
+                    )
+                else:
+                    data_file.writestr(path, source)
+
+            p.did(len(rows))
 
     return length
@@ -0,0 +1,10 @@
+from celery import shared_task
+
+from judge.utils.homepage import refresh_homepage_bundle
+
+__all__ = ('refresh_homepage',)
+
+
+@shared_task
+def refresh_homepage():
+    refresh_homepage_bundle()
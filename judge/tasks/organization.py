@@ -1,29 +1,83 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 import pytz
 from celery import shared_task
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
-from judge.models import Organization, OrganizationMonthlyUsage
+from judge.models import Organization, OrganizationCreditUsage, OrganizationMonthlyUsage
+
+__all__ = ('organization_credit_roll_up', 'organization_monthly_reset', 'roll_up_credit_usage')
+
+ROLL_UP_BATCH_SIZE = 10000
+
+
+def roll_up_credit_usage(before=None):
+    """
+    Takes the credit usage recorded in the ledger, up to `before` if given, from the balances of the organizations.
+    Returns the number of usages rolled up.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            usages = OrganizationCreditUsage.objects.filter(rolled_up=False)
+            if before is not None:
+                usages = usages.filter(time__lt=before)
+            # Locking the usages makes a concurrent roll-up wait for this one, and then skip them.
+            usages = list(usages.select_for_update().order_by('id')
+                          .values_list('id', 'organization_id', 'consumed_credit')[:ROLL_UP_BATCH_SIZE])
+            if not usages:
+                return total
+
+            consumed = defaultdict(float)
+            for usage_id, organization_id, credit in usages:
+                consumed[organization_id] += credit
+            Organization.consume_credits(consumed)
+            OrganizationCreditUsage.objects.filter(id__in=[usage[0] for usage in usages]).update(rolled_up=True)
+
+        total += len(usages)
+        if len(usages) < ROLL_UP_BATCH_SIZE:
+            return total
+
+
+@shared_task
+def organization_credit_roll_up():
+    roll_up_credit_usage()
 
 
 @shared_task
 def organization_monthly_reset():
-    # Get first day of last month
+    # Get first day of this month and of last month
     current_time = datetime.now(pytz.utc)
-    month_start = (current_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0) -
-                   timedelta(days=1)).replace(day=1)
+    current_month_start = current_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+
+    with transaction.atomic():
+        # Last month's usage must leave last month's balance before it is reset.
+        roll_up_credit_usage(before=current_month_start)
 
-    organizations = Organization.objects.filter(current_consumed_credit__gt=0)
+        # The consumed credit is then last month's total, including credit consumed directly rather than through the
+        # ledger, except for usage of this month that the periodic roll-up may have taken already.
+        this_month = (OrganizationCreditUsage.objects.filter(time__gte=current_month_start, rolled_up=True)
+                      .values('organization').annotate(consumed=Sum('consumed_credit')).order_by())
+        this_month = {usage['organization']: usage['consumed'] for usage in this_month}
+        organizations = (Organization.objects.filter(current_consumed_credit__gt=0).select_for_update()
+                         .values_list('id', 'current_consumed_credit'))
+        OrganizationMonthlyUsage.objects.bulk_create([
+            OrganizationMonthlyUsage(organization_id=organization_id, time=month_start,
+                                     consumed_credit=consumed - this_month.get(organization_id, 0))
+            for organization_id, consumed in organizations
+        ], ignore_conflicts=True)
 
-    for org in organizations:
-        usage = OrganizationMonthlyUsage(
-            organization=org,
-            time=month_start,
-            consumed_credit=org.current_consumed_credit,
+        this_month_consumed = (OrganizationCreditUsage.objects
+                               .filter(organization=OuterRef('id'), time__gte=current_month_start, rolled_up=True)
+                               .values('organization').annotate(consumed=Sum('consumed_credit')).order_by()
+                               .values('consumed'))
+        Organization.objects.filter(current_consumed_credit__gt=0).update(
+            free_credit=F('monthly_free_credit_limit'),
+            current_consumed_credit=Coalesce(Subquery(this_month_consumed), 0.0),
         )
-        usage.save()
-        org.free_credit = org.monthly_free_credit_limit
-        org.current_consumed_credit = 0
-        org.save()
 
     print('Reset monthly credit for all organizations')
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.models import OrganizationCreditUsage, OrganizationMonthlyUsage
+from judge.models.tests.util import create_organization
+from judge.tasks.organization import organization_monthly_reset, roll_up_credit_usage
+
+
+class OrganizationCreditTaskTestCase(TestCase):
+    def setUp(self):
+        self.first = create_organization(name='first', free_credit=10, paid_credit=100, monthly_free_credit_limit=50)
+        self.second = create_organization(name='second', free_credit=0, paid_credit=30, monthly_free_credit_limit=50)
+
+    def use(self, organization, credit, time=None):
+        return OrganizationCreditUsage.objects.create(organization=organization, consumed_credit=credit,
+                                                      time=time or timezone.now())
+
+    def assertCredit(self, organization, free, paid, consumed):
+        organization.refresh_from_db()
+        self.assertAlmostEqual(organization.free_credit, free)
+        self.assertAlmostEqual(organization.paid_credit, paid)
+        self.assertAlmostEqual(organization.current_consumed_credit, consumed)
+
+    def test_roll_up_credit_usage(self):
+        self.use(self.first, 3)
+        self.use(self.first, 4)
+        self.use(self.second, 20)
+
+        self.assertEqual(roll_up_credit_usage(), 3)
+        self.assertCredit(self.first, 3, 100, 7)
+        self.assertCredit(self.second, 0, 10, 20)
+        self.assertFalse(OrganizationCreditUsage.objects.filter(rolled_up=False).exists())
+
+        # Usage is only ever taken once.
+        self.assertEqual(roll_up_credit_usage(), 0)
+        self.assertCredit(self.first, 3, 100, 7)
+
+    def test_roll_up_credit_usage_across_free_and_paid_credit(self):
+        self.use(self.first, 6)
+        self.use(self.first, 6)
+        roll_up_credit_usage()
+        self.assertCredit(self.first, 0, 98, 12)
+
+    def test_roll_up_credit_usage_before(self):
+        now = timezone.now()
+        self.use(self.first, 3, now - timedelta(hours=1))
+        later = self.use(self.first, 4, now)
+
+        self.assertEqual(roll_up_credit_usage(before=now), 1)
+        self.assertCredit(self.first, 7, 100, 3)
+        self.assertEqual(list(OrganizationCreditUsage.objects.filter(rolled_up=False)), [later])
+
+    def test_monthly_reset(self):
+        month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_month = month_start - timedelta(days=1)
+        self.use(self.first, 5, last_month)
+        self.use(self.first, 7, last_month)
+        self.use(self.second, 2, last_month)
+        this_month = self.use(self.first, 1)
+
+        organization_monthly_reset()
+
+        usages = OrganizationMonthlyUsage.objects.filter(time=last_month.date().replace(day=1))
+        self.assertEqual({usage.organization_id: usage.consumed_credit for usage in usages},
+                         {self.first.id: 12, self.second.id: 2})
+        # Last month's usage is taken from last month's balance, and free credit is then reset.
+        self.assertCredit(self.first, 50, 98, 0)
+        self.assertCredit(self.second, 50, 28, 0)
+        self.assertEqual(list(OrganizationCreditUsage.objects.filter(rolled_up=False)), [this_month])
+
+    def test_monthly_reset_records_direct_consumption(self):
+        # Credit consumed without the ledger, as before it existed or by backfill_current_credit, counts too.
+        self.first.consume_credit(3)
+        self.use(self.first, 4, timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) -
+                 timedelta(days=1))
+
+        organization_monthly_reset()
+
+        usage = OrganizationMonthlyUsage.objects.get(organization=self.first)
+        self.assertAlmostEqual(usage.consumed_credit, 7)
+        self.assertCredit(self.first, 50, 100, 0)
+
+    def test_monthly_reset_keeps_usage_of_this_month(self):
+        month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self.use(self.first, 5, month_start - timedelta(days=1))
+        # Taken by the periodic roll-up just after the month started, before the reset ran.
+        self.use(self.first, 2, month_start)
+        roll_up_credit_usage()
+
+        organization_monthly_reset()
+
+        usage = OrganizationMonthlyUsage.objects.get(organization=self.first)
+        self.assertAlmostEqual(usage.consumed_credit, 5)
+        self.assertCredit(self.first, 50, 100, 2)
@@ -2,24 +2,32 @@ import fnmatch
 import json
 import os
 import re
-import zipfile
+import uuid
+from collections import defaultdict
 
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils.translation import gettext as _
 
-from judge.models import Comment, Problem, Submission
+from judge.models import Comment, Problem, Profile, Submission, SubmissionSource
+from judge.utils.archive import JSONObjectSpool, ZipArchiveWriter
 from judge.utils.celery import Progress
+from judge.utils.iterator import keyset_chunks
+from judge.utils.rank_index import RANK_INDEX_FIELDS, patch_rank_indexes, rebuild_rank_index
 from judge.utils.raw_sql import use_straight_join
 from judge.utils.unicode import utf8bytes
 
-__all__ = ('prepare_user_data',)
+__all__ = ('prepare_user_data', 'recalculate_contribution_points', 'schedule_contribution_update',
+           'rebuild_rank_indexes', 'schedule_rank_index_rebuild', 'apply_rank_index_patches',
+           'schedule_rank_index_patch')
 rewildcard = re.compile(r'\*+')
 
 
 def apply_submission_filter(queryset, options):
     if not options['submission_download']:
-        return []
+        return queryset.none()
 
     use_straight_join(queryset)
 
@@ -34,13 +42,13 @@ def apply_submission_filter(queryset, options):
             problem__in=Problem.objects.filter(code__regex=fnmatch.translate(problem_glob)),
         )
 
-    return list(queryset)
+    return queryset
 
 
 def apply_comment_filter(queryset, options):
     if not options['comment_download']:
-        return []
-    return list(queryset)
+        return queryset.none()
+    return queryset
 
 
 @shared_task(bind=True)
@@ -50,72 +58,185 @@ def prepare_user_data(self, profile_id, options):
         # Force an update so that we get a progress bar.
         p.done = 0
         submissions = apply_submission_filter(
-            Submission.objects.select_related('problem', 'language', 'source').filter(user_id=profile_id),
+            Submission.objects.filter(user_id=profile_id).values_list(
+                'id', 'problem__code', 'date', 'time', 'memory', 'language__key', 'language__extension', 'status',
+                'result', 'case_points', 'case_total', named=True,
+            ),
             options,
         )
+        submission_count = submissions.count()
         p.did(1)
-        comments = apply_comment_filter(Comment.objects.filter(author_id=profile_id), options)
+        comments = apply_comment_filter(
+            Comment.objects.filter(author_id=profile_id).values_list('id', 'time', 'page', 'score', 'body', named=True),
+            options,
+        )
+        comment_count = comments.count()
         p.did(1)
 
-    with zipfile.ZipFile(os.path.join(settings.DMOJ_USER_DATA_CACHE, '%s.zip' % profile_id), mode='w') as data_file:
-        submission_count = len(submissions)
+    chunk_size = settings.VNOJ_DATA_EXPORT_CHUNK_SIZE
+    interval = settings.VNOJ_DATA_EXPORT_PROGRESS_INTERVAL
+    with ZipArchiveWriter(os.path.join(settings.DMOJ_USER_DATA_CACHE, '%s.zip' % profile_id),
+                          background=settings.VNOJ_DATA_EXPORT_BACKGROUND_COMPRESSION) as data_file:
         if submission_count:
-            submission_info = {}
-            with Progress(self, submission_count, stage=_('Preparing your submission data')) as p:
-                prepared = 0
-                interval = max(submission_count // 10, 1)
-                for submission in submissions:
-                    submission_info[submission.id] = {
-                        'problem': submission.problem.code,
-                        'date': submission.date.isoformat(),
-                        'time': submission.time,
-                        'memory': submission.memory,
-                        'language': submission.language.key,
-                        'status': submission.status,
-                        'result': submission.result,
-                        'case_points': submission.case_points,
-                        'case_total': submission.case_total,
-                    }
-                    with data_file.open(
-                        'submissions/%s.%s' % (submission.id, submission.language.extension),
-                        'w',
-                    ) as f:
-                        f.write(utf8bytes(submission.source.source))
-
-                    prepared += 1
-                    if prepared % interval == 0:
-                        p.done = prepared
-
-                with data_file.open('submissions/info.json', 'w') as f:
-                    f.write(utf8bytes(json.dumps(submission_info, sort_keys=True, indent=4)))
-
-        comment_count = len(comments)
+            submission_info = JSONObjectSpool()
+            with Progress(self, submission_count, stage=_('Preparing your submission data'), interval=interval) as p:
+                for rows in keyset_chunks(submissions, ('id',), chunk_size):
+                    sources = SubmissionSource.get_sources([row.id for row in rows])
+                    for submission in rows:
+                        submission_info.add(submission.id, {
+                            'problem': submission.problem__code,
+                            'date': submission.date.isoformat(),
+                            'time': submission.time,
+                            'memory': submission.memory,
+                            'language': submission.language__key,
+                            'status': submission.status,
+                            'result': submission.result,
+                            'case_points': submission.case_points,
+                            'case_total': submission.case_total,
+                        })
+                        data_file.writestr(
+                            'submissions/%s.%s' % (submission.id, submission.language__extension),
+                            utf8bytes(sources.get(submission.id, '')),
+                        )
+                    p.did(len(rows))
+
+                data_file.writefile(submission_info.finish(), 'submissions/info.json')
+
         if comment_count:
-            comment_info = {}
-            with Progress(self, comment_count, stage=_('Preparing your comment data')) as p:
-                prepared = 0
-                interval = max(comment_count // 10, 1)
-                for comment in comments:
-                    related_object = {
-                        'b': 'blog post',
-                        'c': 'contest',
-                        'p': 'problem',
-                        's': 'problem editorial',
-                    }
-                    comment_info[comment.id] = {
-                        'date': comment.time.isoformat(),
-                        'related_object': related_object[comment.page[0]],
-                        'page': comment.page[2:],
-                        'score': comment.score,
-                    }
-                    with data_file.open('comments/%s.txt' % comment.id, 'w') as f:
-                        f.write(utf8bytes(comment.body))
-
-                    prepared += 1
-                    if prepared % interval == 0:
-                        p.done = prepared
-
-                with data_file.open('comments/info.json', 'w') as f:
-                    f.write(utf8bytes(json.dumps(comment_info, sort_keys=True, indent=4)))
+            comment_info = JSONObjectSpool()
+            with Progress(self, comment_count, stage=_('Preparing your comment data'), interval=interval) as p:
+                related_object = {
+                    'b': 'blog post',
+                    'c': 'contest',
+                    'p': 'problem',
+                    's': 'problem editorial',
+                }
+                for rows in keyset_chunks(comments, ('id',), chunk_size):
+                    for comment in rows:
+                        comment_info.add(comment.id, {
+                            'date': comment.time.isoformat(),
+                            'related_object': related_object[comment.page[0]],
+                            'page': comment.page[2:],
+                            'score': comment.score,
+                        })
+                        data_file.writestr('comments/%s.txt' % comment.id, utf8bytes(comment.body))
+                    p.did(len(rows))
+
+                data_file.writefile(comment_info.finish(), 'comments/info.json')
 
     return submission_count + comment_count
+
+
+def contribution_update_key(profile_id):
+    return 'contribution_update:%d' % profile_id
+
+
+@shared_task
+def recalculate_contribution_points(profile_ids):
+    for profile in Profile.objects.filter(id__in=profile_ids):
+        # Cleared first, so that votes counted after this point schedule another update.
+        cache.delete(contribution_update_key(profile.id))
+        profile.calculate_contribution_points()
+
+
+def schedule_contribution_update(profile_ids):
+    """
+    Recalculates the contribution points of the profiles after VNOJ_CONTRIBUTION_UPDATE_DELAY seconds, unless an
+    update is already scheduled, once the current transaction commits.
+    """
+    profile_ids = list(profile_ids)
+
+    def schedule():
+        delay = settings.VNOJ_CONTRIBUTION_UPDATE_DELAY
+        # The marker expires eventually, in case the task is lost.
+        pending = [id for id in profile_ids if cache.add(contribution_update_key(id), True, delay * 10)]
+        if pending:
+            recalculate_contribution_points.apply_async((pending,), countdown=delay)
+
+    transaction.on_commit(schedule)
+
+
+def rank_index_rebuild_key(field):
+    return 'rank_index_rebuild:%s' % field
+
+
+@shared_task
+def rebuild_rank_indexes(fields=RANK_INDEX_FIELDS):
+    for field in fields:
+        cache.delete(rank_index_rebuild_key(field))
+        rebuild_rank_index(field)
+
+
+def schedule_rank_index_rebuild(fields):
+    """Rebuilds the rank indexes of `fields` once the current transaction commits, unless already scheduled."""
+    fields = list(fields)
+
+    def schedule():
+        pending = [field for field in fields if cache.add(rank_index_rebuild_key(field), True, 600)]
+        if pending:
+            rebuild_rank_indexes.delay(pending)
+
+    transaction.on_commit(schedule)
+
+
+# Changes to profiles are gathered into a batch, identified by the value of this key while it is open. Each change
+# takes a slot in the batch by incrementing its counter.
+RANK_INDEX_PATCH_BATCH_KEY = 'rank_index_patch_batch'
+
+
+def rank_index_patch_count_key(batch):
+    return 'rank_index_patch_count:%s' % batch
+
+
+def rank_index_patch_key(batch, slot):
+    return 'rank_index_patch:%s:%d' % (batch, slot)
+
+
+@shared_task
+def apply_rank_index_patches(batch):
+    # Closed first, so that changes from this point on go into another batch. A change that misses its batch while
+    # it closes is left to the periodic rebuild.
+    cache.delete(RANK_INDEX_PATCH_BATCH_KEY)
+    count = cache.get(rank_index_patch_count_key(batch)) or 0
+    changes = defaultdict(set)
+    for profile_id, fields in cache.get_many([rank_index_patch_key(batch, slot)
+                                              for slot in range(1, count + 1)]).values():
+        changes[profile_id].update(fields)
+    if changes:
+        patch_rank_indexes(changes)
+
+
+def schedule_rank_index_patch(profile_id, fields):
+    """
+    Moves a profile in the rank indexes of `fields` once the current transaction commits. The changes of all profiles
+    within VNOJ_RANK_INDEX_PATCH_DELAY seconds are applied together, fetching and storing each index once.
+    """
+    fields = list(fields)
+
+    def schedule():
+        delay = settings.VNOJ_RANK_INDEX_PATCH_DELAY
+        # Everything expires eventually, in case the task is lost.
+        timeout = delay * 10
+        opened = False
+        batch = cache.get(RANK_INDEX_PATCH_BATCH_KEY)
+        if batch is None:
+            batch = uuid.uuid4().hex
+            # The counter exists before the batch is opened, so that anyone who sees the batch can take a slot.
+            cache.set(rank_index_patch_count_key(batch), 0, timeout)
+            opened = cache.add(RANK_INDEX_PATCH_BATCH_KEY, batch, timeout)
+            if not opened:
+                batch = cache.get(RANK_INDEX_PATCH_BATCH_KEY)
+                if batch is None:
+                    return
+
+        try:
+            slot = cache.incr(rank_index_patch_count_key(batch))
+        except ValueError:
+            # The batch was applied and has expired since.
+            return
+        cache.set(rank_index_patch_key(batch, slot), (profile_id, fields), timeout)
+
+        if opened:
+            apply_rank_index_patches.apply_async((batch,), countdown=delay)
+
+    transaction.on_commit(schedule)
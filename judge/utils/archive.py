@@ -0,0 +1,105 @@
+import json
+import queue
+import shutil
+import tempfile
+import threading
+import zipfile
+
+__all__ = ['ZipArchiveWriter', 'JSONObjectSpool']
+
+
+class ZipArchiveWriter:
+    """
+    Writes a zip archive entry by entry.
+
+    With `background=True`, entries are compressed and written by a separate thread, fed through a queue of at most
+    `max_pending` entries. Since zlib releases the GIL, compression then overlaps with fetching the next batch of
+    entries from the database, while the queue bound keeps memory usage flat.
+    """
+
+    def __init__(self, path, background=False, max_pending=64):
+        self.archive = zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED)
+        self._error = None
+        if background:
+            self._queue = queue.Queue(max_pending)
+            self._thread = threading.Thread(target=self._writer_thread, daemon=True)
+            self._thread.start()
+        else:
+            self._queue = None
+            self._thread = None
+
+    def _write(self, kind, arcname, data):
+        if kind == 'str':
+            self.archive.writestr(arcname, data)
+        elif kind == 'path':
+            self.archive.write(data, arcname)
+        else:
+            with data, self.archive.open(arcname, 'w') as f:
+                shutil.copyfileobj(data, f)
+
+    def _writer_thread(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Keep draining the queue after an error, so that the producer never blocks forever.
+            if self._error is None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self._error = e
+
+    def _submit(self, kind, arcname, data):
+        if self._queue is None:
+            self._write(kind, arcname, data)
+        else:
+            if self._error is not None:
+                raise self._error
+            self._queue.put((kind, arcname, data))
+
+    def writestr(self, arcname, data):
+        self._submit('str', arcname, data)
+
+    def write(self, filename, arcname):
+        self._submit('path', arcname, filename)
+
+    def writefile(self, fileobj, arcname):
+        """Copies an open binary file into the archive, closing it afterwards."""
+        self._submit('file', arcname, fileobj)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.archive.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JSONObjectSpool:
+    """
+    Builds a JSON object in a temporary file one key at a time, producing the same output as
+    `json.dumps(obj, sort_keys=True, indent=4)` for keys added in order, without keeping the object in memory.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.count = 0
+
+    def add(self, key, value):
+        self.file.write(b',\n' if self.count else b'{\n')
+        # Strip the enclosing braces of a single-key object, keeping the indentation of the entry.
+        self.file.write(json.dumps({str(key): value}, sort_keys=True, indent=4)[2:-2].encode('utf-8'))
+        self.count += 1
+
+    def finish(self):
+        self.file.write(b'\n}' if self.count else b'{}')
+        self.file.seek(0)
+        return self.file
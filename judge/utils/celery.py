@@ -1,3 +1,5 @@
+import time
+
 from celery.result import AsyncResult
 from django.http import HttpResponseRedirect
 from django.urls import reverse
@@ -5,13 +7,18 @@ from django.utils.http import urlencode
 
 
 class Progress:
-    def __init__(self, task, total, stage=None):
+    def __init__(self, task, total, stage=None, interval=None):
         self.task = task
         self._total = total
         self._done = 0
         self._stage = stage
+        # Minimum number of seconds between two updates caused by `did`, to avoid writing to the result backend
+        # for every processed item in long-running tasks.
+        self._interval = interval
+        self._last_update = None
 
     def _update_state(self):
+        self._last_update = time.monotonic()
         self.task.update_state(
             state='PROGRESS',
             meta={
@@ -42,7 +49,9 @@ class Progress:
 
     def did(self, delta):
         self._done += delta
-        self._update_state()
+        if self._interval is None or self._last_update is None or \
+                time.monotonic() - self._last_update >= self._interval:
+            self._update_state()
 
     def __enter__(self):
         return self
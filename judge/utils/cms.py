@@ -1,22 +1,112 @@
 import csv
+import hashlib
 import io
+import pickle
+import zlib
 
+from django.core.cache import cache
 
-def parse_csv_ranking(raw):
-    reader = csv.DictReader(io.StringIO(raw))
+__all__ = ['CSVRanking', 'cache_csv_ranking', 'get_csv_ranking']
 
-    show_team = 'Team' in reader.fieldnames
-    problems = [reader.fieldnames[i] for i in range(3 if show_team else 2, len(reader.fieldnames) - 2, 2)]
-    users = []
+# The parsed ranking is keyed by a hash of the CSV, so an edited ranking is never served stale, and a ranking that
+# expires is parsed again from the contest on the next view.
+CSV_RANKING_TIMEOUT = 86400
 
-    for row in reader:
-        users.append({
-            'username': row['Username'],
-            'full_name': row['User'],
-            'scores': [float(row[prob]) for prob in problems],
-            'total_score': float(row['Global']),
-        })
 
-    users.sort(key=lambda p: p['total_score'], reverse=True)
+class CSVRanking:
+    """
+    A ranking exported by CMS, parsed once and sorted by total score. Each row is a tuple of
+    (username, full name, tuple of problem scores, total score), so that the whole ranking pickles compactly.
+    """
 
-    return users, problems
+    def __init__(self, problems, rows):
+        self.problems = problems
+        self.rows = rows
+
+    @classmethod
+    def parse(cls, raw):
+        reader = csv.reader(io.StringIO(raw))
+        header = next(reader)
+
+        # The columns are the user, then the team if there are teams, then the score and the status of each problem,
+        # then the global score and its status.
+        first_problem = 3 if 'Team' in header else 2
+        problem_columns = range(first_problem, len(header) - 2, 2)
+        username_column = header.index('Username')
+        name_column = header.index('User')
+        total_column = header.index('Global')
+
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            rows.append((
+                row[username_column],
+                row[name_column],
+                tuple(parse_score(row[i]) for i in problem_columns),
+                parse_score(row[total_column]),
+            ))
+        rows.sort(key=lambda row: row[3], reverse=True)
+
+        return cls([header[i] for i in problem_columns], rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query):
+        """
+        Returns the indices of the rows whose username or full name contain `query`, ignoring case. Without a query,
+        a range over all the rows is returned, which can be paginated without being built.
+        """
+        query = query.strip().casefold()
+        if not query:
+            return range(len(self.rows))
+        return [i for i, (username, full_name, scores, total) in enumerate(self.rows)
+                if query in username.casefold() or query in full_name.casefold()]
+
+    def iter_csv(self):
+        """Yields the ranking as lines of CSV, one row at a time."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(values):
+            writer.writerow(values)
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return value
+
+        yield line(['Rank', 'Username', 'User'] + self.problems + ['Global'])
+        for rank, (username, full_name, scores, total) in enumerate(self.rows, 1):
+            yield line([rank, username, full_name, *scores, total])
+
+    def dumps(self):
+        return zlib.compress(pickle.dumps((self.problems, self.rows), pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def loads(cls, data):
+        return cls(*pickle.loads(zlib.decompress(data)))
+
+
+def parse_score(value):
+    # Scores are mostly whole, and are kept as ints then, which pickle smaller than floats.
+    score = float(value)
+    return int(score) if score.is_integer() else score
+
+
+def csv_ranking_key(contest):
+    return 'csv_ranking:%d:%s' % (contest.id, hashlib.sha1(contest.csv_ranking.encode('utf-8')).hexdigest())
+
+
+def cache_csv_ranking(contest):
+    """Parses the CSV ranking of a contest and caches it, returning the parsed ranking."""
+    ranking = CSVRanking.parse(contest.csv_ranking)
+    cache.set(csv_ranking_key(contest), ranking.dumps(), CSV_RANKING_TIMEOUT)
+    return ranking
+
+
+def get_csv_ranking(contest):
+    data = cache.get(csv_ranking_key(contest))
+    if data is None:
+        return cache_csv_ranking(contest)
+    return CSVRanking.loads(data)
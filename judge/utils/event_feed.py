@@ -0,0 +1,190 @@
+from datetime import timedelta
+
+from django.db.models import Min, Q
+from django.utils import timezone
+from lxml import etree as ET
+
+from judge.models import ContestSubmission, Language
+from judge.models.submission import SUBMISSION_RESULT
+from judge.utils.iterator import keyset_chunks
+
+__all__ = ['generate_event_feed']
+
+# Ref: https://clics.ecs.baylor.edu/index.php?title=Event_Feed_2016
+
+
+class _ChunkedOutput:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _write_element(xf, tag, fields):
+    element = ET.Element(tag)
+    for name, text in fields:
+        ET.SubElement(element, name).text = text
+    element.tail = '\n'
+    xf.write(element)
+
+
+def get_label_for_problem(index):
+    ret = ''
+    while index > 0:
+        ret += chr((index - 1) % 26 + 65)
+        index = (index - 1) // 26
+    return ret[::-1]
+
+
+def write_info(xf, contest):
+    fields = [
+        ('contest-id', contest.key.replace('_', '-')),
+        ('title', contest.name),
+        ('starttime', str(contest.start_time.timestamp())),
+        ('length', str(contest.time_limit or contest.contest_window_length)),
+        ('penalty', str(contest.format.config.get('penalty', 0))),
+        ('started', 'True' if timezone.now() >= contest.start_time else 'False'),
+    ]
+    if contest.frozen_last_minutes:
+        fields.append(('scoreboard-freeze-length', str(timedelta(minutes=contest.frozen_last_minutes))))
+    _write_element(xf, 'info', fields)
+
+
+def write_languages(xf):
+    for id, key, name in Language.objects.all().values_list('id', 'key', 'name'):
+        _write_element(xf, 'language', [('id', str(id)), ('key', key), ('name', name)])
+
+
+def write_region(xf):
+    _write_element(xf, 'region', [('external-id', '1'), ('name', 'Administrative Site')])
+
+
+def write_judgements(xf):
+    for acronym, name in SUBMISSION_RESULT:
+        _write_element(xf, 'judgement', [('acronym', acronym), ('name', str(name))])
+
+
+def get_problem_index(contest):
+    contest_problems = contest.contest_problems.order_by('order').values_list('problem__id', 'problem__name')
+    return {external_id: (id, name) for id, (external_id, name) in enumerate(contest_problems, start=1)}
+
+
+def write_problems(xf, problem_index):
+    for id, name in problem_index.values():
+        _write_element(xf, 'problem', [('id', str(id)), ('label', get_label_for_problem(id)), ('name', name)])
+
+
+def get_teams(contest):
+    teams = contest.users.filter(virtual=0).order_by('id').select_related('user__user') \
+                   .prefetch_related('user__organizations')
+    return [participation.user for participation in teams]
+
+
+def write_teams(xf, teams):
+    for id, profile in enumerate(teams, start=1):
+        user = profile.user
+        org = profile.organization
+        _write_element(xf, 'team', [
+            ('id', str(id)),
+            ('external-id', str(user.id)),
+            ('name', user.first_name or profile.display_name),
+            ('nationality', 'VNM'),
+            ('region', 'Administrative Site'),
+            ('university', org.name if org else ''),
+        ])
+
+
+def get_runs(contest, since_id=None, since_time=None):
+    queryset = ContestSubmission.objects.filter(participation__contest=contest, participation__virtual=0) \
+                                        .exclude(submission__result__isnull=True) \
+                                        .exclude(submission__result__in=['IE', 'CE'])
+    if since_id is not None:
+        queryset = queryset.filter(submission_id__gt=since_id)
+    if since_time is not None:
+        # Rejudged runs are sent again, with their new results.
+        queryset = queryset.filter(Q(submission__judged_date__gt=since_time) |
+                                   Q(submission__judged_date__isnull=True, submission__date__gt=since_time))
+    return queryset.values_list('submission_id', 'submission__problem_id', 'submission__language__key',
+                                'submission__user__user_id', 'submission__date', 'submission__result', named=True)
+
+
+def get_first_accepted(contest):
+    return {
+        (problem_id, user_id): first_ac for problem_id, user_id, first_ac in
+        ContestSubmission.objects.filter(participation__contest=contest, participation__virtual=0,
+                                         submission__result='AC')
+                                 .values_list('submission__problem_id', 'submission__user__user_id')
+                                 .annotate(first_ac=Min('submission_id')).order_by()
+    }
+
+
+def write_run(xf, contest, run, problem_index, team_index, first_accepted):
+    key = (run.submission__problem_id, run.submission__user__user_id)
+    _write_element(xf, 'run', [
+        ('id', str(run.submission_id)),
+        ('problem', str(problem_index[run.submission__problem_id][0])),
+        ('language', run.submission__language__key),
+        ('team', str(team_index[run.submission__user__user_id])),
+        ('timestamp', str(run.submission__date.timestamp())),
+        ('time', str((run.submission__date - contest.start_time).total_seconds())),
+        ('judged', 'True'),
+        ('result', run.submission__result),
+        ('solved', 'True' if run.submission__result == 'AC' else 'False'),
+        # Only runs before the first accepted run of a team on a problem count towards penalty.
+        ('penalty', 'False' if key in first_accepted and run.submission_id >= first_accepted[key] else 'True'),
+    ])
+
+
+def write_finalized(xf, last_medals):
+    _write_element(xf, 'finalized', [
+        ('last-gold', str(last_medals[0])),
+        ('last-silver', str(last_medals[1])),
+        ('last-bronze', str(last_medals[2])),
+        ('comment', 'Auto-finalized'),
+        ('timestamp', str(timezone.now().timestamp())),
+    ])
+
+
+def generate_event_feed(contest, last_medals=None, since_id=None, since_time=None, chunk_size=1000):
+    """
+    Generates the CLICS XML event feed of a contest as a stream of bytes.
+
+    The document is serialized incrementally and runs are fetched in chunks ordered by id, so memory usage does not
+    depend on the number of submissions. If `since_id` or `since_time` is given, only runs with a larger id or
+    judged after that time are included, and the static parts of the feed (contest info, languages, problems and
+    teams) are omitted. The finalization element is only written if `last_medals` is given.
+    """
+    incremental = since_id is not None or since_time is not None
+    problem_index = get_problem_index(contest)
+    teams = get_teams(contest)
+    team_index = {profile.user_id: id for id, profile in enumerate(teams, start=1)}
+    first_accepted = get_first_accepted(contest)
+
+    output = _ChunkedOutput()
+    with ET.xmlfile(output, encoding='utf-8') as xf:
+        xf.write_declaration()
+        with xf.element('contest'):
+            xf.write('\n')
+            if not incremental:
+                write_info(xf, contest)
+                write_languages(xf)
+                write_region(xf)
+                write_judgements(xf)
+                write_problems(xf, problem_index)
+                write_teams(xf, teams)
+
+            for runs in keyset_chunks(get_runs(contest, since_id, since_time), ('submission_id',), chunk_size):
+                for run in runs:
+                    write_run(xf, contest, run, problem_index, team_index, first_accepted)
+                xf.flush()
+                yield output.pop()
+
+            if last_medals is not None:
+                write_finalized(xf, last_medals)
+    yield output.pop()
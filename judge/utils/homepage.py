@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+
+from judge.models import Comment, Contest, Language, Problem, Profile, Submission
+
+# Bump whenever the contents of the bundle change, so that a deployment never reads bundles cached by older code.
+HOMEPAGE_BUNDLE_VERSION = 1
+HOMEPAGE_BUNDLE_KEY = 'homepage_bundle:v%d' % HOMEPAGE_BUNDLE_VERSION
+
+
+def _top_users(field):
+    return list(Profile.objects.order_by('-' + field)
+                .filter(**{field + '__gt': 0, 'is_unlisted': False})
+                .only('user', field, 'display_rank', 'display_badge', 'rating', 'username_display_override')
+                .select_related('user', 'display_badge')
+                [:settings.VNOJ_HOMEPAGE_TOP_USERS_COUNT])
+
+
+def build_homepage_bundle():
+    """Computes the parts of the homepage sidebar that are the same for every user."""
+    comments = Comment.most_recent(AnonymousUser(), 10)
+    for comment in comments:
+        # Cached on the instance, and so in the bundle.
+        comment.link
+
+    return {
+        'comments': comments,
+        'new_problems': list(Problem.get_public_problems().order_by('-date', 'code')
+                             [:settings.DMOJ_BLOG_NEW_PROBLEM_COUNT]),
+        'top_pp_users': _top_users('performance_points'),
+        'top_contrib': _top_users('contribution_points'),
+        # Contests that have not ended yet. They are split into current and future ones when the bundle is used, so
+        # that a contest starting between two refreshes moves to the right list.
+        'contests': list(Contest.get_public_contests().filter(end_time__gt=timezone.now()).order_by('start_time')),
+        'user_count': Profile.objects.count(),
+        'problem_count': Problem.get_public_problems().count(),
+        'submission_count': Submission.objects.aggregate(max_id=Max('id'))['max_id'] or 0,
+        'language_count': Language.objects.count(),
+    }
+
+
+def refresh_homepage_bundle():
+    bundle = build_homepage_bundle()
+    cache.set(HOMEPAGE_BUNDLE_KEY, bundle, settings.VNOJ_HOMEPAGE_BUNDLE_TTL)
+    return bundle
+
+
+def get_homepage_bundle():
+    bundle = cache.get(HOMEPAGE_BUNDLE_KEY)
+    if bundle is None:
+        bundle = refresh_homepage_bundle()
+    return bundle
+
+
+def invalidate_homepage_bundle():
+    cache.delete(HOMEPAGE_BUNDLE_KEY)
+
+
+def get_private_contests(user, public_contests):
+    """Returns the unfinished contests visible to `user` that are not in the public contests of the bundle."""
+    if not user.is_authenticated:
+        return []
+    return list(Contest.get_visible_contests(user).filter(is_visible=True, end_time__gt=timezone.now())
+                .exclude(id__in=[contest.id for contest in public_contests]))
@@ -1,7 +1,42 @@
+from functools import reduce
 from itertools import zip_longest
+from operator import or_
+
+from django.db.models import Q
 
 
 def chunk(iterable, size):
     fill = object()
     for group in zip_longest(*[iter(iterable)] * size, fillvalue=fill):
         yield [item for item in group if item is not fill]
+
+
+def _keyset_filter(ordering, values):
+    filters = []
+    for i, (field, value) in enumerate(zip(ordering, values)):
+        name = field.lstrip('-')
+        q = Q(**{'%s__%s' % (name, 'lt' if field.startswith('-') else 'gt'): value})
+        for previous, previous_value in zip(ordering[:i], values[:i]):
+            q &= Q(**{previous.lstrip('-'): previous_value})
+        filters.append(q)
+    return reduce(or_, filters)
+
+
+def keyset_chunks(queryset, ordering, size):
+    """
+    Yields the rows of a named `values_list` queryset in lists of at most `size` rows, ordered by `ordering`.
+
+    Every chunk is fetched with a separate query that continues after the last row of the previous chunk, so unlike
+    `QuerySet.iterator`, memory usage does not grow with the size of the result set, even on MySQL which does not
+    support server-side cursors. All fields in `ordering` must be selected, non-null, and together unique.
+    """
+    queryset = queryset.order_by(*ordering)
+    fields = [field.lstrip('-') for field in ordering]
+    page = queryset
+    while True:
+        rows = list(page[:size])
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        page = queryset.filter(_keyset_filter(ordering, [getattr(rows[-1], field) for field in fields]))
@@ -0,0 +1,217 @@
+import logging
+import math
+import uuid
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+logger = logging.getLogger('judge.rank_index')
+
+# Profile fields with a rank index, each ordering the listed profiles from the highest value.
+RANK_INDEX_FIELDS = ('performance_points', 'points', 'problem_count', 'rating', 'contribution_points')
+
+# The index is stored in the cache and copied into each process, which checks a small version key to find out
+# whether its copy is current.
+INDEX_TIMEOUT = 86400
+PATCH_LOCK_TIMEOUT = 10
+
+_local_indexes = {}
+
+
+def index_key(field):
+    return 'rank_index:%s' % field
+
+
+def version_key(field):
+    return 'rank_index_version:%s' % field
+
+
+def patch_lock_key(field):
+    return 'rank_index_lock:%s' % field
+
+
+def score_key(value):
+    # Keys are sorted ascending, so the highest value goes first. Profiles without a value, i.e. unrated ones, are
+    # last, like NULLs in a descending sort on MySQL.
+    return math.inf if value is None else -float(value)
+
+
+class RankIndex:
+    """
+    The listed profiles in the order of the leaderboard for one field: by the field descending, then by id.
+
+    The index is two arrays, the ids of the profiles and their sort keys, which is 12 bytes per profile. Looking up
+    the position or rank of a profile takes a dict lookup and a binary search, and a slice of the leaderboard at any
+    depth is a slice of the arrays.
+    """
+
+    def __init__(self, field, ids, keys):
+        self.field = field
+        self.ids = ids
+        self.keys = keys
+
+    @classmethod
+    def build(cls, field):
+        from judge.models import Profile
+        ids, keys = array('i'), array('d')
+        for id, value in (Profile.objects.filter(is_unlisted=False).order_by('-' + field, 'id')
+                          .values_list('id', field).iterator()):
+            ids.append(id)
+            keys.append(score_key(value))
+        return cls(field, ids, keys)
+
+    def dumps(self):
+        return zlib.compress(self.ids.tobytes() + self.keys.tobytes())
+
+    @classmethod
+    def loads(cls, field, data):
+        data = zlib.decompress(data)
+        count = len(data) // (array('i').itemsize + array('d').itemsize)
+        ids, keys = array('i'), array('d')
+        ids.frombytes(data[:count * ids.itemsize])
+        keys.frombytes(data[count * ids.itemsize:])
+        return cls(field, ids, keys)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @cached_property
+    def positions(self):
+        return {id: position for position, id in enumerate(self.ids)}
+
+    def position(self, profile_id):
+        """Returns the 0-based position of a listed profile in the leaderboard, or None."""
+        return self.positions.get(profile_id)
+
+    def position_of(self, value, profile_id):
+        """Returns the position a profile with `value` would have in the leaderboard, whether it is listed or not."""
+        key = score_key(value)
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        return bisect_left(self.ids, profile_id, low, high)
+
+    def rank_at(self, position):
+        """
+        Returns the rank at a position, where ties share the rank of the first profile with the same value. Profiles
+        without a value all share the rank after the last profile with one.
+        """
+        return bisect_left(self.keys, self.keys[position]) + 1
+
+    def rank(self, profile_id):
+        position = self.position(profile_id)
+        return None if position is None else self.rank_at(position)
+
+    def rank_of(self, value):
+        """Returns one more than the number of listed profiles with a higher value than `value`."""
+        if value is None:
+            return None
+        return bisect_left(self.keys, score_key(value)) + 1
+
+    def move(self, profile_id, value):
+        """Moves a profile to the place of `value`, or removes it if `value` is `Ellipsis`."""
+        try:
+            position = self.ids.index(profile_id)
+        except ValueError:
+            pass
+        else:
+            del self.ids[position]
+            del self.keys[position]
+
+        if value is not Ellipsis:
+            position = self.position_of(value, profile_id)
+            self.ids.insert(position, profile_id)
+            self.keys.insert(position, score_key(value))
+        self.__dict__.pop('positions', None)
+
+
+def store_rank_index(index):
+    cache.set(index_key(index.field), index.dumps(), INDEX_TIMEOUT)
+    # A version never reused, so that no process mistakes a new index for its copy of an old one.
+    version = uuid.uuid4().hex
+    cache.set(version_key(index.field), version, INDEX_TIMEOUT)
+    _local_indexes[index.field] = (version, index)
+
+
+def rebuild_rank_index(field):
+    index = RankIndex.build(field)
+    store_rank_index(index)
+    return index
+
+
+def get_rank_index(field):
+    """Returns the current rank index of `field`, building it if there is none."""
+    version = cache.get(version_key(field))
+    local = _local_indexes.get(field)
+    if version is not None and local is not None and local[0] == version:
+        return local[1]
+
+    data = cache.get(index_key(field)) if version is not None else None
+    if data is None:
+        return rebuild_rank_index(field)
+
+    index = RankIndex.loads(field, data)
+    _local_indexes[field] = (version, index)
+    return index
+
+
+def patch_rank_indexes(changes):
+    """
+    Moves profiles in the rank indexes to their current values, given a dict of profile ids to the fields that
+    changed, fetching and storing each index once. An index being patched by someone else is left to the periodic
+    rebuild.
+    """
+    from judge.models import Profile
+    fields = {field for changed in changes.values() for field in changed}
+    profiles = list(Profile.objects.filter(id__in=changes).only('is_unlisted', *fields))
+    for field in fields:
+        if not cache.add(patch_lock_key(field), True, PATCH_LOCK_TIMEOUT):
+            logger.info('Rank index of %s is busy, skipping update of %d profiles', field, len(profiles))
+            continue
+        try:
+            data = cache.get(index_key(field))
+            if data is None:
+                continue
+            index = RankIndex.loads(field, data)
+            for profile in profiles:
+                if field in changes[profile.id]:
+                    index.move(profile.id, Ellipsis if profile.is_unlisted else getattr(profile, field))
+            store_rank_index(index)
+        finally:
+            cache.delete(patch_lock_key(field))
+
+
+class RankedProfiles:
+    """
+    A lazy sequence of (rank, profile) in the order of a rank index, fetching profiles from `queryset` only for the
+    part that is iterated. Slicing it is free, so a paginator can take a page at any depth.
+    """
+
+    def __init__(self, index, queryset, start=0, stop=None):
+        self.index = index
+        self.queryset = queryset
+        self.start = start
+        self.stop = len(index) if stop is None else min(stop, len(index))
+
+    def __len__(self):
+        return max(0, self.stop - self.start)
+
+    def count(self):
+        return len(self)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step is not None:
+                raise ValueError('RankedProfiles does not support slicing with a step.')
+            start, stop, _ = item.indices(len(self))
+            return RankedProfiles(self.index, self.queryset, self.start + start, self.start + max(start, stop))
+        return list(self)[item]
+
+    def __iter__(self):
+        ids = self.index.ids[self.start:self.stop]
+        profiles = self.queryset.in_bulk(list(ids))
+        for position, id in enumerate(ids, self.start):
+            # Profiles deleted or unlisted since the index was built are skipped.
+            if id in profiles:
+                yield self.index.rank_at(position), profiles[id]
@@ -0,0 +1,222 @@
+import re
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from multiprocessing import current_process, get_context
+
+__all__ = ['get_language_family', 'tokenize', 'fingerprint', 'find_similar_pairs']
+
+C_KEYWORDS = frozenset("""
+    auto break case catch char class const continue default delete do double else enum extends extern final finally
+    float for goto if implements import include int long namespace new package private protected public return short
+    signed sizeof static struct switch template this throw throws try typedef typename union unsigned using virtual
+    void volatile while define
+""".split())
+
+PYTHON_KEYWORDS = frozenset("""
+    and as assert async await break class continue def del elif else except finally for from global if import in is
+    lambda nonlocal not or pass raise return try while with yield print input range len
+""".split())
+
+PASCAL_KEYWORDS = frozenset("""
+    and array begin case const div do downto else end file for function goto if in label mod nil not of or packed
+    procedure program record repeat set then to type until var while with uses break continue exit read readln write
+    writeln
+""".split())
+
+LANGUAGE_FAMILIES = {
+    'c': (re.compile(r"""
+        (?P<skip>\s+|//[^\n]*|/\*.*?(?:\*/|$)|\#\s*include[^\n]*)
+        |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+        |(?P<number>(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?)[uUlLfF]*)
+        |(?P<name>[A-Za-z_]\w*)
+        |(?P<op>\S)
+    """, re.S | re.X), C_KEYWORDS, False),
+    'python': (re.compile(r"""
+        (?P<skip>\s+|\#[^\n]*)
+        |(?P<string>[rRbBuUfF]{0,2}(?:"{3}(?:\\.|.)*?(?:"{3}|$)|'{3}(?:\\.|.)*?(?:'{3}|$)
+            |"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'))
+        |(?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?[jJ]?)
+        |(?P<name>[A-Za-z_]\w*)
+        |(?P<op>\S)
+    """, re.S | re.X), PYTHON_KEYWORDS, False),
+    'pascal': (re.compile(r"""
+        (?P<skip>\s+|//[^\n]*|\{.*?(?:\}|$)|\(\*.*?(?:\*\)|$))
+        |(?P<string>'(?:''|[^'\n])*')
+        |(?P<number>\$[0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?)
+        |(?P<name>[A-Za-z_]\w*)
+        |(?P<op>\S)
+    """, re.S | re.X), PASCAL_KEYWORDS, True),
+}
+
+# Maps Language.common_name to the tokenizer family used for that language.
+# Anything not listed is tokenized as a C-like language, which is a reasonable approximation for most languages
+# supported by the judge.
+LANGUAGE_FAMILY_MAPPING = {
+    'Python': 'python',
+    'PyPy': 'python',
+    'Pascal': 'pascal',
+}
+
+NORMALIZED_TOKENS = {
+    'string': 'S',
+    'number': 'N',
+    'name': 'I',
+}
+
+
+def get_language_family(common_name):
+    return LANGUAGE_FAMILY_MAPPING.get(common_name, 'c')
+
+
+def tokenize(source, family):
+    """
+    Tokenizes a source file into a list of normalized tokens.
+
+    Whitespace and comments are dropped, literals and identifiers are replaced by placeholders, so that renaming
+    variables or reformatting code does not change the token stream. Keywords and operators are kept verbatim.
+    """
+    regex, keywords, case_insensitive = LANGUAGE_FAMILIES[family]
+    tokens = []
+    for match in regex.finditer(source):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        if kind == 'name':
+            value = match.group()
+            if case_insensitive:
+                value = value.lower()
+            tokens.append(value if value in keywords else 'I')
+        elif kind == 'op':
+            tokens.append(match.group())
+        else:
+            tokens.append(NORMALIZED_TOKENS[kind])
+    return tokens
+
+
+@lru_cache(maxsize=None)
+def _token_id(token):
+    return zlib.crc32(token.encode('utf-8'))
+
+
+def fingerprint(source, family, k, window):
+    """
+    Computes the winnowed fingerprint set of a source file.
+
+    Every k-gram of normalized tokens is hashed, and the minimum hash of every window of `window` consecutive
+    k-grams is selected, as described in "Winnowing: Local Algorithms for Document Fingerprinting" by Schleimer et al.
+    Any match of at least `window + k - 1` tokens is guaranteed to share a fingerprint.
+    """
+    # Hashes of tuples of ints do not depend on PYTHONHASHSEED, so fingerprints computed in different processes
+    # are comparable.
+    tokens = [_token_id(token) for token in tokenize(source, family)]
+    if len(tokens) < k:
+        return frozenset([hash(tuple(tokens))]) if tokens else frozenset()
+
+    hashes = list(map(hash, zip(*(tokens[i:] for i in range(k)))))
+    if len(hashes) <= window:
+        return frozenset([min(hashes)])
+    return frozenset(map(min, zip(*(hashes[i:] for i in range(window)))))
+
+
+def _fingerprint_many(sources, family, k, window):
+    return [fingerprint(source, family, k, window) for source in sources]
+
+
+# The postings of the sources being scored, set once in each scoring worker instead of being sent with every chunk.
+_scoring_state = None
+
+
+def _set_scoring_state(state):
+    global _scoring_state
+    _scoring_state = state
+
+
+def _score_pairs(firsts):
+    doc_postings, sizes, threshold = _scoring_state
+    result = []
+    for first in firsts:
+        if not sizes[first]:
+            continue
+        # Counter.update counts in C, which is much faster than looping over pairs in Python.
+        shared = Counter()
+        for docs in doc_postings[first]:
+            shared.update(docs)
+        for second, count in shared.items():
+            if second <= first:
+                continue
+            similarity = min(count / min(sizes[first], sizes[second]), 1.0)
+            if similarity >= threshold:
+                result.append((first, second, similarity))
+    return result
+
+
+def _process_pool(workers, initializer=None, initargs=()):
+    # Spawned workers start from a fresh interpreter, so they do not inherit the threads and connections of a
+    # worker that forks them.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=initializer,
+                               initargs=initargs)
+
+
+def find_similar_pairs(sources, family, k=12, window=8, threshold=0.5, common_ratio=0.3, limit=None, workers=None,
+                       chunk_size=64):
+    """
+    Finds pairs of similar sources.
+
+    `sources` is a dictionary mapping an arbitrary key to source code. Returns a list of `(key_a, key_b, similarity)`
+    tuples, sorted by decreasing similarity, where similarity is the fraction of the smaller fingerprint set shared
+    with the other source.
+
+    Fingerprints are collected into an inverted index, so that only pairs sharing at least one fingerprint are ever
+    scored. Fingerprints present in more than `common_ratio` of all sources (e.g. shared templates and boilerplate)
+    are ignored entirely.
+
+    Fingerprinting and scoring are split between `workers` processes, all CPUs if None, unless there are no more
+    than `chunk_size` sources. Daemonic processes, such as the workers of a celery prefork pool, may not have
+    children, so they do all the work themselves.
+    """
+    keys = list(sources)
+    if len(keys) < 2:
+        return []
+
+    texts = [sources[key] for key in keys]
+    parallel = workers != 1 and len(keys) > chunk_size and not current_process().daemon
+    if parallel:
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with _process_pool(workers) as executor:
+            results = executor.map(partial(_fingerprint_many, family=family, k=k, window=window), chunks)
+            fingerprints = [fp for chunk in results for fp in chunk]
+    else:
+        fingerprints = _fingerprint_many(texts, family, k, window)
+
+    index = defaultdict(list)
+    for doc, prints in enumerate(fingerprints):
+        for value in prints:
+            index[value].append(doc)
+
+    max_postings = max(2, int(common_ratio * len(keys)))
+    doc_postings = [[index[value] for value in prints if len(index[value]) <= max_postings]
+                    for prints in fingerprints]
+    sizes = list(map(len, doc_postings))
+
+    state = doc_postings, sizes, threshold
+    if parallel:
+        # Each worker receives the postings once, when it starts. Earlier sources are compared with more of the
+        # sources after them, so each chunk takes every n-th source to even out the work.
+        chunk_count = -(-len(keys) // chunk_size)
+        with _process_pool(workers, _set_scoring_state, (state,)) as executor:
+            results = executor.map(_score_pairs, [range(i, len(keys), chunk_count) for i in range(chunk_count)])
+            pairs = [pair for chunk in results for pair in chunk]
+    else:
+        _set_scoring_state(state)
+        try:
+            pairs = _score_pairs(range(len(keys)))
+        finally:
+            _set_scoring_state(None)
+
+    result = [(keys[first], keys[second], similarity) for first, second, similarity in pairs]
+    result.sort(key=lambda pair: -pair[2])
+    if limit is not None:
+        result = result[:limit]
+    return result
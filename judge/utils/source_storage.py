@@ -0,0 +1,136 @@
+import errno
+import hashlib
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ['DatabaseSourceStorage', 'FileSystemSourceStorage', 'compress_source', 'decompress_source',
+           'get_source_storage', 'load_sources', 'source_hash', 'store_sources']
+
+# Each blob starts with a byte naming its compression, so that blobs compressed differently can be read side by side.
+ZLIB = b'z'
+ZSTD = b's'
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def compress_source(source, compression='zstd', level=None):
+    """Compresses a source into a blob, with zlib if zstandard is not installed."""
+    data = source.encode('utf-8')
+    if compression == 'zstd' and zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=level or 10).compress(data)
+    return ZLIB + zlib.compress(data, level or 9)
+
+
+def decompress_source(blob):
+    blob = bytes(blob)
+    tag, data = blob[:1], blob[1:]
+    if tag == ZSTD:
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read sources compressed with zstd')
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if tag == ZLIB:
+        return zlib.decompress(data).decode('utf-8')
+    raise ValueError('unknown source compression: %r' % tag)
+
+
+class DatabaseSourceStorage:
+    """Stores blobs in the SourceBlob table, apart from the rows of the submissions."""
+
+    def save(self, blobs):
+        """Stores a dict of hash: compressed blob. Blobs that are already stored are left alone."""
+        from judge.models import SourceBlob
+        SourceBlob.objects.bulk_create([SourceBlob(hash=hash, data=blob) for hash, blob in blobs.items()],
+                                       ignore_conflicts=True)
+
+    def exists(self, hashes):
+        from judge.models import SourceBlob
+        return set(SourceBlob.objects.filter(hash__in=hashes).values_list('hash', flat=True))
+
+    def load(self, hashes):
+        """Returns a dict of hash: compressed blob for the hashes that are stored."""
+        from judge.models import SourceBlob
+        return dict(SourceBlob.objects.filter(hash__in=hashes).values_list('hash', 'data'))
+
+
+class FileSystemSourceStorage:
+    """Stores each blob in a file named by its hash, in directories of the first two bytes of the hash."""
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else settings.VNOJ_SOURCE_STORAGE_ROOT
+
+    def path(self, hash):
+        return os.path.join(self.root, hash[:2], hash[2:4], hash)
+
+    def save(self, blobs):
+        for hash, blob in blobs.items():
+            path = self.path(hash)
+            if os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first, so that a reader never sees half a blob.
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(blob)
+                os.replace(temp, path)
+            except BaseException:
+                os.unlink(temp)
+                raise
+
+    def exists(self, hashes):
+        return {hash for hash in hashes if os.path.exists(self.path(hash))}
+
+    def load(self, hashes):
+        blobs = {}
+        for hash in hashes:
+            try:
+                with open(self.path(hash), 'rb') as f:
+                    blobs[hash] = f.read()
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        return blobs
+
+
+_storage = None
+
+
+def get_source_storage():
+    global _storage
+    if _storage is None:
+        _storage = import_string(settings.VNOJ_SOURCE_STORAGE)()
+    return _storage
+
+
+def store_sources(sources):
+    """
+    Stores sources, compressing only those not stored yet. Returns their hashes, in the same order, and a dict of
+    hash: blob of the blobs that were newly stored.
+    """
+    hashes = [source_hash(source) for source in sources]
+    unique = dict(zip(hashes, sources))
+    storage = get_source_storage()
+    existing = storage.exists(unique.keys())
+    blobs = {hash: compress_source(source, settings.VNOJ_SOURCE_COMPRESSION)
+             for hash, source in unique.items() if hash not in existing}
+    if blobs:
+        storage.save(blobs)
+    return hashes, blobs
+
+
+def load_sources(hashes):
+    """Returns a dict of hash: source for the hashes that are stored."""
+    if not hashes:
+        return {}
+    return {hash: decompress_source(blob) for hash, blob in get_source_storage().load(hashes).items()}
@@ -0,0 +1,67 @@
+import json
+import struct
+import zlib
+
+__all__ = ['pack_test_cases', 'unpack_test_case_times', 'unpack_test_cases']
+
+# The packed test cases of a submission are a header, a fixed-size record per case, then the text fields of all
+# the cases, compressed together since the feedback of one case is usually repeated in the others.
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BI')
+# case, status, time, memory, points, total, batch, and a bitmask of which of time to batch are None
+RECORD = struct.Struct('<i3sddddiB')
+NULLABLE_FIELDS = ('time', 'memory', 'points', 'total', 'batch')
+TEXT_FIELDS = ('feedback', 'extended_feedback', 'output')
+
+
+def pack_test_cases(cases):
+    """Packs test cases, which may be any objects with the fields of `SubmissionTestCase`, into bytes."""
+    records = []
+    texts = []
+    for case in cases:
+        values = [getattr(case, field) for field in NULLABLE_FIELDS]
+        nulls = 0
+        for i, value in enumerate(values):
+            if value is None:
+                nulls |= 1 << i
+                values[i] = 0
+        records.append(RECORD.pack(case.case, case.status.encode('ascii'), *values, nulls))
+        texts.append([getattr(case, field) or '' for field in TEXT_FIELDS])
+
+    text_data = zlib.compress(json.dumps(texts, separators=(',', ':')).encode('utf-8'), 9)
+    return HEADER.pack(FORMAT_VERSION, len(records)) + b''.join(records) + text_data
+
+
+def _check_header(data):
+    version, count = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError('unknown test case archive version: %d' % version)
+    return count
+
+
+def unpack_test_case_times(data):
+    """Returns the execution time of each packed test case, or None, without decompressing their text."""
+    data = bytes(data)
+    count = _check_header(data)
+    return [None if nulls & 1 else time
+            for case, status, time, memory, points, total, batch, nulls in RECORD.iter_unpack(
+                data[HEADER.size:HEADER.size + count * RECORD.size])]
+
+
+def unpack_test_cases(data):
+    """Returns the fields of packed test cases as a list of dicts, in the order they were packed."""
+    data = bytes(data)
+    count = _check_header(data)
+
+    offset = HEADER.size
+    texts = json.loads(zlib.decompress(data[offset + count * RECORD.size:]).decode('utf-8'))
+
+    cases = []
+    for i in range(count):
+        case, status, *values, nulls = RECORD.unpack_from(data, offset + i * RECORD.size)
+        fields = {'case': case, 'status': status.rstrip(b'\0').decode('ascii')}
+        for j, (field, value) in enumerate(zip(NULLABLE_FIELDS, values)):
+            fields[field] = None if nulls & (1 << j) else value
+        fields.update(zip(TEXT_FIELDS, texts[i]))
+        cases.append(fields)
+    return cases
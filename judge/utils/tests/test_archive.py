@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+
+from judge.utils.archive import JSONObjectSpool, ZipArchiveWriter
+
+
+class ZipArchiveWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.zip')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check_archive(self, background):
+        source = os.path.join(self.directory.name, 'source.txt')
+        with open(source, 'w') as f:
+            f.write('from disk')
+
+        with ZipArchiveWriter(self.path, background=background, max_pending=2) as writer:
+            for i in range(100):
+                writer.writestr('entries/%d.txt' % i, 'entry %d' % i)
+            writer.write(source, 'disk.txt')
+            writer.writefile(io.BytesIO(b'from file'), 'file.txt')
+
+        with zipfile.ZipFile(self.path) as archive:
+            self.assertEqual(len(archive.namelist()), 102)
+            self.assertEqual(archive.read('entries/42.txt'), b'entry 42')
+            self.assertEqual(archive.read('disk.txt'), b'from disk')
+            self.assertEqual(archive.read('file.txt'), b'from file')
+
+    def test_foreground(self):
+        self.check_archive(background=False)
+
+    def test_background(self):
+        self.check_archive(background=True)
+
+    def test_background_error(self):
+        with self.assertRaises(FileNotFoundError):
+            with ZipArchiveWriter(self.path, background=True) as writer:
+                writer.write(os.path.join(self.directory.name, 'missing'), 'missing.txt')
+
+
+class JSONObjectSpoolTestCase(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(json.load(JSONObjectSpool().finish()), {})
+
+    def test_matches_dumps(self):
+        data = {1: {'b': 1, 'a': [1, 2]}, 2: {'c': None}, 10: {}}
+        spool = JSONObjectSpool()
+        for key, value in data.items():
+            spool.add(key, value)
+        self.assertEqual(spool.finish().read().decode('utf-8'), json.dumps(data, indent=4, sort_keys=True))
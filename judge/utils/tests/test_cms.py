@@ -0,0 +1,48 @@
+import unittest
+
+from judge.utils.cms import CSVRanking
+
+RANKING = """User,Username,Team,A,A (status),B,B (status),Global,Global (status)
+Nguyễn Văn A,nva,T1,100,,50.5,,150.5,
+Trần Thị B,ttb,T2,100,,100,,200,
+Lê C,lec,T1,0,,0,,0,
+
+"""
+
+
+class CSVRankingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ranking = CSVRanking.parse(RANKING)
+
+    def test_parse(self):
+        self.assertEqual(self.ranking.problems, ['A', 'B'])
+        self.assertEqual(self.ranking.rows, [
+            ('ttb', 'Trần Thị B', (100.0, 100.0), 200.0),
+            ('nva', 'Nguyễn Văn A', (100.0, 50.5), 150.5),
+            ('lec', 'Lê C', (0.0, 0.0), 0.0),
+        ])
+
+    def test_parse_without_team(self):
+        ranking = CSVRanking.parse('User,Username,A,A (status),Global,Global (status)\nA,a,10,,10,\n')
+        self.assertEqual(ranking.problems, ['A'])
+        self.assertEqual(ranking.rows, [('a', 'A', (10.0,), 10.0)])
+
+    def test_search(self):
+        self.assertEqual(self.ranking.search(''), range(3))
+        self.assertEqual(self.ranking.search('NVA'), [1])
+        self.assertEqual(self.ranking.search('trần'), [0])
+        self.assertEqual(self.ranking.search('  l '), [2])
+        self.assertEqual(self.ranking.search('xyz'), [])
+
+    def test_round_trip(self):
+        ranking = CSVRanking.loads(self.ranking.dumps())
+        self.assertEqual(ranking.problems, self.ranking.problems)
+        self.assertEqual(ranking.rows, self.ranking.rows)
+
+    def test_iter_csv(self):
+        self.assertEqual(''.join(self.ranking.iter_csv()).splitlines(), [
+            'Rank,Username,User,A,B,Global',
+            '1,ttb,Trần Thị B,100,100,200',
+            '2,nva,Nguyễn Văn A,100,50.5,150.5',
+            '3,lec,Lê C,0,0,0',
+        ])
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.models import Comment, Language
+from judge.models.tests.util import CommonDataMixin, create_contest, create_problem
+from judge.utils.homepage import HOMEPAGE_BUNDLE_KEY, build_homepage_bundle, get_homepage_bundle, \
+    get_private_contests
+
+
+class HomepageBundleTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        now = timezone.now()
+        self.public_problem = create_problem(code='public', is_public=True)
+        create_problem(code='private', is_public=False)
+
+        self.public_contest = create_contest(key='public', is_visible=True)
+        create_contest(key='private', is_visible=True, is_private=True, private_contestants=('normal',))
+        create_contest(key='ended', is_visible=True, start_time=now - timezone.timedelta(days=2),
+                       end_time=now - timezone.timedelta(days=1))
+
+        author = self.users['normal'].profile
+        self.comment = Comment.objects.create(author=author, page='p:public', body='public comment')
+        Comment.objects.create(author=author, page='p:private', body='private comment')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bundle(self):
+        bundle = build_homepage_bundle()
+        # The bundle is the same for everyone, so it only has what anonymous users can see.
+        self.assertEqual([comment.page for comment in bundle['comments']], ['p:public'])
+        self.assertEqual([problem.code for problem in bundle['new_problems']], ['public'])
+        self.assertEqual([contest.key for contest in bundle['contests']], ['public'])
+        self.assertEqual(bundle['problem_count'], 1)
+        self.assertEqual(bundle['language_count'], Language.objects.count())
+
+    def test_private_contests(self):
+        public = build_homepage_bundle()['contests']
+        self.assertEqual([contest.key for contest in get_private_contests(self.users['normal'], public)],
+                         ['private'])
+        self.assertEqual([contest.key for contest in get_private_contests(self.users['superuser'], public)],
+                         ['private'])
+        self.assertEqual(get_private_contests(self.users['anonymous'], public), [])
+
+    def test_cached(self):
+        bundle = get_homepage_bundle()
+        with self.assertNumQueries(0):
+            self.assertEqual([contest.key for contest in get_homepage_bundle()['contests']],
+                             [contest.key for contest in bundle['contests']])
+
+    def assertInvalidatedBy(self, action):
+        get_homepage_bundle()
+        self.assertIsNotNone(cache.get(HOMEPAGE_BUNDLE_KEY))
+        action()
+        self.assertIsNone(cache.get(HOMEPAGE_BUNDLE_KEY))
+
+    def test_invalidated_by_problem(self):
+        self.assertInvalidatedBy(self.public_problem.save)
+
+    def test_invalidated_by_contest(self):
+        self.assertInvalidatedBy(self.public_contest.save)
+
+    def test_invalidated_by_comment(self):
+        self.assertInvalidatedBy(self.comment.save)
+        self.assertInvalidatedBy(lambda: Comment.objects.create(author=self.users['normal'].profile, page='p:public',
+                                                                body='new comment'))
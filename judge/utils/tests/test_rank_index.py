@@ -0,0 +1,84 @@
+import unittest
+from array import array
+
+from judge.utils.rank_index import RankIndex, RankedProfiles, score_key
+
+
+def make_index(profiles):
+    """Builds an index from (id, value) pairs, the way `RankIndex.build` reads them from the database."""
+    ordered = sorted(profiles, key=lambda profile: (score_key(profile[1]), profile[0]))
+    return RankIndex('points', array('i', [id for id, _ in ordered]),
+                     array('d', [score_key(value) for _, value in ordered]))
+
+
+class FakeQuerySet:
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.fetched = []
+
+    def in_bulk(self, ids):
+        self.fetched.append(list(ids))
+        return {id: 'profile%d' % id for id in ids if id in self.ids}
+
+
+class RankIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = make_index([(1, 50), (2, 100), (3, 50), (4, 10), (5, None), (6, 100)])
+
+    def test_order(self):
+        self.assertEqual(list(self.index.ids), [2, 6, 1, 3, 4, 5])
+
+    def test_ranks(self):
+        self.assertEqual([self.index.rank(id) for id in (2, 6, 1, 3, 4, 5)], [1, 1, 3, 3, 5, 6])
+        self.assertIsNone(self.index.rank(7))
+
+    def test_rank_of(self):
+        self.assertEqual(self.index.rank_of(100), 1)
+        self.assertEqual(self.index.rank_of(60), 3)
+        self.assertEqual(self.index.rank_of(50), 3)
+        self.assertEqual(self.index.rank_of(0), 6)
+        self.assertIsNone(self.index.rank_of(None))
+
+    def test_position_of(self):
+        self.assertEqual(self.index.position_of(100, 6), 1)
+        self.assertEqual(self.index.position_of(50, 2), 3)
+        self.assertEqual(self.index.position_of(None, 7), 6)
+        self.assertEqual(self.index.position_of(None, 1), 5)
+
+    def test_move(self):
+        self.index.move(4, 75)
+        self.assertEqual(list(self.index.ids), [2, 6, 4, 1, 3, 5])
+        self.assertEqual(self.index.rank(1), 4)
+
+        self.index.move(7, 50)
+        self.assertEqual(list(self.index.ids), [2, 6, 4, 1, 3, 7, 5])
+
+        self.index.move(2, Ellipsis)
+        self.assertEqual(list(self.index.ids), [6, 4, 1, 3, 7, 5])
+        self.assertIsNone(self.index.position(2))
+        self.assertEqual(self.index.rank(6), 1)
+
+    def test_dumps(self):
+        loaded = RankIndex.loads('points', self.index.dumps())
+        self.assertEqual(loaded.ids, self.index.ids)
+        self.assertEqual(loaded.keys, self.index.keys)
+
+    def test_ranked_profiles(self):
+        queryset = FakeQuerySet([1, 2, 3, 4, 5])
+        profiles = RankedProfiles(self.index, queryset)
+        self.assertEqual(len(profiles), 6)
+
+        page = profiles[1:4]
+        self.assertEqual(len(page), 3)
+        self.assertEqual(len(profiles[4:10]), 2)
+        self.assertEqual(queryset.fetched, [])
+
+        # Profile 6 is gone since the index was built.
+        self.assertEqual(list(page), [(3, 'profile1'), (3, 'profile3')])
+        self.assertEqual(list(profiles[0:2]), [(1, 'profile2')])
+        self.assertEqual(queryset.fetched, [[6, 1, 3], [2, 6]])
+
+    def test_ranked_profiles_unrated(self):
+        index = make_index([(1, 50), (2, None), (3, None)])
+        profiles = RankedProfiles(index, FakeQuerySet([1, 2, 3]))
+        self.assertEqual(list(profiles), [(1, 'profile1'), (2, 'profile2'), (2, 'profile3')])
@@ -0,0 +1,51 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+
+from judge.replica import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, use_replica
+
+
+@override_settings(VNOJ_DATABASE_REPLICA='replica', VNOJ_DATABASE_REPLICA_MAX_LAG=None,
+                   VNOJ_DATABASE_REPLICA_VIEWS=('all_submissions',))
+class ReplicaTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware(self.get_response)
+
+    def get_response(self, request):
+        # Stands in for the rest of the request, with the view reporting where it reads from.
+        self.middleware.process_view(request, None, (), {})
+        return HttpResponse(self.router.db_for_read(None) or 'default')
+
+    def serve(self, request):
+        request.resolver_match = resolve(request.path_info)
+        return self.middleware(request)
+
+    def test_router(self):
+        self.assertIsNone(self.router.db_for_read(None))
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+            self.assertEqual(self.router.db_for_write(None), 'default')
+        self.assertIsNone(self.router.db_for_read(None))
+        self.assertFalse(self.router.allow_migrate('replica', 'judge'))
+
+    @override_settings(VNOJ_DATABASE_REPLICA=None)
+    def test_no_replica(self):
+        with use_replica():
+            self.assertIsNone(self.router.db_for_read(None))
+
+    def test_views(self):
+        self.assertEqual(self.serve(self.factory.get('/submissions/')).content, b'replica')
+        self.assertEqual(self.serve(self.factory.get('/problems/')).content, b'default')
+        # The replica is only used within the request.
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_pin(self):
+        response = self.serve(self.factory.post('/submissions/'))
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/submissions/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.serve(request).content, b'default')
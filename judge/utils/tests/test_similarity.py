@@ -0,0 +1,126 @@
+import unittest
+from multiprocessing import current_process
+from unittest import mock
+
+from judge.utils.similarity import find_similar_pairs, fingerprint, get_language_family, tokenize
+
+CPP_SOURCE = """
+#include <bits/stdc++.h>
+using namespace std;
+
+int main() {
+    int n;
+    cin >> n;
+    long long sum = 0;
+    for (int i = 0; i < n; i++) {
+        int x;
+        cin >> x;
+        if (x % 2 == 0) sum += x;  // only even numbers
+    }
+    cout << sum << endl;
+    return 0;
+}
+"""
+
+CPP_RENAMED = """
+#include <iostream>
+using namespace std;
+/* renamed and reformatted */
+int main()
+{
+    int cnt; cin >> cnt;
+    long long total = 0;
+    for (int j = 0; j < cnt; j++)
+    {
+        int value; cin >> value;
+        if (value % 2 == 0) total += value;
+    }
+    cout << total << endl;
+    return 0;
+}
+"""
+
+CPP_DIFFERENT = """
+#include <bits/stdc++.h>
+using namespace std;
+
+string s;
+map<string, int> counts;
+
+int main() {
+    while (getline(cin, s)) {
+        counts[s]++;
+    }
+    for (auto &[key, value] : counts)
+        printf("%s %d\\n", key.c_str(), value);
+}
+"""
+
+
+class TokenizeTestCase(unittest.TestCase):
+    def test_normalization(self):
+        self.assertEqual(tokenize('int x = 42; // comment', 'c'), ['int', 'I', '=', 'N', ';'])
+        self.assertEqual(tokenize('s = "a /* b */"', 'c'), ['I', '=', 'S'])
+        self.assertEqual(tokenize("def f(x): return 'y'  # comment", 'python'),
+                         ['def', 'I', '(', 'I', ')', ':', 'return', 'S'])
+        self.assertEqual(tokenize("BEGIN { comment } WriteLn('it''s') END.", 'pascal'),
+                         ['begin', 'writeln', '(', 'S', ')', 'end', '.'])
+
+    def test_language_family(self):
+        self.assertEqual(get_language_family('Python'), 'python')
+        self.assertEqual(get_language_family('Pascal'), 'pascal')
+        self.assertEqual(get_language_family('C++'), 'c')
+        self.assertEqual(get_language_family('Unknown'), 'c')
+
+
+class FingerprintTestCase(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(fingerprint('', 'c', 5, 4), frozenset())
+
+    def test_short(self):
+        self.assertEqual(len(fingerprint('int x;', 'c', 5, 4)), 1)
+
+    def test_renaming_invariant(self):
+        self.assertEqual(fingerprint(CPP_SOURCE, 'c', 5, 4), fingerprint(CPP_RENAMED, 'c', 5, 4))
+
+
+class FindSimilarPairsTestCase(unittest.TestCase):
+    def test_too_few_sources(self):
+        self.assertEqual(find_similar_pairs({}, 'c'), [])
+        self.assertEqual(find_similar_pairs({1: CPP_SOURCE}, 'c'), [])
+
+    def test_pairs(self):
+        sources = {1: CPP_SOURCE, 2: CPP_DIFFERENT, 3: CPP_RENAMED}
+        pairs = find_similar_pairs(sources, 'c', k=5, window=4, workers=1)
+        self.assertEqual(len(pairs), 1)
+        first, second, similarity = pairs[0]
+        self.assertEqual((first, second), (1, 3))
+        self.assertAlmostEqual(similarity, 1.0)
+
+    def test_limit(self):
+        sources = {i: CPP_SOURCE for i in range(10)}
+        pairs = find_similar_pairs(sources, 'c', k=5, window=4, common_ratio=1, limit=5, workers=1)
+        self.assertEqual(len(pairs), 5)
+        for first, second, similarity in pairs:
+            self.assertLess(first, second)
+            self.assertAlmostEqual(similarity, 1.0)
+
+    def test_parallel(self):
+        sources = {i: [CPP_SOURCE, CPP_DIFFERENT, CPP_RENAMED][i % 3] + '\n' * i for i in range(12)}
+        serial = find_similar_pairs(sources, 'c', k=5, window=4, common_ratio=1, workers=1)
+        parallel = find_similar_pairs(sources, 'c', k=5, window=4, common_ratio=1, workers=2, chunk_size=2)
+        self.assertEqual(sorted(parallel), sorted(serial))
+
+    def test_daemon(self):
+        # As in a celery prefork worker, which may not start processes
+        process = current_process()
+        daemon = process.daemon
+        process.daemon = True
+        try:
+            with mock.patch('judge.utils.similarity.ProcessPoolExecutor') as executor:
+                pairs = find_similar_pairs({1: CPP_SOURCE, 2: CPP_DIFFERENT, 3: CPP_RENAMED}, 'c', k=5, window=4,
+                                           workers=2, chunk_size=1)
+            executor.assert_not_called()
+        finally:
+            process.daemon = daemon
+        self.assertEqual([(first, second) for first, second, similarity in pairs], [(1, 3)])
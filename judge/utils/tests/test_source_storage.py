@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+
+from judge.utils import source_storage
+from judge.utils.source_storage import FileSystemSourceStorage, compress_source, decompress_source, source_hash
+
+SOURCE = '#include <bits/stdc++.h>\nint main() { puts("Xin chào"); }\n' * 20
+
+
+class SourceCompressionTestCase(unittest.TestCase):
+    def test_zlib(self):
+        blob = compress_source(SOURCE, 'zlib')
+        self.assertEqual(blob[:1], source_storage.ZLIB)
+        self.assertLess(len(blob), len(SOURCE))
+        self.assertEqual(decompress_source(blob), SOURCE)
+
+    @unittest.skipIf(source_storage.zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        blob = compress_source(SOURCE, 'zstd')
+        self.assertEqual(blob[:1], source_storage.ZSTD)
+        self.assertEqual(decompress_source(blob), SOURCE)
+
+    def test_empty(self):
+        self.assertEqual(decompress_source(compress_source('')), '')
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            decompress_source(b'x' + SOURCE.encode('utf-8'))
+
+    def test_hash(self):
+        self.assertEqual(source_hash(SOURCE), source_hash(str(SOURCE)))
+        self.assertNotEqual(source_hash(SOURCE), source_hash(SOURCE + '\n'))
+
+
+class FileSystemSourceStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.storage = FileSystemSourceStorage(self.root.name)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_save_load(self):
+        hash = source_hash(SOURCE)
+        self.assertEqual(self.storage.exists([hash]), set())
+        self.assertEqual(self.storage.load([hash]), {})
+
+        blob = compress_source(SOURCE, 'zlib')
+        self.storage.save({hash: blob})
+        self.assertEqual(self.storage.exists([hash, 'ab' * 32]), {hash})
+        self.assertEqual(self.storage.load([hash, 'ab' * 32]), {hash: blob})
+
+        # Saving a stored blob again leaves it alone.
+        self.storage.save({hash: b'z'})
+        self.assertEqual(self.storage.load([hash]), {hash: blob})
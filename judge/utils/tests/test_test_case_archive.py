@@ -0,0 +1,41 @@
+import unittest
+from types import SimpleNamespace
+
+from judge.utils.test_case_archive import pack_test_cases, unpack_test_case_times, unpack_test_cases
+
+
+def make_case(**kwargs):
+    fields = {'case': 1, 'status': 'AC', 'time': 0.5, 'memory': 1024.0, 'points': 1.0, 'total': 1.0, 'batch': None,
+              'feedback': '', 'extended_feedback': '', 'output': ''}
+    fields.update(kwargs)
+    return SimpleNamespace(**fields)
+
+
+class TestCaseArchiveTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        cases = [
+            make_case(case=1, batch=1, feedback='ok'),
+            make_case(case=2, status='WA', points=0.0, batch=1, extended_feedback='expected 1, got 2\n'),
+            make_case(case=3, status='TLE', time=None, memory=None, points=None, total=None, output='Xin chào'),
+            make_case(case=4, status='SC', batch=2),
+        ]
+        unpacked = unpack_test_cases(pack_test_cases(cases))
+        self.assertEqual(unpacked, [vars(case) for case in cases])
+
+    def test_empty(self):
+        self.assertEqual(unpack_test_cases(pack_test_cases([])), [])
+        self.assertEqual(unpack_test_case_times(pack_test_cases([])), [])
+
+    def test_times(self):
+        cases = [make_case(case=1, time=0.25), make_case(case=2, time=None, memory=None), make_case(case=3, time=1.5)]
+        self.assertEqual(unpack_test_case_times(pack_test_cases(cases)), [0.25, None, 1.5])
+
+    def test_size(self):
+        cases = [make_case(case=i, feedback='Accepted', extended_feedback='ok, 100 numbers') for i in range(100)]
+        self.assertLess(len(pack_test_cases(cases)), 100 * 50)
+
+    def test_unknown_version(self):
+        data = bytearray(pack_test_cases([make_case()]))
+        data[0] = 255
+        with self.assertRaises(ValueError):
+            unpack_test_cases(data)
@@ -648,7 +648,7 @@ class APISubmissionDetail(APILoginRequiredMixin, APIDetailView):
 
     def get_object_data(self, submission):
         cases = []
-        for batch in group_test_cases(submission.test_cases.all())[0]:
+        for batch in group_test_cases(submission.get_test_cases())[0]:
             batch_cases = [
                 {
                     'type': 'case',
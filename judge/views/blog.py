@@ -1,8 +1,7 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.db import IntegrityError
-from django.db.models import Count, FilteredRelation, Max, Q
+from django.db.models import Count, FilteredRelation, Q
 from django.db.models.expressions import F, Value
 from django.db.models.functions import Coalesce
 from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
@@ -16,13 +15,11 @@ from django.views.generic.detail import SingleObjectMixin, View
 from reversion import revisions
 
 from judge.comments import CommentedDetailView
-from judge.dblock import LockModel
 from judge.forms import BlogPostForm
-from judge.models import (BlogPost, BlogVote, Comment, Contest, Language,
-                          Problem, Profile, Submission, Ticket)
+from judge.models import BlogPost, Comment, Ticket
 from judge.tasks import on_new_blogpost
-from judge.utils.cachedict import CacheDict
 from judge.utils.diggpaginator import DiggPaginator
+from judge.utils.homepage import get_homepage_bundle, get_private_contests
 from judge.utils.opengraph import generate_opengraph
 from judge.utils.tickets import filter_visible_tickets
 from judge.utils.unicode import remove_accents
@@ -62,25 +59,8 @@ def vote_blog(request, delta):
     if blog.authors.filter(id=request.profile.id).exists():
         return HttpResponseBadRequest(_('You cannot vote your own blog'), content_type='text/plain')
 
-    vote = BlogVote()
-    vote.blog_id = blog_id
-    vote.voter = request.profile
-    vote.score = delta
-
-    while True:
-        try:
-            vote.save()
-        except IntegrityError:
-            with LockModel(write=(BlogVote,)):
-                try:
-                    vote = BlogVote.objects.get(blog_id=blog_id, voter=request.profile)
-                except BlogVote.DoesNotExist:
-                    # We must continue racing in case this is exploited to manipulate votes.
-                    continue
-                return HttpResponseBadRequest(_('You cannot vote twice.'), content_type='text/plain')
-        else:
-            BlogPost.objects.get(id=blog_id).vote(delta)
-        break
+    if not blog.cast_vote(request.profile, delta):
+        return HttpResponseBadRequest(_('You cannot vote twice.'), content_type='text/plain')
     return HttpResponse('success', content_type='text/plain')
 
 
@@ -172,26 +152,20 @@ class PostList(PostListBase):
         context['gcse_url'] = settings.GOOGLE_SEARCH_ENGINE_URL
 
         context['page_prefix'] = reverse('blog_post_list')
-        context['comments'] = Comment.most_recent(self.request.user, 10)
-        context['new_problems'] = Problem.get_public_problems() \
-                                         .order_by('-date', 'code')[:settings.DMOJ_BLOG_NEW_PROBLEM_COUNT]
-        context['page_titles'] = CacheDict(lambda page: Comment.get_page_title(page))
 
-        context['user_count'] = Profile.objects.count
-        context['problem_count'] = Problem.get_public_problems().count
-        context['submission_count'] = lambda: Submission.objects.aggregate(max_id=Max('id'))['max_id'] or 0
-        context['language_count'] = Language.objects.count
+        bundle = get_homepage_bundle()
+        context['comments'] = bundle['comments']
+        context['new_problems'] = bundle['new_problems']
+        context['top_pp_users'] = bundle['top_pp_users']
+        context['top_contrib'] = bundle['top_contrib']
+        for name in ('user_count', 'problem_count', 'submission_count', 'language_count'):
+            context[name] = bundle[name]
 
         now = timezone.now()
-
-        visible_contests = Contest.get_visible_contests(self.request.user).filter(is_visible=True) \
-                                  .order_by('start_time')
-
-        context['current_contests'] = visible_contests.filter(start_time__lte=now, end_time__gt=now)
-        context['future_contests'] = visible_contests.filter(start_time__gt=now)
-
-        context['top_pp_users'] = self.get_top_pp_users()
-        context['top_contrib'] = self.get_top_contributors()
+        contests = bundle['contests'] + get_private_contests(self.request.user, bundle['contests'])
+        contests.sort(key=lambda contest: contest.start_time)
+        context['current_contests'] = [contest for contest in contests if contest.start_time <= now < contest.end_time]
+        context['future_contests'] = [contest for contest in contests if contest.start_time > now]
 
         if self.request.user.is_authenticated:
             context['own_open_tickets'] = (
@@ -214,22 +188,6 @@ class PostList(PostListBase):
 
         return context
 
-    def get_top_pp_users(self):
-        return (Profile.objects.order_by('-performance_points')
-                .filter(performance_points__gt=0, is_unlisted=False)
-                .only('user', 'performance_points', 'display_rank', 'display_badge', 'rating',
-                      'username_display_override')
-                .select_related('user', 'display_badge')
-                [:settings.VNOJ_HOMEPAGE_TOP_USERS_COUNT])
-
-    def get_top_contributors(self):
-        return (Profile.objects.order_by('-contribution_points')
-                .filter(contribution_points__gt=0, is_unlisted=False)
-                .only('user', 'contribution_points', 'display_rank', 'display_badge', 'rating',
-                      'username_display_override')
-                .select_related('user', 'display_badge')
-                [:settings.VNOJ_HOMEPAGE_TOP_USERS_COUNT])
-
 
 class PostView(TitleMixin, CommentedDetailView):
     model = BlogPost
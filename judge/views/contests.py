@@ -16,12 +16,13 @@ from django.db import IntegrityError
 from django.db.models import BooleanField, Case, Count, F, FloatField, IntegerField, Max, Min, Q, Sum, Value, When
 from django.db.models.expressions import CombinedExpression
 from django.db.models.query import Prefetch
-from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, \
+    HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.defaultfilters import date as date_filter, floatformat
 from django.template.loader import get_template
 from django.urls import reverse
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.utils.functional import cached_property
 from django.utils.html import escape, format_html
 from django.utils.safestring import mark_safe
@@ -36,13 +37,17 @@ from reversion import revisions
 
 from judge.comments import CommentedDetailView
 from judge.contest_format import ICPCContestFormat
+from judge.contest_format.solves import get_first_solves_and_total_ac
 from judge.forms import ContestAnnouncementForm, ContestCloneForm, ContestDownloadDataForm, ContestForm, \
     ProposeContestProblemFormSet
-from judge.models import Contest, ContestAnnouncement, ContestMoss, ContestParticipation, ContestProblem, ContestTag, \
-    Language, Organization, Problem, ProblemClarification, Profile, Submission
-from judge.tasks import on_new_contest, prepare_contest_data, run_moss
+from judge.models import Contest, ContestAnnouncement, ContestMoss, ContestParticipation, ContestProblem, \
+    ContestSimilarity, ContestSimilarityPair, ContestTag, Language, Organization, Problem, ProblemClarification, \
+    Profile, Submission
+from judge.tasks import on_new_contest, prepare_contest_data, run_moss, run_similarity
 from judge.utils.celery import redirect_to_task_status, task_status_by_id, task_status_url_by_id
-from judge.utils.cms import parse_csv_ranking
+from judge.utils.cms import get_csv_ranking
+from judge.utils.diggpaginator import DiggPaginator, InvalidPage
+from judge.utils.event_feed import generate_event_feed
 from judge.utils.opengraph import generate_opengraph
 from judge.utils.problems import _get_result_data, user_attempted_ids, user_completed_ids
 from judge.utils.ranker import ranker
@@ -52,7 +57,8 @@ from judge.utils.views import DiggPaginatorMixin, QueryStringSortMixin, SingleOb
 from judge.views.register import RegistrationForm
 
 __all__ = ['ContestList', 'ContestDetail', 'ContestRanking', 'ContestJoin', 'ContestLeave', 'ContestCalendar',
-           'ContestClone', 'ContestStats', 'ContestMossView', 'ContestMossDelete',
+           'ContestClone', 'ContestStats', 'ContestMossView', 'ContestMossDelete', 'ContestSimilarityView',
+           'ContestSimilarityDelete', 'ContestEventFeed',
            'ContestParticipationList', 'ContestParticipationDisqualify', 'get_contest_ranking_list',
            'base_contest_ranking_list']
 
@@ -901,9 +907,14 @@ def make_contest_ranking_profile(contest, participation, contest_problems, first
     )
 
 
-def base_contest_ranking_list(contest, problems, queryset, frozen=False):
+def base_contest_ranking_list(contest, problems, queryset, frozen=False, show_virtual=None):
+    # If `show_virtual` is given, `queryset` holds every live participation, and every virtual one if it is True,
+    # so the first solves and AC counts can be taken from the cached summary of the contest.
     queryset = queryset.select_related('user__user', 'rating').defer('user__about', 'user__organizations__about')
-    first_solves, total_ac = contest.format.get_first_solves_and_total_ac(problems, queryset, frozen)
+    if show_virtual is None:
+        first_solves, total_ac = contest.format.get_first_solves_and_total_ac(problems, queryset, frozen)
+    else:
+        first_solves, total_ac = get_first_solves_and_total_ac(contest, problems, frozen, include_virtual=show_virtual)
     users = [make_contest_ranking_profile(contest, participation, problems, first_solves, frozen) for participation
              in queryset]
     return users, total_ac
@@ -1035,7 +1046,8 @@ class ContestRanking(ContestRankingBase):
         queryset = self.get_ranking_queryset()
         return get_contest_ranking_list(
             self.request, self.object,
-            ranking_list=partial(base_contest_ranking_list, queryset=queryset, frozen=self.is_frozen),
+            ranking_list=partial(base_contest_ranking_list, queryset=queryset, frozen=self.is_frozen,
+                                 show_virtual=self.show_virtual),
         )
 
     def get_ranking_list(self):
@@ -1103,21 +1115,47 @@ class ContestOfficialRanking(ContestRankingBase):
                 points=floatformat(points),
             )
 
-        users, problems = parse_csv_ranking(self.object.csv_ranking)
+        ranking = get_csv_ranking(self.object)
 
-        for user in users:
-            user['result_cell'] = display_points(user['total_score'])
-            user['problem_cells'] = [display_points(points) for points in user['scores']]
+        # Only the indices of the matching rows are paginated, and only the rows of the page are rendered.
+        paginator = DiggPaginator(ranking.search(self.search_query), settings.VNOJ_CSV_RANKING_PAGE_SIZE,
+                                  body=6, padding=2)
+        try:
+            self.page_obj = paginator.page(self.request.GET.get('page', 1), softlimit=True)
+        except InvalidPage:
+            raise Http404()
 
-        users = list(zip(range(1, len(users) + 1), users))
+        users = []
+        for index in self.page_obj.object_list:
+            username, full_name, scores, total = ranking.rows[index]
+            users.append((index + 1, {
+                'username': username,
+                'full_name': full_name,
+                'problem_cells': [display_points(points) for points in scores],
+                'result_cell': display_points(total),
+            }))
 
-        return users, problems, {}
+        return users, ranking.problems, {}
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['has_rating'] = False
+        context['search_query'] = self.search_query
+        context['page_obj'] = self.page_obj
+
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query = query.urlencode()
+        context['first_page_href'] = '?' + query if query else '.'
+        context['page_prefix'] = '?' + (query + '&' if query else '') + 'page='
         return context
 
+    def export(self):
+        ranking = get_csv_ranking(self.object)
+        response = StreamingHttpResponse(ranking.iter_csv(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="official_ranking_%s.csv"' % self.object.key
+        return response
+
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         if not self.object.csv_ranking:
@@ -1128,6 +1166,11 @@ class ContestOfficialRanking(ContestRankingBase):
         if self.object.csv_ranking.startswith('http'):
             return redirect(self.object.csv_ranking)
 
+        if 'export' in request.GET:
+            self.check_can_see_own_scoreboard()
+            return self.export()
+
+        self.search_query = request.GET.get('search', '')
         return super().get(request, *args, **kwargs)
 
 
@@ -1241,6 +1284,88 @@ class ContestMossDelete(ContestMossMixin, SingleObjectMixin, View):
         return HttpResponseRedirect(reverse('contest_moss', args=(self.object.key,)))
 
 
+class ContestSimilarityMixin(ContestMixin, PermissionRequiredMixin):
+    permission_required = 'judge.moss_contest'
+    permission_denied_message = _('You are not allowed to check source similarity.')
+
+    def get_object(self, queryset=None):
+        contest = super().get_object(queryset)
+        if not contest.is_editable_by(self.request.user):
+            raise Http404()
+        return contest
+
+
+class ContestSimilarityView(ContestSimilarityMixin, TitleMixin, DetailView):
+    template_name = 'contest/similarity.html'
+
+    def get_title(self):
+        return _('%s Similarity Results') % self.object.name
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        problems = list(map(attrgetter('problem'), self.object.contest_problems.order_by('order')
+                                                              .select_related('problem')))
+
+        results = list(ContestSimilarity.objects.filter(contest=self.object).order_by('language'))
+        pairs = defaultdict(list)
+        for pair in ContestSimilarityPair.objects.filter(result__in=results) \
+                .select_related('first__user__user', 'second__user__user'):
+            pairs[pair.result_id].append(pair)
+
+        similarity_results = defaultdict(list)
+        for result in results:
+            similarity_results[result.problem_id].append((result, pairs[result.id]))
+
+        context['has_results'] = bool(results)
+        context['similarity_results'] = [(problem, similarity_results[problem.id]) for problem in problems]
+
+        return context
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        status = run_similarity.delay(self.object.key)
+        return redirect_to_task_status(
+            status, message=_('Checking source similarity for %s...') % (self.object.name,),
+            redirect=reverse('contest_similarity', args=(self.object.key,)),
+        )
+
+
+class ContestSimilarityDelete(ContestSimilarityMixin, SingleObjectMixin, View):
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        ContestSimilarity.objects.filter(contest=self.object).delete()
+        return HttpResponseRedirect(reverse('contest_similarity', args=(self.object.key,)))
+
+
+class ContestEventFeed(ContestMixin, SingleObjectMixin, View):
+    def get_object(self, queryset=None):
+        contest = super().get_object(queryset)
+        if not contest.is_editable_by(self.request.user):
+            raise Http404()
+        return contest
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        try:
+            since_id = int(request.GET['since_id']) if 'since_id' in request.GET else None
+            since_time = datetime.fromtimestamp(float(request.GET['since_time']), timezone.utc) \
+                if 'since_time' in request.GET else None
+            last_medals = list(map(int, request.GET['medals'].split(','))) if 'medals' in request.GET else None
+        except (ValueError, OverflowError):
+            return HttpResponseBadRequest()
+        if last_medals is not None and len(last_medals) != 3:
+            return HttpResponseBadRequest()
+
+        def stream():
+            # The event feed is always in English.
+            with translation.override('en'):
+                yield from generate_event_feed(self.object, last_medals, since_id=since_id, since_time=since_time)
+
+        return StreamingHttpResponse(stream(), content_type='application/xml')
+
+
 class ContestTagDetailAjax(DetailView):
     model = ContestTag
     slug_field = slug_url_kwarg = 'name'
@@ -1,7 +1,8 @@
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy
 from django.views.generic import ListView
 
-from judge.models import Language
+from judge.models import Language, RuntimeVersion
 from judge.utils.views import TitleMixin
 
 
@@ -12,7 +13,9 @@ class LanguageList(TitleMixin, ListView):
     title = gettext_lazy('Runtimes')
 
     def get_queryset(self):
-        queryset = super().get_queryset().prefetch_related('runtimeversion_set')
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('runtimeversion_set', RuntimeVersion.objects.filter(judge__online=True)),
+        )
         if not self.request.user.is_superuser and not self.request.user.is_staff:
             queryset = queryset.filter(judges__online=True).distinct()
         return queryset
@@ -5,8 +5,6 @@ import re
 from datetime import timedelta
 from operator import itemgetter
 from random import randrange
-import threading
-import time
 
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
@@ -14,15 +12,17 @@ from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
 from django.db import transaction
 from django.db.models import BooleanField, Case, F, Prefetch, Q, When
 from django.db.utils import ProgrammingError
-from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
 from django.urls import reverse
 from django.utils import timezone, translation
+from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
 from django.utils.html import escape, format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _, gettext_lazy
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import CreateView, FormView, ListView, UpdateView, View
 from django.views.generic.base import TemplateResponseMixin
 from django.views.generic.detail import SingleObjectMixin
@@ -31,6 +31,7 @@ from reversion import revisions
 from judge.comments import CommentedDetailView
 from judge.forms import LanguageLimitFormSet, ProblemCloneForm, ProblemEditForm, ProblemEditTypeGroupForm, \
     ProblemImportPolygonForm, ProblemImportPolygonStatementFormSet, ProblemSubmitForm, ProposeProblemSolutionFormSet
+from judge.judgeapi import get_ide_run_result, run_ide
 from judge.models import ContestSubmission, Judge, Language, Problem, ProblemGroup, \
     ProblemTranslation, ProblemType, RuntimeVersion, Solution, Submission, SubmissionSource
 from judge.tasks import on_new_problem
@@ -46,14 +47,6 @@ from judge.utils.tickets import own_ticket_filter
 from judge.utils.views import QueryStringSortMixin, SingleObjectFormView, TitleMixin, add_file_response, generic_message
 from judge.views.widgets import pdf_statement_uploader, submission_uploader
 
-from django.http import JsonResponse
-
-from django.utils.decorators import method_decorator
-from django.views.decorators.csrf import csrf_exempt
-
-from judge.judgeapi import judge_request
-from judge.bridge.judge_list import JudgeList
-import websocket 
 recjk = re.compile(r'[\u2E80-\u2E99\u2E9B-\u2EF3\u2F00-\u2FD5\u3005\u3007\u3021-\u3029\u3038-\u303A\u303B\u3400-\u4DB5'
                    r'\u4E00-\u9FC3\uF900-\uFA2D\uFA30-\uFA6A\uFA70-\uFAD9\U00020000-\U0002A6D6\U0002F800-\U0002FA1D]')
 
@@ -656,7 +649,9 @@ class ProblemSubmit(LoginRequiredMixin, ProblemMixin, TitleMixin, SingleObjectFo
 
         form.fields['language'].queryset = (
             self.object.usable_languages.order_by('name', 'key')
-            .prefetch_related(Prefetch('runtimeversion_set', RuntimeVersion.objects.order_by('priority')))
+            .prefetch_related(Prefetch(
+                'runtimeversion_set', RuntimeVersion.objects.filter(judge__online=True).order_by('priority'),
+            ))
         )
 
         form_data = getattr(form, 'cleaned_data', form.initial)
@@ -1109,65 +1104,41 @@ class ProblemEditTypeGroup(PermissionRequiredMixin, ProblemMixin, TitleMixin, Up
 
 @method_decorator(csrf_exempt, name='dispatch')
 class RunCodeView(View):
+    """Runs code from the IDE on the input of the user. Runs only live in the bridge, and create no submission."""
+
     def post(self, request):
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'Unauthenticated'}, status=401)
 
         try:
             data = json.loads(request.body)
-            language = Language.objects.get(key=data['language'])  
-            stdin = data.get('stdin', '')
-            source_code = '###INPUT###\n' + stdin + '###CODE###\n' + data['source'] 
-
-            judge_name = data.get('judge')
-
-            problem = get_object_or_404(Problem, code="run_ide")
+            language = Language.objects.get(key=data['language'])
+            # The placeholder problem only holds the limits of IDE runs and who may not use them.
+            problem = get_object_or_404(Problem.objects.only('id', 'code', 'time_limit', 'memory_limit'),
+                                        code='run_ide')
             profile = request.profile
 
-            # Check banned
             if not request.user.is_superuser and problem.banned_users.filter(id=profile.id).exists():
                 return JsonResponse({'error': _('You are banned from submitting to this problem.')}, status=403)
 
-            current_contest = profile.current_contest
-            contest_problem = get_contest_problem(problem, profile) if current_contest else None
-
-            with transaction.atomic():
-                submission = Submission(user=profile, problem=problem, language=language)
-                if contest_problem:
-                    submission.contest_object = current_contest.contest
-                    if current_contest.live:
-                        submission.locked_after = submission.contest_object.locked_after
-                    submission.save()
-                    ContestSubmission(
-                        submission=submission,
-                        problem=contest_problem,
-                        participation=current_contest,
-                    ).save()
-                else:
-                    submission.save()
-
-                source_url = ''
-                source = SubmissionSource(submission=submission, source=source_code + source_url)
-                source.save()
+            run_key = run_ide(profile.id, language.key, data['source'], data.get('stdin', ''),
+                              problem.time_limit, problem.memory_limit)
+            if run_key is None:
+                return JsonResponse({'error': _('Please wait for your previous runs to finish.')}, status=429)
 
-            submission.source = source
-            submission.judge(force_judge=True, judge_id="")
-
-
-            # IP log nếu trong official contest
             if settings.VNOJ_OFFICIAL_CONTEST_MODE:
                 ip = request.META['REMOTE_ADDR']
                 user_submit_ip_logger.info(
                     '%s,%s,%s',
                     request.user.username,
                     ip,
-                    submission.problem.code,
+                    problem.code,
                 )
 
             return JsonResponse({
                 'message': _('Submission successful'),
-                'submission_id': submission.id,
-                'channel': f"sub_{submission.id_secret}",
+                'run_key': run_key,
+                'result_url': reverse('problem_run_code_result', args=[run_key]),
             })
 
         except json.JSONDecodeError:
@@ -1177,40 +1148,20 @@ class RunCodeView(View):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
-def wait_for_result(channel, timeout=10):
-    result_data = {}
-    done_event = threading.Event()
-
-    def on_message(ws, message):
-        msg = json.loads(message)
-        if msg.get('message', {}).get('type') == 'on_test_case_ide':
-            result_data.update(msg['message']['result'])  
-            done_event.set()
-            ws.close()
-            return msg
-    
-
-    def on_open(ws):
-        ws.send(json.dumps({
-            'command': 'set-filter',
-            'filter': [channel]
-        }))
-
-    def on_error(ws, error):
-        done_event.set()
-        ws.close()
-
-    def on_close(ws, close_status_code, close_msg):
-        ws.close()
-
-    ws = websocket.WebSocketApp(
-        "ws://127.0.0.1:15100/",
-        on_message=on_message,
-        on_open=on_open,
-        on_error=on_error,
-        on_close=on_close
-    )
-
-    thread = threading.Thread(target=ws.run_forever)
-    thread.daemon = True
-    thread.start()
\ No newline at end of file
+
+class RunCodeResultView(View):
+    """Waits a few seconds for an IDE run to finish, then returns its result so far."""
+
+    def get(self, request, run_key):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Unauthenticated'}, status=401)
+
+        try:
+            result = get_ide_run_result(run_key, request.profile.id, settings.BRIDGED_IDE_RUN_MAX_WAIT)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        if result is None:
+            return JsonResponse({'error': _('This run does not exist or has expired.')}, status=404)
+
+        done, result = result
+        return JsonResponse({'done': done, 'result': result})
@@ -163,14 +163,17 @@ class ProblemSubmissionDiff(TitleMixin, ProblemMixin, DetailView):
             raise Submission.DoesNotExist()
 
         subs = subs.order_by('id')
-        context['submissions'] = subs.filter(language__file_only=False)
+        # The test cases of archived submissions come from their archives, so both are fetched up front.
+        context['submissions'] = (subs.filter(language__file_only=False)
+                                  .select_related('user__user', 'language')
+                                  .prefetch_related('test_cases', 'test_case_archive'))
 
         # If we have associated data we can do better than just guess
         data = ProblemTestCase.objects.filter(dataset=self.object, type='C')
         if data:
             num_cases = data.count()
         else:
-            num_cases = subs.first().test_cases.count()
+            num_cases = len(subs.first().get_test_cases())
         context['num_cases'] = num_cases
         return context
 
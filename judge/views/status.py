@@ -1,15 +1,32 @@
+import logging
 from collections import defaultdict
 from functools import partial
 
+from django.core.cache import cache
 from django.http import HttpResponseBadRequest
 from django.shortcuts import render
-from django.utils.translation import gettext as _
+from django.utils.translation import gettext as _, gettext_lazy
 from packaging import version
 
+from judge.bridge.metrics import snapshot_quantile
+from judge.judgeapi import get_bridge_stats
 from judge.models import Judge, Language, RuntimeVersion
 
 __all__ = ['status_all', 'status_table']
 
+logger = logging.getLogger('judge.views.status')
+
+PRIORITY_NAMES = {
+    '0': gettext_lazy('Contest'),
+    '1': gettext_lazy('Default'),
+    '2': gettext_lazy('Rejudge'),
+    '3': gettext_lazy('Batch rejudge'),
+}
+
+# The status pages poll every few seconds, so the bridge is asked for its metrics at most this often, even when it
+# cannot be reached.
+BRIDGE_STATUS_CACHE_TIME = 5
+
 
 def get_judges(request):
     if request.user.is_superuser or request.user.is_staff:
@@ -18,6 +35,47 @@ def get_judges(request):
         return False, Judge.objects.filter(online=True)
 
 
+def get_bridge_metrics():
+    metrics = cache.get('bridge_metrics')
+    if metrics is None:
+        try:
+            metrics = get_bridge_stats()
+        except Exception:
+            logger.warning('Failed to fetch bridge stats')
+            metrics = False
+        cache.set('bridge_metrics', metrics, BRIDGE_STATUS_CACHE_TIME)
+    return metrics
+
+
+def get_bridge_status():
+    metrics = get_bridge_metrics()
+    if metrics is False:
+        return None
+
+    def samples(name):
+        return metrics.get(name, {}).get('samples', [])
+
+    def latency(sample):
+        return {
+            'count': sample['value']['count'],
+            'p50': snapshot_quantile(sample, 0.5) * 1000,
+            'p99': snapshot_quantile(sample, 0.99) * 1000,
+        }
+
+    return {
+        'utilization': {sample['labels']['judge']: sample['value'] * 100
+                        for sample in samples('bridge_judge_utilization')},
+        'queue': [(PRIORITY_NAMES.get(sample['labels']['priority'], sample['labels']['priority']), sample['value'])
+                  for sample in sorted(samples('bridge_queue_depth'), key=lambda sample: sample['labels']['priority'])],
+        'dispatch_latency': [
+            (PRIORITY_NAMES.get(sample['labels']['priority'], sample['labels']['priority']), latency(sample))
+            for sample in sorted(samples('bridge_dispatch_latency_seconds'),
+                                 key=lambda sample: sample['labels']['priority'])
+        ],
+        'event_post_latency': [latency(sample) for sample in samples('bridge_event_post_seconds')],
+    }
+
+
 def status_all(request):
     see_all, judges = get_judges(request)
     return render(request, 'status/judge-status.html', {
@@ -25,6 +83,7 @@ def status_all(request):
         'judges': judges,
         'runtime_version_data': Judge.runtime_versions(),
         'see_all_judges': see_all,
+        'bridge_status': get_bridge_status() if see_all else None,
     })
 
 
@@ -43,6 +102,7 @@ def status_table(request):
         'judges': judges,
         'runtime_version_data': Judge.runtime_versions(),
         'see_all_judges': see_all,
+        'bridge_status': get_bridge_status() if see_all else None,
     })
 
 
@@ -241,7 +241,7 @@ class SubmissionStatus(SubmissionDetailBase):
         context = super(SubmissionStatus, self).get_context_data(**kwargs)
         submission = self.object
 
-        context['batches'], statuses, test_case_count = group_test_cases(submission.test_cases.all())
+        context['batches'], statuses, test_case_count = group_test_cases(submission.get_test_cases())
 
         context['feedback_limit'] = min(3, test_case_count - 1)
         # In case the submission is in an on-going contest, we don't want to show any feedback.
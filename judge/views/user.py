@@ -44,6 +44,7 @@ from judge.utils.celery import task_status_by_id, task_status_url_by_id
 from judge.utils.infinite_paginator import InfinitePaginationMixin
 from judge.utils.problems import contest_completed_ids, user_completed_ids
 from judge.utils.pwned import PwnedPasswordsValidator
+from judge.utils.rank_index import RankedProfiles, get_rank_index
 from judge.utils.ranker import ranker
 from judge.utils.subscription import Subscription
 from judge.utils.unicode import utf8text
@@ -135,14 +136,10 @@ class UserPage(TitleMixin, UserMixin, DetailView):
         rating = self.object.ratings.order_by('-contest__end_time')[:1]
         context['rating'] = rating[0] if rating else None
 
-        context['rank'] = Profile.objects.filter(
-            is_unlisted=False, performance_points__gt=self.object.performance_points,
-        ).exclude(id=self.object.id).count() + 1
+        context['rank'] = get_rank_index('performance_points').rank_of(self.object.performance_points)
 
         if rating:
-            context['rating_rank'] = Profile.objects.filter(
-                is_unlisted=False, rating__gt=self.object.rating,
-            ).count() + 1
+            context['rating_rank'] = get_rank_index('rating').rank_of(self.object.rating)
         context.update(self.object.ratings.aggregate(min_rating=Min('rating'), max_rating=Max('rating'),
                                                      contests=Count('contest')))
         return context
@@ -577,22 +574,33 @@ class UserList(QueryStringSortMixin, InfinitePaginationMixin, DiggPaginatorMixin
     default_desc = all_sorts
     default_sort = '-rating'
 
+    @property
+    def use_rank_index(self):
+        return self.order.startswith('-')
+
     def get_queryset(self):
-        return (Profile.objects.filter(is_unlisted=False).order_by(self.order, 'id')
-                .prefetch_related(Prefetch('user', queryset=User.objects.only('username', 'first_name')))
-                .prefetch_related(Prefetch('organizations',
-                                  queryset=Organization.objects.filter(is_unlisted=False).only('name', 'id', 'slug')))
-                .select_related('display_badge')
-                .only('display_rank', 'display_badge', 'user', 'points', 'rating', 'performance_points',
-                      'problem_count', 'organizations', 'username_display_override'))
+        queryset = (Profile.objects.filter(is_unlisted=False).order_by(self.order, 'id')
+                    .prefetch_related(Prefetch('user', queryset=User.objects.only('username', 'first_name')))
+                    .prefetch_related(Prefetch('organizations',
+                                      queryset=Organization.objects.filter(is_unlisted=False)
+                                                                   .only('name', 'id', 'slug')))
+                    .select_related('display_badge')
+                    .only('display_rank', 'display_badge', 'user', 'points', 'rating', 'performance_points',
+                          'problem_count', 'organizations', 'username_display_override'))
+        if self.use_rank_index:
+            # Slices the leaderboard out of the rank index instead of using OFFSET, which scans every row before the
+            # page, and ranks the users by the sort field across all pages.
+            return RankedProfiles(get_rank_index(self.order[1:]), queryset)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super(UserList, self).get_context_data(**kwargs)
-        context['users'] = ranker(
-            context['users'],
-            key=attrgetter('performance_points', 'problem_count'),
-            rank=self.paginate_by * (context['page_obj'].number - 1),
-        )
+        if not self.use_rank_index:
+            context['users'] = ranker(
+                context['users'],
+                key=attrgetter('performance_points', 'problem_count'),
+                rank=self.paginate_by * (context['page_obj'].number - 1),
+            )
         context['first_page_href'] = '.'
         context.update(self.get_sort_context())
         context.update(self.get_sort_paginate_context())
@@ -612,22 +620,31 @@ class ContribList(QueryStringSortMixin, DiggPaginatorMixin, TitleMixin, ListView
     default_desc = all_sorts
     default_sort = '-contribution_points'
 
+    @property
+    def use_rank_index(self):
+        return self.order.startswith('-')
+
     def get_queryset(self):
-        return (Profile.objects.filter(is_unlisted=False).order_by(self.order, 'id')
-                .prefetch_related(Prefetch('user', queryset=User.objects.only('username', 'first_name')))
-                .prefetch_related(Prefetch('organizations',
-                                  queryset=Organization.objects.filter(is_unlisted=False).only('name', 'id', 'slug')))
-                .select_related('display_badge')
-                .only('display_rank', 'display_badge', 'user', 'organizations', 'rating', 'contribution_points',
-                      'username_display_override'))
+        queryset = (Profile.objects.filter(is_unlisted=False).order_by(self.order, 'id')
+                    .prefetch_related(Prefetch('user', queryset=User.objects.only('username', 'first_name')))
+                    .prefetch_related(Prefetch('organizations',
+                                      queryset=Organization.objects.filter(is_unlisted=False)
+                                                                   .only('name', 'id', 'slug')))
+                    .select_related('display_badge')
+                    .only('display_rank', 'display_badge', 'user', 'organizations', 'rating', 'contribution_points',
+                          'username_display_override'))
+        if self.use_rank_index:
+            return RankedProfiles(get_rank_index(self.order[1:]), queryset)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super(ContribList, self).get_context_data(**kwargs)
-        context['users'] = ranker(
-            context['users'],
-            key=attrgetter('contribution_points'),
-            rank=self.paginate_by * (context['page_obj'].number - 1),
-        )
+        if not self.use_rank_index:
+            context['users'] = ranker(
+                context['users'],
+                key=attrgetter('contribution_points'),
+                rank=self.paginate_by * (context['page_obj'].number - 1),
+            )
         context['first_page_href'] = '.'
         context.update(self.get_sort_context())
         context.update(self.get_sort_paginate_context())
@@ -654,14 +671,7 @@ def user_ranking_redirect(request):
     except KeyError:
         raise Http404()
     user = get_object_or_404(Profile, user__username=username)
-    # Assume using MySQL. NULL is considered smaller than any non-NULL value.
-    if user.rating is None:
-        rank = Profile.objects.filter(is_unlisted=False, rating__isnull=False).count()
-    else:
-        rank = Profile.objects.filter(is_unlisted=False, rating__gt=user.rating).count()
-    rank += Profile.objects.filter(
-        is_unlisted=False, rating__exact=user.rating, id__lt=user.id,
-    ).count()
+    rank = get_rank_index('rating').position_of(user.rating, user.id)
     page = rank // UserList.paginate_by
     return HttpResponseRedirect('%s%s#!%s' % (reverse('user_list'), '?page=%d' % (page + 1) if page else '', username))
 
@@ -672,10 +682,7 @@ def user_contributor_redirect(request):
     except KeyError:
         raise Http404()
     user = get_object_or_404(Profile, user__username=username)
-    rank = Profile.objects.filter(is_unlisted=False, contribution_points__gt=user.contribution_points).count()
-    rank += Profile.objects.filter(
-        is_unlisted=False, contribution_points__exact=user.contribution_points, id__lt=user.id,
-    ).count()
+    rank = get_rank_index('contribution_points').position_of(user.contribution_points, user.id)
     page = rank // ContribList.paginate_by
     return HttpResponseRedirect('%s%s#!%s' % (reverse('contributors_list'), '?page=%d' % (page + 1) if page else '',
                                               username))
@@ -153,7 +153,7 @@ function runCode() {
     .then(response => {
         if (!response.ok) {
             return response.json().then(errorData => {
-                throw new Error(errorData.detail); 
+                throw new Error(errorData.error || errorData.detail);
             });
         }
         return response.json();  
@@ -164,60 +164,49 @@ function runCode() {
             return;
         }
 
-        const channel = data.channel;
-        const ws = new WebSocket("ws://127.0.0.1:15100/");
-
-        ws.onopen = () => {
-            ws.send(JSON.stringify({
-                command: "set-filter",
-                filter: [channel]
-            }));
-        };
-
-        ws.onmessage = (event) => {
-            const msg = JSON.parse(event.data);
-
-            if (msg.message.type == 'on_test_case_ide'){
-                ws.close();
-                const resultData = msg.message.result.result;
-
-                terminal.value = resultData.proc_output || "";
-                if (resultData.error) terminal.value += "\nError: " + resultData.error;
-                terminal.value += `\nElapsed Time: ${resultData.execution_time}s`;
-                terminal.value += `\nMemory Usage: ${resultData.max_memory} KB`;
-                document.querySelector('.ace_wrapper .submit-btn').classList.remove('blur-disabled');
-            } else if (msg.message.type == 'on_test_case_ide2') {
-                ws.close();
-                const resultData = msg.message.result;
-            
-                if (resultData.name === 'test-case-status' && resultData.cases && resultData.cases.length > 0) {
-                    const testCase = resultData.cases[0]; // Lấy case đầu tiên
-            
-                    terminal.value = testCase.output || "";            
-                    terminal.value += `\nElapsed Time: ${testCase.time}s`;
-                    terminal.value += `\nMemory Usage: ${testCase.memory} KB`;
-                } else {
-                    terminal.value = "Compile Error!";
-                }
-                document.querySelector('.ace_wrapper .submit-btn').classList.remove('blur-disabled');
-
-            } else if (msg.message.type == 'ide-compile-error') {
-                ws.close();
-                const compileLog = msg.message.msg?.log || "Unknown Compile Error!";
-                terminal.value = "Compile Error:\n" + decodeAnsi(compileLog);
-                document.querySelector('.ace_wrapper .submit-btn').classList.remove('blur-disabled');
-            }
-        };
-
-        ws.onerror = () => {
-            terminal.value = "WebSocket connection error.";
-        };
+        waitForRun(data.result_url);
     })
     .catch(error => {
         terminal.value = "Error: " + error.message;  
     });
 }
 
+function waitForRun(resultUrl) {
+    // Each request waits a few seconds on the server for the run to finish.
+    fetch(resultUrl)
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            terminal.value = "Error: " + data.error;
+        } else if (!data.done) {
+            waitForRun(resultUrl);
+            return;
+        } else {
+            showRunResult(data.result);
+        }
+        document.querySelector('.ace_wrapper .submit-btn').classList.remove('blur-disabled');
+    })
+    .catch(error => {
+        terminal.value = "Error: " + error.message;
+        document.querySelector('.ace_wrapper .submit-btn').classList.remove('blur-disabled');
+    });
+}
+
+function showRunResult(result) {
+    if (result.status === 'compile-error') {
+        terminal.value = "Compile Error:\n" + decodeAnsi(result.log || "Unknown Compile Error!");
+        return;
+    }
+    if (result.status === 'expired') {
+        terminal.value = "No judge was available to run your code, please try again later.";
+        return;
+    }
+    terminal.value = result.output || "";
+    if (result.error) terminal.value += "\nError: " + result.error;
+    if (result.time !== undefined) terminal.value += `\nElapsed Time: ${result.time}s`;
+    if (result.memory !== undefined) terminal.value += `\nMemory Usage: ${result.memory} KB`;
+}
+
 function decodeAnsi(str) {
     return str
         .replace(/\u001b\[[0-9;]*m/g, '') // Xóa mã màu ANSI